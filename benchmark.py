@@ -0,0 +1,317 @@
+"""
+Search benchmark over synthetic Thai recipe corpora.
+
+The generator mutates and recombines the bundled recipes (name modifiers,
+ingredient lists mixed from two recipes, method text borrowed from the
+partner) into corpora of any size. Embeddings of synthetic rows are derived
+from the source recipes' embeddings (weighted mix plus noise) so 1M-row
+corpora do not need hours of encoding; pass --encode-corpus to encode them
+for real.
+
+For every corpus size and search mode it reports p50/p95/p99 latency,
+throughput and peak traced memory, and writes everything to a JSON file.
+"""
+
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from functions.cache import clear_caches, query_embedding_cache, search_result_cache
+from functions.embedding_store import build_incremental, dataset_hash
+from functions.fuzzy_index import ingredient_names, thai_clusters
+from functions.hashing import HashingEncoder
+from functions.index_build import build_vector_index, cache_indexes
+from functions.scoring import normalize_rows
+from functions.search import (
+    MODEL_NAME, SENTENCE_TRANSFORMERS_AVAILABLE, fuzzy_search_recipes, search_recipes
+)
+from functions.tfidf_index import TfidfIndex
+
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_MODES = ['combined', 'ingredient', 'name', 'fuzzy', 'tfidf', 'bm25', 'hybrid']
+EMBEDDING_DIM = 384
+
+NAME_PREFIXES = ['', '', '', 'ข้าว', 'ยำ', 'แกง', 'ผัด', 'ต้ม']
+NAME_SUFFIXES = ['', '', 'สูตรโบราณ', 'แบบง่าย', 'ทะเล', 'หมูกรอบ', 'ไก่', 'รสเด็ด', 'โบราณ', 'พิเศษ']
+
+
+def _mutate_name(name: str, rng) -> str:
+    clusters = thai_clusters(name)
+    if len(clusters) > 3 and rng.random() < 0.2:
+        # พิมพ์ผิด: ลบ grapheme หนึ่งตัว
+        del clusters[rng.integers(len(clusters))]
+    return (NAME_PREFIXES[rng.integers(len(NAME_PREFIXES))] + ''.join(clusters)
+            + NAME_SUFFIXES[rng.integers(len(NAME_SUFFIXES))])
+
+
+def synthesize_corpus(base: pd.DataFrame, rows: int, seed: int = 0):
+    """
+    `rows` synthetic recipes built from `base`, plus for each row its
+    (source, partner) positions in `base`. The first len(base) rows are the
+    originals unchanged.
+    """
+    rng = np.random.default_rng(seed)
+    sources = np.concatenate([np.arange(min(rows, len(base))),
+                              rng.integers(len(base), size=max(0, rows - len(base)))])
+    partners = rng.integers(len(base), size=rows)
+    names = base['name'].astype(str).tolist()
+    ingredients = [str(text).split('\n') for text in base['ingredient'].fillna('')]
+    methods = base['method'].fillna('').astype(str).tolist()
+
+    records = []
+    for i, (source, partner) in enumerate(zip(sources.tolist(), partners.tolist())):
+        if i < len(base):
+            records.append({'name': names[source], 'ingredient': '\n'.join(ingredients[source]),
+                            'method': methods[source]})
+            continue
+        own = ingredients[source]
+        borrowed = ingredients[partner]
+        keep = [line for line in own if rng.random() < 0.8] or own[:1]
+        extra = [borrowed[j] for j in rng.choice(len(borrowed), min(2, len(borrowed)), replace=False)]
+        method = methods[source]
+        if rng.random() < 0.3:
+            method += ' ' + methods[partner][:120]
+        records.append({'name': _mutate_name(names[source], rng),
+                        'ingredient': '\n'.join(keep + extra), 'method': method})
+    return pd.DataFrame.from_records(records), sources, partners
+
+
+def synthesize_queries(data: pd.DataFrame, count: int, seed: int = 1) -> List[str]:
+    """Recipe names (some with a typo) and ingredient names drawn from `data`."""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for position in rng.integers(len(data), size=count).tolist():
+        kind = rng.random()
+        if kind < 0.6:
+            clusters = thai_clusters(str(data['name'].iat[position]))
+            if len(clusters) > 3 and kind < 0.2:
+                del clusters[rng.integers(len(clusters))]
+            queries.append(''.join(clusters))
+        else:
+            names = ingredient_names(data['ingredient'].iat[position]) or [str(data['name'].iat[position])]
+            queries.append(names[rng.integers(len(names))])
+    return queries
+
+
+def load_encoder(name: str):
+    if name == 'minilm':
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(MODEL_NAME)
+    return HashingEncoder(EMBEDDING_DIM)
+
+
+def derived_embeddings(base_embeddings: np.ndarray, sources, partners, seed: int = 2) -> np.ndarray:
+    """Synthetic row vectors: 0.8 * source + 0.2 * partner + noise, unit length."""
+    rng = np.random.default_rng(seed)
+    base_embeddings = np.asarray(base_embeddings, dtype=np.float32)
+    matrix = np.empty((len(sources), base_embeddings.shape[1]), dtype=np.float32)
+    for start in range(0, len(sources), 65536):
+        s = sources[start:start + 65536]
+        p = partners[start:start + 65536]
+        chunk = 0.8 * base_embeddings[s] + 0.2 * base_embeddings[p]
+        chunk += rng.normal(0, 0.02, chunk.shape).astype(np.float32)
+        matrix[start:start + len(chunk)] = normalize_rows(chunk)
+    n_original = min(len(sources), len(base_embeddings))
+    matrix[:n_original] = normalize_rows(base_embeddings[:n_original])
+    return matrix
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, float]:
+    values = np.array(latencies) * 1000
+    return {
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'mean_ms': float(values.mean()),
+        'qps': float(len(values) / max(values.sum() / 1000, 1e-12)),
+    }
+
+
+def _clear_query_caches() -> None:
+    """Drop memoized queries and results, keeping the lexical indexes."""
+    query_embedding_cache.clear()
+    search_result_cache.clear()
+
+
+def measure(search: Callable[[str], List[Dict]], queries: List[str], memory_queries: int) -> Dict[str, float]:
+    """
+    Latency over all `queries` with result caches cleared before each, then
+    peak traced memory over the first `memory_queries`. An untimed warm-up
+    pass first runs every query once (filling per-dataset caches such as
+    the result columns); its total is reported as `warmup_seconds`.
+    """
+    started = time.perf_counter()
+    for query in queries:
+        search(query)
+    warmup_seconds = time.perf_counter() - started
+
+    latencies = []
+    for query in queries:
+        _clear_query_caches()
+        started = time.perf_counter()
+        search(query)
+        latencies.append(time.perf_counter() - started)
+    stats = _percentiles(latencies)
+
+    tracemalloc.start()
+    for query in queries[:memory_queries]:
+        _clear_query_caches()
+        search(query)
+    stats['peak_query_memory_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    stats['warmup_seconds'] = warmup_seconds
+    stats['queries'] = len(queries)
+    return stats
+
+
+def run_size(base: pd.DataFrame, rows: int, modes: List[str], encoder, base_embeddings, args, workdir: str) -> Dict:
+    print(f"\n▶ {rows:,} สูตร")
+    started = time.perf_counter()
+    data, sources, partners = synthesize_corpus(base, rows, args.seed)
+    build = {'generate_seconds': time.perf_counter() - started}
+    data_hash = dataset_hash(data)
+
+    started = time.perf_counter()
+    if args.encode_corpus:
+        texts = (data['name'] + ' ' + data['ingredient'] + ' ' + data['method']).tolist()
+        embeddings, _ = build_incremental(os.path.join(workdir, f'combined_{rows}.f32'), texts,
+                                          encoder.encode, args.encoder, data_hash)
+        ingredient_embeddings, _ = build_incremental(os.path.join(workdir, f'ingredient_{rows}.f32'),
+                                                     data['ingredient'].tolist(), encoder.encode,
+                                                     args.encoder, data_hash)
+    else:
+        embeddings = derived_embeddings(base_embeddings[0], sources, partners)
+        ingredient_embeddings = derived_embeddings(base_embeddings[1], sources, partners)
+    build['embedding_seconds'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vector_index, ingredient_vector_index = (
+        build_vector_index(matrix, os.path.join(workdir, f'{name}_{rows}.f32'), data_hash)
+        for name, matrix in (('combined', embeddings), ('ingredient', ingredient_embeddings))
+    )
+    build['vector_index_seconds'] = time.perf_counter() - started
+    build['vector_backend'] = type(vector_index).__name__
+
+    # ชุดข้อมูลสังเคราะห์ไม่มี artifacts บนดิสก์: สร้างดัชนีคำ/fuzzy/facet ไว้ในแคชของ process
+    started = time.perf_counter()
+    cache_indexes(data)
+    build['lexical_index_seconds'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    tfidf = TfidfIndex.fit(data)
+    tfidf_ingredient = TfidfIndex.fit(data, ('ingredient',))
+    build['tfidf_seconds'] = time.perf_counter() - started
+
+    semantic = lambda mode: (lambda q: search_recipes(
+        q, encoder, data, embeddings, ingredient_embeddings, args.top_k, mode, vector_index, ingredient_vector_index))
+    searches = {
+        'combined': semantic('combined'),
+        'ingredient': semantic('ingredient'),
+        'name': semantic('name'),
+        'bm25': semantic('bm25'),
+        'hybrid': semantic('hybrid'),
+        'fuzzy': lambda q: fuzzy_search_recipes(q, data, args.top_k, 'combined'),
+        'tfidf': lambda q: search_recipes(q, None, data, tfidf, tfidf_ingredient, args.top_k, 'combined'),
+    }
+
+    queries = synthesize_queries(data, args.queries, args.seed + 1)
+    results = {}
+    for mode in modes:
+        results[mode] = measure(searches[mode], queries, args.memory_queries)
+        print(f"  {mode:<11} p50 {results[mode]['p50_ms']:8.2f} ms  p95 {results[mode]['p95_ms']:8.2f} ms  "
+              f"p99 {results[mode]['p99_ms']:8.2f} ms  {results[mode]['qps']:8.1f} q/s  "
+              f"peak {results[mode]['peak_query_memory_mb']:7.1f} MB")
+    return {'rows': rows, 'build': build, 'modes': results}
+
+
+def main():
+    """ฟังก์ชันหลักสำหรับรันสคริปต์"""
+    parser = argparse.ArgumentParser(
+        description='วัดประสิทธิภาพการค้นหาบนชุดข้อมูลสังเคราะห์ (Search Benchmark)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+ตัวอย่างการใช้งาน:
+  python benchmark.py
+  python benchmark.py --sizes 1000 1000000 --modes fuzzy tfidf bm25
+  python benchmark.py --encoder minilm --encode-corpus --output bench_minilm.json
+        """
+    )
+    parser.add_argument('--input', '-i', type=str, default='thai_food_processed.csv',
+                        help='ไฟล์สูตรอาหารต้นฉบับ (default: thai_food_processed.csv)')
+    parser.add_argument('--output', '-o', type=str, default='benchmark_results.json',
+                        help='ไฟล์ผลลัพธ์ JSON (default: benchmark_results.json)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='จำนวนสูตรของแต่ละชุดข้อมูล (default: 1000 10000 100000)')
+    parser.add_argument('--modes', nargs='+', default=DEFAULT_MODES, choices=DEFAULT_MODES,
+                        help='โหมดการค้นหาที่จะวัด')
+    parser.add_argument('--queries', type=int, default=200, help='จำนวน query ต่อโหมด (default: 200)')
+    parser.add_argument('--memory-queries', type=int, default=20,
+                        help='จำนวน query ที่ใช้วัดหน่วยความจำสูงสุด (default: 20)')
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--encoder', choices=['minilm', 'hashing'],
+                        default='minilm' if SENTENCE_TRANSFORMERS_AVAILABLE else 'hashing',
+                        help='โมเดลสำหรับ query/embedding (hashing = ไม่ต้องใช้ torch)')
+    parser.add_argument('--encode-corpus', action='store_true',
+                        help='encode ทุกแถวจริงแทนการสังเคราะห์ embedding (ช้ามากสำหรับชุดใหญ่)')
+    parser.add_argument('--workdir', type=str, default=None,
+                        help='โฟลเดอร์เก็บ store/ดัชนีระหว่างรัน (default: โฟลเดอร์ชั่วคราว)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    base = pd.read_csv(args.input)
+    base = base.rename(columns={'text_ingradiant': 'ingredient', 'food_method': 'method'})
+    base = base[['name', 'ingredient', 'method']].fillna('').reset_index(drop=True)
+
+    print("=" * 60)
+    print("🍲 Thai Food Search Benchmark 🍲")
+    print("=" * 60)
+    print(f"Base recipes: {len(base)}  Sizes: {args.sizes}  Encoder: {args.encoder}")
+
+    encoder = load_encoder(args.encoder)
+    texts = (base['name'] + ' ' + base['ingredient'] + ' ' + base['method']).tolist()
+    base_embeddings = (np.asarray(encoder.encode(texts)), np.asarray(encoder.encode(base['ingredient'].tolist())))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        runs = []
+        for rows in args.sizes:
+            clear_caches()
+            runs.append(run_size(base, rows, args.modes, encoder, base_embeddings, args, workdir))
+
+    report = {
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'encoder': args.encoder,
+        'encode_corpus': args.encode_corpus,
+        'queries_per_mode': args.queries,
+        'top_k': args.top_k,
+        'seed': args.seed,
+        # ru_maxrss เป็น KB บน Linux
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else None,
+        'runs': runs,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ บันทึกผลลัพธ์: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
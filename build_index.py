@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline index build: every search artifact for the cleaned recipe CSV, ahead of deploy.
+
+One run builds, for the dataset in `--input`:
+  - TF-IDF indexes (combined and ingredient)            tfidf*.npz
+  - BM25, fuzzy token / trigram / bigram indexes,
+    the SymSpell name lookup map, the exact-name
+    index, facet masks and the autocomplete index       indexes/*.pkl
+  - combined and ingredient embeddings                  embeddings*.f32 (+ .shards/)
+  - the top-20 similar recipes of every recipe,
+    from the combined embeddings                        embeddings.neighbours.npz
+  - their vector indexes (IVF / PCA / quantized copy,
+    as configured in functions.search)                  embeddings*.ivf.npz, ...
+and records each in `artifacts.json` with the dataset hash it was built
+from (and, for pickled indexes, their class's format version). The builders
+live in `functions.index_build`. Embeddings are rebuilt incrementally, so
+only new or changed recipes are encoded, across `--workers` processes.
+
+The app and service.py only load these artifacts: they never build
+anything, and raise `ArtifactError` on a missing artifact or a manifest
+built from other data. The written manifest is read back and checked the
+same way; `--check` runs only that check against the CSV and exits 1 on
+any mismatch.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from functions.ann import index_path
+from functions.artifacts import (
+    MANIFEST_PATH, ArtifactError, add_artifact, format_version, new_manifest, require_manifest, save_index,
+    write_manifest
+)
+from functions.data import DATA_PATH, LEGACY_DATA_PATH, read_food_csv
+from functions.embedding_store import dataset_hash, header_path, row_hash_path
+from functions.encoding import DEFAULT_BATCH_SIZE, combined_texts, ingredient_texts
+from functions.index_build import (
+    INDEX_BUILDERS, build_embeddings, build_neighbours, build_vector_index, corpus_encoder
+)
+from functions.neighbours import neighbours_path
+from functions.pca import projection_path, reduced_store_path
+from functions.quantize import codes_path, quantized_path
+from functions.search import (
+    EMBEDDING_PCA_DIM, EMBEDDING_QUANTIZATION, EMBEDDING_SHARD_ROWS, EMBEDDINGS_INGREDIENT_PATH,
+    EMBEDDINGS_PATH, INDEX_INPUT_HASHES, MODEL_NAME, SENTENCE_TRANSFORMERS_AVAILABLE,
+    TFIDF_INGREDIENT_PATH, TFIDF_PATH, load_search_model
+)
+from functions.sharded_store import shard_dir
+from functions.tfidf_index import load_or_build_tfidf
+
+
+def _report(name: str, entry) -> None:
+    print(f"  ✅ {name:<22}{entry['bytes'] / 2**20:>9.2f} MB{entry['seconds']:>9.2f} s")
+
+
+def build_lexical(data, manifest) -> None:
+    """TF-IDF and every `INDEX_BUILDERS` index (BM25, fuzzy, name lookups, facets, autocomplete); no model."""
+    data_hash = manifest['dataset_hash']
+    for name, path, columns in (('tfidf', TFIDF_PATH, ('name', 'ingredient', 'method')),
+                                ('tfidf_ingredient', TFIDF_INGREDIENT_PATH, ('ingredient',))):
+        started = time.perf_counter()
+        load_or_build_tfidf(data, path, data_hash, columns)
+        _report(name, add_artifact(manifest, name, 'tfidf', [path], time.perf_counter() - started))
+
+    for name, build in INDEX_BUILDERS.items():
+        started = time.perf_counter()
+        input_hash = INDEX_INPUT_HASHES[name](data) if name in INDEX_INPUT_HASHES else None
+        index = build(data)
+        path = save_index(name, index, data_hash, input_hash)
+        _report(name, add_artifact(manifest, name, 'index', [path], time.perf_counter() - started,
+                                   format_version=format_version(index)))
+
+
+def _store_paths(path: str):
+    if EMBEDDING_SHARD_ROWS:
+        return [shard_dir(path)]
+    return [path, header_path(path), row_hash_path(path)]
+
+
+def _vector_index_paths(path: str):
+    paths = [index_path(path)]
+    if EMBEDDING_PCA_DIM:
+        paths += [projection_path(path, EMBEDDING_PCA_DIM), reduced_store_path(path, EMBEDDING_PCA_DIM)]
+    if EMBEDDING_QUANTIZATION:
+        paths += [quantized_path(path, EMBEDDING_QUANTIZATION), codes_path(path, EMBEDDING_QUANTIZATION)]
+    return [p for p in paths if os.path.exists(p)]
+
+
+def build_semantic(data, manifest, workers: int, batch_size: int, threads_per_worker: int) -> None:
+    """Embedding stores for both search modes, their vector indexes and the neighbour list."""
+    # ให้ worker โหลดโมเดลจากโฟลเดอร์ที่บันทึกไว้ ไม่ต้องดาวน์โหลดซ้ำ
+    model = load_search_model()
+    encoder = corpus_encoder(model, workers, batch_size, threads_per_worker)
+    for name, search_mode, path, texts in (
+            ('embeddings', 'combined', EMBEDDINGS_PATH, combined_texts(data)),
+            ('embeddings_ingredient', 'ingredient', EMBEDDINGS_INGREDIENT_PATH, ingredient_texts(data))):
+        encoder.stats = {}
+        started = time.perf_counter()
+        embeddings, stats = build_embeddings(data, path, texts, encoder.encode)
+        extra = {'model': MODEL_NAME, 'encoded': stats['encoded'], 'reused': stats['reused']}
+        if encoder.stats:
+            extra['rows_per_second'] = round(encoder.stats['rows_per_second'], 1)
+            extra['workers'] = encoder.stats['workers']
+        _report(name, add_artifact(manifest, name, 'embeddings', _store_paths(path),
+                                   time.perf_counter() - started, **extra))
+        if encoder.stats:
+            print(f"     encode {stats['encoded']:,} แถว, ใช้ซ้ำ {stats['reused']:,} แถว "
+                  f"({extra['rows_per_second']:,.1f} แถว/วินาที, {extra['workers']} workers)")
+
+        started = time.perf_counter()
+        build_vector_index(embeddings, path, manifest['dataset_hash'])
+        paths = _vector_index_paths(path)
+        if paths:
+            _report(f'{name}_index', add_artifact(manifest, f'{name}_index', 'vector_index', paths,
+                                                  time.perf_counter() - started))
+
+        if search_mode == 'combined':
+            # เมนูใกล้เคียงของทุกเมนู (คำนวณแบบ exact) สำหรับการค้นหาด้วยชื่อเมนูตรงตัว
+            started = time.perf_counter()
+            neighbours = build_neighbours(embeddings)
+            neighbours.save(neighbours_path(path), manifest['dataset_hash'])
+            _report('neighbours', add_artifact(manifest, 'neighbours', 'neighbours', [neighbours_path(path)],
+                                               time.perf_counter() - started, k=neighbours.k))
+
+
+def check(data_hash: str) -> int:
+    try:
+        manifest = require_manifest(data_hash)
+    except ArtifactError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"✅ {len(manifest['artifacts'])} artifacts ตรงกับข้อมูล (dataset hash {data_hash}, "
+          f"สร้างเมื่อ {manifest['built_at']})")
+    return 0
+
+
+def main():
+    """ฟังก์ชันหลักสำหรับรันสคริปต์"""
+    parser = argparse.ArgumentParser(
+        description='สร้างดัชนีการค้นหาทั้งหมดล่วงหน้าก่อน deploy (Offline Index Builder)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+ตัวอย่างการใช้งาน:
+  python build_index.py
+  python build_index.py --input thai_food_processed_cleaned.csv --workers 8 --threads-per-worker 1
+  python build_index.py --lexical-only
+  python build_index.py --check
+        """
+    )
+    default_input = DATA_PATH if os.path.exists(DATA_PATH) else LEGACY_DATA_PATH
+    parser.add_argument('--input', '-i', type=str, default=default_input,
+                        help=f'ไฟล์ CSV ที่ทำความสะอาดแล้ว (default: {default_input})')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='จำนวน worker process สำหรับ encode (default: จำนวน CPU)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--threads-per-worker', type=int, default=1,
+                        help='จำนวน thread ของ torch ต่อ worker (default: 1)')
+    parser.add_argument('--lexical-only', action='store_true',
+                        help='สร้างเฉพาะดัชนีแบบคำ (ไม่ใช้โมเดล AI)')
+    parser.add_argument('--check', action='store_true',
+                        help='ตรวจสอบว่า artifacts.json ตรงกับข้อมูล แล้วออก (exit 1 ถ้าไม่ตรง)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Error: ไม่พบไฟล์ {args.input}")
+        sys.exit(1)
+    data = read_food_csv(args.input)
+    if data.empty:
+        print(f"Error: ไม่มีข้อมูลใน {args.input}")
+        sys.exit(1)
+    data_hash = dataset_hash(data)
+
+    if args.check:
+        sys.exit(check(data_hash))
+
+    semantic = SENTENCE_TRANSFORMERS_AVAILABLE and not args.lexical_only
+    manifest = new_manifest(data_hash, len(data), args.input, MODEL_NAME if semantic else None)
+    print(f"🔨 สร้างดัชนีสำหรับ {args.input}: {len(data):,} สูตร (dataset hash {data_hash})")
+    build_lexical(data, manifest)
+    if semantic:
+        build_semantic(data, manifest, args.workers, args.batch_size, args.threads_per_worker)
+    elif not args.lexical_only:
+        print("  ⚠️  ไม่พบ sentence-transformers: ข้ามการสร้าง embedding (แอปจะใช้การค้นหาแบบคำ)")
+
+    write_manifest(manifest)
+    print(f"📄 บันทึก {MANIFEST_PATH}: {len(manifest['artifacts'])} artifacts")
+    # อ่าน manifest ที่เขียนลงดิสก์กลับมาตรวจแบบเดียวกับตอนแอปเริ่ม: ทุกไฟล์ต้องมีอยู่จริง
+    sys.exit(check(data_hash))
+
+
+if __name__ == "__main__":
+    main()
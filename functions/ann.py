@@ -0,0 +1,195 @@
+"""
+Approximate nearest-neighbour search over embedding stores (IVF-flat, pure NumPy).
+
+Rows are clustered with spherical k-means; a query scans only the `nprobe`
+closest clusters and scores those rows exactly. Below `ANN_MIN_ROWS` no index
+is built and callers fall back to exact brute-force scoring.
+
+Probed rows are scored against the float32 store, or with a `scorer` (a
+`QuantizedIndex` or `PCAIndex`) through its `search_rows`, so IVF combines
+with the int8/float16 copy or the PCA-reduced store instead of replacing
+them: the coarse lists cut the rows scored, the compact matrix cuts the
+bytes read per row.
+
+Any backend only needs `search(query_vector, k) -> (indices, scores)`.
+"""
+
+import json
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+from functions.scoring import normalize_rows, normalize_vector, top_k
+
+ANN_FORMAT_VERSION = 1
+ANN_MIN_ROWS = 20000
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 10
+KMEANS_TRAIN_PER_LIST = 64
+ASSIGN_CHUNK_ROWS = 65536
+
+
+def index_path(path: str) -> str:
+    """Path of the IVF index that sits next to the embedding store at `path`."""
+    return os.path.splitext(path)[0] + '.ivf.npz'
+
+
+def _assign(embeddings, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid per row, streamed in chunks to bound memory."""
+    assignments = np.empty(len(embeddings), dtype=np.int32)
+    for start in range(0, len(embeddings), ASSIGN_CHUNK_ROWS):
+        chunk = normalize_rows(embeddings[start:start + ASSIGN_CHUNK_ROWS])
+        assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def _spherical_kmeans(train: np.ndarray, n_lists: int, iterations: int, rng) -> np.ndarray:
+    centroids = train[rng.choice(len(train), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(train @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, train)
+        counts = np.bincount(assignments, minlength=n_lists)
+        empty = counts == 0
+        if empty.any():
+            # กลุ่มว่าง: สุ่มจุดใหม่จากชุดฝึก
+            sums[empty] = train[rng.choice(len(train), int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index: centroids plus row ids grouped by nearest centroid.
+    `embeddings` must be row-normalized, as written by the embedding store.
+    """
+
+    def __init__(self, embeddings, centroids: np.ndarray, list_offsets: np.ndarray,
+                 list_ids: np.ndarray, nprobe: int = DEFAULT_NPROBE, scorer=None):
+        self.embeddings = embeddings
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.nprobe = nprobe
+        self.scorer = scorer
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, embeddings, n_lists: Optional[int] = None, iterations: int = KMEANS_ITERATIONS,
+              seed: int = 0, nprobe: int = DEFAULT_NPROBE, scorer=None) -> 'IVFIndex':
+        rows = len(embeddings)
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(rows)))
+        n_lists = min(n_lists, rows)
+        rng = np.random.default_rng(seed)
+
+        n_train = min(rows, n_lists * KMEANS_TRAIN_PER_LIST)
+        sample = np.sort(rng.choice(rows, n_train, replace=False))
+        train = normalize_rows(embeddings[sample])
+        centroids = _spherical_kmeans(train, n_lists, iterations, rng)
+
+        assignments = _assign(embeddings, centroids)
+        list_ids = np.argsort(assignments, kind='stable').astype(np.int64)
+        counts = np.bincount(assignments, minlength=n_lists)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(embeddings, centroids, list_offsets, list_ids, nprobe, scorer)
+
+    def _score_rows(self, rows: np.ndarray, query_vector, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Best k of `rows` (sorted ids), scored by `scorer` when set."""
+        if self.scorer is not None:
+            return self.scorer.search_rows(rows, query_vector, k)
+        scores = np.asarray(self.embeddings[rows], dtype=np.float32) @ query
+        top = top_k(scores, k)
+        return rows[top], scores[top]
+
+    def search(self, query_vector, k: int, nprobe: Optional[int] = None,
+               mask=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (row indices, cosine scores) of the best k rows among probed lists.
+        With a boolean `mask`, disallowed rows are dropped before scoring and
+        more lists are probed until k allowed rows are found; a filter narrower
+        than the probed lists is scored exactly over its rows instead.
+        """
+        query = normalize_vector(query_vector)
+        if not query.any() or k <= 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        if mask is not None:
+            allowed = np.flatnonzero(mask)
+            if len(allowed) <= nprobe * len(self.list_ids) / self.n_lists:
+                return self._score_rows(allowed, query_vector, query, k)
+
+        order = top_k(self.centroids @ query, self.n_lists if mask is not None else nprobe)
+        while True:
+            candidates = np.concatenate(
+                [self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in order[:nprobe]]
+            )
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+            if mask is None or len(candidates) >= k or nprobe >= self.n_lists:
+                break
+            nprobe = min(nprobe * 2, self.n_lists)
+        if len(candidates) == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        # เรียง id เพื่อให้อ่าน memmap แบบต่อเนื่อง (แถวใน store ถูก normalize แล้ว)
+        candidates.sort()
+        return self._score_rows(candidates, query_vector, query, k)
+
+    def search_batch(self, query_vectors, k: int, nprobe: Optional[int] = None, mask=None):
+        """Per-query `search`; probed lists differ per query so there is no shared product."""
+        results = [self.search(query, k, nprobe, mask) for query in np.asarray(query_vectors)]
+        return [r[0] for r in results], [r[1] for r in results]
+
+    def save(self, path: str, data_hash: str) -> None:
+        meta = {
+            'version': ANN_FORMAT_VERSION,
+            'rows': int(len(self.embeddings)),
+            'dim': int(self.centroids.shape[1]),
+            'dataset_hash': data_hash,
+        }
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, centroids=self.centroids, list_offsets=self.list_offsets,
+                 list_ids=self.list_ids, meta=np.array(json.dumps(meta)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, embeddings, data_hash: str,
+             nprobe: int = DEFAULT_NPROBE, scorer=None) -> Optional['IVFIndex']:
+        """Load the index at `path` if it was built for this dataset and matrix shape."""
+        try:
+            with np.load(path) as archive:
+                meta = json.loads(str(archive['meta']))
+                if (meta.get('version') != ANN_FORMAT_VERSION
+                        or meta.get('rows') != len(embeddings)
+                        or meta.get('dim') != embeddings.shape[1]
+                        or meta.get('dataset_hash') != data_hash):
+                    return None
+                return cls(embeddings, archive['centroids'], archive['list_offsets'],
+                           archive['list_ids'], nprobe, scorer)
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+def load_or_build_ivf(embeddings, path: str, data_hash: str, nprobe: int = DEFAULT_NPROBE,
+                      min_rows: int = ANN_MIN_ROWS, scorer=None) -> Optional[IVFIndex]:
+    """
+    IVF index for `embeddings`, loaded from `path` or built and saved there;
+    probed rows are scored by `scorer` when given. Returns None below
+    `min_rows`, where exact scoring is both faster and exact.
+    """
+    if embeddings is None or len(embeddings) < min_rows or np.ndim(embeddings) != 2:
+        return None
+    index = IVFIndex.load(path, embeddings, data_hash, nprobe, scorer)
+    if index is not None:
+        return index
+    index = IVFIndex.build(embeddings, nprobe=nprobe, scorer=scorer)
+    try:
+        index.save(path, data_hash)
+    except OSError:
+        pass
+    return index
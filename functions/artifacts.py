@@ -0,0 +1,161 @@
+"""
+Manifest of prebuilt search artifacts, written by `build_index.py`.
+
+`artifacts.json` lists every artifact built for one dataset version: its
+kind, file(s), dataset hash, row count, size and build time. In-memory
+indexes (BM25, fuzzy token/trigram/bigram indexes, the SymSpell name
+lookup map, the exact-name index, facets, autocomplete) are pickled under
+`indexes/`; embedding stores, vector indexes, the neighbour list and
+TF-IDF keep their own formats and locations and are only listed here.
+
+`dataset_index` (see `functions.cache`) loads a pickled index when the
+manifest lists it for the same dataset hash. Each pickled class carries a
+`FORMAT_VERSION`, recorded in the pickle and in its manifest entry; a
+pickle written by a different version of the class is rejected, since it
+may unpickle without error yet lack attributes the current code reads.
+The app calls `require_manifest` at start-up: a missing manifest, or one
+built from a different CSV, raises `ArtifactError` rather than anything
+being rebuilt on a request path.
+"""
+
+import json
+import os
+import pickle
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+MANIFEST_PATH = 'artifacts.json'
+INDEX_DIR = 'indexes'
+MANIFEST_VERSION = 2
+
+
+class ArtifactError(RuntimeError):
+    """Prebuilt artifacts are missing or were built from a different dataset."""
+
+
+def read_manifest(path: str = MANIFEST_PATH) -> Optional[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == MANIFEST_VERSION else None
+
+
+def write_manifest(manifest: Dict, path: str = MANIFEST_PATH) -> None:
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def new_manifest(data_hash: str, rows: int, source: str, model: Optional[str]) -> Dict:
+    return {
+        'version': MANIFEST_VERSION,
+        'dataset_hash': data_hash,
+        'rows': rows,
+        'source': source,
+        'model': model,
+        'built_at': datetime.now().isoformat(timespec='seconds'),
+        'artifacts': {},
+    }
+
+
+def _file_bytes(paths: Iterable[str]) -> int:
+    total = 0
+    for path in paths:
+        if os.path.isdir(path):
+            total += sum(os.path.getsize(os.path.join(root, name))
+                         for root, _, names in os.walk(path) for name in names)
+        elif os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+
+def add_artifact(manifest: Dict, name: str, kind: str, paths: Iterable[str], seconds: float, **extra) -> Dict:
+    """Record artifact `name` (files `paths`) under the manifest's dataset hash."""
+    paths = list(paths)
+    entry = {
+        'kind': kind,
+        'paths': paths,
+        'dataset_hash': manifest['dataset_hash'],
+        'rows': manifest['rows'],
+        'bytes': _file_bytes(paths),
+        'seconds': round(seconds, 3),
+    }
+    entry.update(extra)
+    manifest['artifacts'][name] = entry
+    return entry
+
+
+def check_manifest(manifest: Dict, data_hash: str) -> None:
+    """Raise `ArtifactError` unless every artifact was built from `data_hash` and its files exist."""
+    if manifest.get('dataset_hash') != data_hash:
+        raise ArtifactError(
+            f"{MANIFEST_PATH} ถูกสร้างจากข้อมูลชุดอื่น (dataset hash {manifest.get('dataset_hash')} "
+            f"!= {data_hash}): รัน python build_index.py ใหม่"
+        )
+    for name, entry in manifest['artifacts'].items():
+        if entry.get('dataset_hash') != data_hash:
+            raise ArtifactError(f"artifact '{name}' ถูกสร้างจากข้อมูลชุดอื่น: รัน python build_index.py ใหม่")
+        missing = [path for path in entry['paths'] if not os.path.exists(path)]
+        if missing:
+            raise ArtifactError(f"ไม่พบไฟล์ของ artifact '{name}': {', '.join(missing)}")
+
+
+def require_manifest(data_hash: str, path: str = MANIFEST_PATH) -> Dict:
+    """The manifest at `path` checked against `data_hash`; raises `ArtifactError` when there is none."""
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise ArtifactError(f"ไม่พบ {path} (หรือสร้างด้วยเวอร์ชันเก่า): รัน python build_index.py ก่อน")
+    check_manifest(manifest, data_hash)
+    return manifest
+
+
+def index_file(name: str) -> str:
+    return os.path.join(INDEX_DIR, f'{name}.pkl')
+
+
+def format_version(index: Any) -> int:
+    """`FORMAT_VERSION` of the index's class (0 for a class that does not declare one)."""
+    return getattr(type(index), 'FORMAT_VERSION', 0)
+
+
+def save_index(name: str, index: Any, data_hash: str, input_hash: Optional[str] = None) -> str:
+    """Pickle `index`; `input_hash` covers any input beyond the recipe text (see `dataset_index`)."""
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    path = index_file(name)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump({'version': MANIFEST_VERSION, 'format_version': format_version(index),
+                     'dataset_hash': data_hash, 'input_hash': input_hash, 'index': index},
+                    f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_index(name: str, data_hash: str, input_hash: Optional[str] = None) -> Any:
+    """
+    Pickled index `name`, built for `data_hash` (and `input_hash`) by the
+    current version of its class; raises `ArtifactError` otherwise.
+    """
+    manifest = read_manifest()
+    entry = manifest['artifacts'].get(name) if manifest else None
+    if not entry or entry.get('kind') != 'index':
+        raise ArtifactError(f"{MANIFEST_PATH} ไม่มีดัชนี '{name}': รัน python build_index.py ก่อน")
+    if entry.get('dataset_hash') != data_hash:
+        raise ArtifactError(f"ดัชนี '{name}' ถูกสร้างจากข้อมูลชุดอื่น: รัน python build_index.py ใหม่")
+    try:
+        with open(index_file(name), 'rb') as f:
+            payload = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+        raise ArtifactError(f"อ่านดัชนี '{name}' ไม่ได้ ({e}): รัน python build_index.py ใหม่") from e
+    if payload.get('dataset_hash') != data_hash or payload.get('input_hash') != input_hash:
+        raise ArtifactError(f"ดัชนี '{name}' ถูกสร้างจากข้อมูลชุดอื่น: รัน python build_index.py ใหม่")
+    expected = format_version(payload['index'])
+    if payload.get('format_version') != expected or entry.get('format_version') != expected:
+        raise ArtifactError(
+            f"ดัชนี '{name}' ถูกสร้างด้วยรูปแบบเวอร์ชัน {payload.get('format_version')} "
+            f"แต่โค้ดปัจจุบันใช้เวอร์ชัน {expected}: รัน python build_index.py ใหม่"
+        )
+    return payload['index']
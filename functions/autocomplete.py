@@ -0,0 +1,110 @@
+"""
+Type-ahead suggestions over recipe names and ingredient names.
+
+Every recipe name and every distinct ingredient name (the text of an
+ingredient line before its amount, see `ingredient_names`) becomes one
+entry, keyed by `name_key` (whitespace removed, lower-cased, Thai marks in
+canonical order) and counted: recipes sharing a name, or recipes using an
+ingredient. The keys are kept in one sorted list, so the entries starting
+with a prefix are the contiguous range found by two `bisect` calls; only
+that range is ranked by a global rank (frequency, then length, then key)
+computed once at build time: in plain Python when narrow, with
+`argpartition` when wide. A lookup costs microseconds and never touches the DataFrame.
+
+A suggestion's text is the most common spelling of its key, so picking a
+recipe suggestion yields an exact recipe name.
+"""
+
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from functions.fuzzy_index import ingredient_names, name_key
+
+DEFAULT_SUGGESTIONS = 8
+# ช่วงที่แคบกว่านี้เรียงด้วย Python ล้วน (เร็วกว่า overhead ของ NumPy กับอาร์เรย์เล็ก)
+SMALL_RANGE = 256
+KINDS = ('recipe', 'ingredient')
+# มากกว่าอักขระใด ๆ ที่อยู่ในคีย์: ขอบบนของช่วงคีย์ที่ขึ้นต้นด้วย prefix
+_KEY_SENTINEL = '\U0010ffff'
+
+
+class Autocomplete:
+    """Sorted (key, kind) entries with their display text and frequency."""
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, data):
+        spellings: Dict[Tuple[str, int], Counter] = {}
+        counts: Counter = Counter()
+        names = data['name'].astype(str).tolist()
+        if 'ingredient' in data.columns:
+            ingredients = data['ingredient'].fillna('').astype(str).tolist()
+        else:
+            ingredients = [''] * len(data)
+        for name, ingredient_text in zip(names, ingredients):
+            entries = [(name.strip(), 0)]
+            entries += [(ingredient, 1) for ingredient in dict.fromkeys(ingredient_names(ingredient_text))]
+            for text, kind in entries:
+                key = name_key(text)
+                if not key:
+                    continue
+                counts[key, kind] += 1
+                spellings.setdefault((key, kind), Counter())[text] += 1
+
+        ordered = sorted(counts)
+        self.keys: List[str] = [key for key, _ in ordered]
+        self.kinds = np.array([kind for _, kind in ordered], dtype=np.int8)
+        self.counts = np.array([counts[entry] for entry in ordered], dtype=np.int32)
+        self.texts: List[str] = [spellings[entry].most_common(1)[0][0] for entry in ordered]
+        self.key_lengths = np.array([len(key) for key in self.keys], dtype=np.int32)
+        self._kind_ids = self.kinds.tolist()
+        self._count_list = self.counts.tolist()
+        # ลำดับรวมของทุก entry (ความถี่ > ความยาว > ลำดับคีย์) เรียงครั้งเดียวตอนสร้าง
+        by_rank = np.lexsort((np.arange(len(self.keys)), self.key_lengths, -self.counts))
+        self.rank = np.empty(len(self.keys), dtype=np.int64)
+        self.rank[by_rank] = np.arange(len(self.keys))
+        self._rank = self.rank.tolist()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """[start, stop) of the entries whose key starts with `prefix`'s key."""
+        key = name_key(prefix)
+        if not key:
+            return 0, 0
+        return bisect_left(self.keys, key), bisect_left(self.keys, key + _KEY_SENTINEL)
+
+    def suggest(self, prefix: str, limit: int = DEFAULT_SUGGESTIONS,
+                kind: Optional[str] = None) -> List[Dict]:
+        """
+        Up to `limit` names starting with `prefix`, most frequent first (then
+        shorter, then alphabetical), as {'text', 'kind', 'count'}. `kind`
+        restricts them to 'recipe' or 'ingredient'.
+        """
+        start, stop = self.prefix_range(prefix)
+        if start == stop or limit <= 0:
+            return []
+        if stop - start <= SMALL_RANGE:
+            candidates = range(start, stop)
+            if kind is not None:
+                kind_id = KINDS.index(kind)
+                candidates = [i for i in candidates if self._kind_ids[i] == kind_id]
+            order = sorted(candidates, key=self._rank.__getitem__)[:limit]
+        else:
+            order = self._rank_wide(start, stop, limit, kind).tolist()
+        return [{'text': self.texts[i], 'kind': KINDS[self._kind_ids[i]], 'count': self._count_list[i]}
+                for i in order]
+
+    def _rank_wide(self, start: int, stop: int, limit: int, kind: Optional[str]) -> np.ndarray:
+        candidates = np.arange(start, stop)
+        if kind is not None:
+            candidates = candidates[self.kinds[start:stop] == KINDS.index(kind)]
+        ranks = self.rank[candidates]
+        if len(candidates) > limit:
+            top = np.argpartition(ranks, limit - 1)[:limit]
+            candidates, ranks = candidates[top], ranks[top]
+        return candidates[np.argsort(ranks)]
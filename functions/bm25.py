@@ -0,0 +1,131 @@
+"""
+BM25 lexical search over recipe name, ingredient and method fields.
+
+Field term frequencies are combined BM25F-style (per-field length
+normalization and weights), and the per-(term, recipe) contribution is
+precomputed into term-major CSR arrays (`indptr`, `doc_ids`, `weights`).
+A query is then a handful of posting-list slices plus a sparse accumulation,
+pure NumPy, no torch or scikit-learn needed.
+
+Thai has no spaces between words, so Thai runs are indexed as bigrams of
+grapheme clusters; Latin words and numbers are indexed whole.
+"""
+
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from functions.fuzzy_index import thai_clusters
+from functions.scoring import top_k
+
+BM25_FIELD_WEIGHTS = {'name': 3.0, 'ingredient': 2.0, 'method': 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TERM_RUN_RE = re.compile(r'[\u0e00-\u0e7f]+|[a-z0-9]+')
+
+
+def lexical_terms(text: str) -> List[str]:
+    """Index terms of `text`: Thai cluster bigrams and whole Latin/digit words."""
+    terms = []
+    for run in _TERM_RUN_RE.findall(str(text).lower()):
+        if not ('\u0e00' <= run[0] <= '\u0e7f'):
+            terms.append(run)
+            continue
+        clusters = thai_clusters(run)
+        if len(clusters) == 1:
+            terms.append(clusters[0])
+        else:
+            terms.extend(clusters[i] + clusters[i + 1] for i in range(len(clusters) - 1))
+    return terms
+
+
+class BM25Index:
+    """Term-major CSR postings of precomputed BM25F contributions."""
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, data, field_weights: Optional[Dict[str, float]] = None,
+                 k1: float = BM25_K1, b: float = BM25_B):
+        self.field_weights = dict(field_weights or BM25_FIELD_WEIGHTS)
+        self.k1 = k1
+        self.b = b
+        self.size = len(data)
+        self.vocabulary: Dict[str, int] = {}
+
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        values: List[float] = []
+        for field, weight in self.field_weights.items():
+            if field not in data.columns or weight == 0:
+                continue
+            field_terms = [Counter(lexical_terms(text)) for text in data[field].fillna('').astype(str)]
+            lengths = np.array([sum(c.values()) for c in field_terms], dtype=np.float64)
+            average = lengths.mean() if len(lengths) and lengths.mean() > 0 else 1.0
+            norms = weight / (1.0 - b + b * lengths / average)
+            for doc, counts in enumerate(field_terms):
+                for term, tf in counts.items():
+                    term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                    doc_ids.append(doc)
+                    values.append(tf * norms[doc])
+
+        n_terms = len(self.vocabulary)
+        if not term_ids:
+            self.indptr = np.zeros(n_terms + 1, dtype=np.int64)
+            self.doc_ids = np.array([], dtype=np.int32)
+            self.weights = np.array([], dtype=np.float32)
+            self.idf = np.zeros(n_terms, dtype=np.float32)
+            return
+
+        # รวม tf ของคู่ (term, doc) ที่มาจากหลายฟิลด์ แล้วเรียงแบบ term-major
+        keys = np.array(term_ids, dtype=np.int64) * max(self.size, 1) + np.array(doc_ids, dtype=np.int64)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        pseudo_tf = np.bincount(inverse, weights=np.array(values))
+        terms = unique_keys // max(self.size, 1)
+        docs = unique_keys % max(self.size, 1)
+
+        df = np.bincount(terms, minlength=n_terms)
+        self.idf = np.log(1.0 + (self.size - df + 0.5) / (df + 0.5)).astype(np.float32)
+        saturation = pseudo_tf * (k1 + 1.0) / (pseudo_tf + k1)
+        self.indptr = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+        self.doc_ids = docs.astype(np.int32)
+        self.weights = (self.idf[terms] * saturation).astype(np.float32)
+
+    def query_terms(self, query: str) -> Counter:
+        return Counter(t for t in lexical_terms(query) if t in self.vocabulary)
+
+    def score_candidates(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(doc ids, BM25 scores) for every recipe sharing a term with `query`."""
+        terms = self.query_terms(query)
+        if not terms:
+            return np.array([], dtype=np.int32), np.array([], dtype=np.float32)
+        docs, weights = [], []
+        for term, qtf in terms.items():
+            t = self.vocabulary[term]
+            start, end = self.indptr[t], self.indptr[t + 1]
+            docs.append(self.doc_ids[start:end])
+            weights.append(self.weights[start:end] * qtf)
+        unique_docs, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+        return unique_docs, np.bincount(inverse, weights=np.concatenate(weights)).astype(np.float32)
+
+    def upper_bound(self, query: str) -> float:
+        """Score no recipe can reach: every query term at full saturation."""
+        terms = self.query_terms(query)
+        return float(sum(self.idf[self.vocabulary[t]] * (self.k1 + 1.0) * qtf for t, qtf in terms.items()))
+
+    def search(self, query: str, k: int, mask=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k (row indices, similarities); similarity is the BM25 score divided
+        by `upper_bound`, so it falls in [0, 1). With a boolean `mask`, only
+        allowed recipes are ranked.
+        """
+        docs, scores = self.score_candidates(query)
+        if mask is not None:
+            keep = mask[docs]
+            docs, scores = docs[keep], scores[keep]
+        if len(docs) == 0:
+            return docs.astype(np.int64), scores
+        best = top_k(scores, k)
+        return docs[best].astype(np.int64), scores[best] / self.upper_bound(query)
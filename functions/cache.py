@@ -0,0 +1,199 @@
+"""
+Process-wide LRU caches for query embeddings, search results and lexical indexes.
+
+The caches are shared by every Streamlit session in the server process,
+bounded in size, expire entries after a TTL and count hits and misses. Keys
+include a dataset fingerprint, so entries for an old dataset or rebuilt
+embeddings are never served and simply age out. Objects without a content
+hash (the model, an embedding matrix) are keyed by `object_token`, which
+unlike `id()` is never reused by a later object.
+"""
+
+import itertools
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from functions.artifacts import load_index
+from functions.embedding_store import dataset_hash
+
+QUERY_EMBEDDING_CACHE_SIZE = 2048
+SEARCH_RESULT_CACHE_SIZE = 1024
+INDEX_CACHE_SIZE = 16
+CACHE_TTL_SECONDS = 600
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU cache with per-entry TTL and hit/miss counters."""
+
+    def __init__(self, max_size: int, ttl_seconds: float = CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and now - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+query_embedding_cache = LRUCache(QUERY_EMBEDDING_CACHE_SIZE)
+search_result_cache = LRUCache(SEARCH_RESULT_CACHE_SIZE)
+# ดัชนีไม่มีวันหมดอายุ: โหลดใหม่เมื่อข้อมูลเปลี่ยนเท่านั้น
+index_cache = LRUCache(INDEX_CACHE_SIZE, ttl_seconds=float('inf'))
+
+# id(obj) -> (weakref to obj, value). Every entry is checked against the live
+# object through its weakref, so a recycled id never returns a stale value.
+_content_hashes: Dict[Callable, Dict[int, Tuple[Any, str]]] = {}
+_object_tokens: Dict[int, Tuple[Any, int]] = {}
+_registry_lock = threading.Lock()
+_next_token = itertools.count(1)
+
+
+def _lookup(registry: Dict[int, Tuple[Any, Any]], obj) -> Any:
+    with _registry_lock:
+        entry = registry.get(id(obj))
+        if entry is not None and entry[0]() is obj:
+            return entry[1]
+    return _MISSING
+
+
+def _remember(registry: Dict[int, Tuple[Any, Any]], obj, value) -> bool:
+    key = id(obj)
+
+    def forget(ref, key=key):
+        # ลบเฉพาะ entry ของอ็อบเจกต์ที่ตายแล้ว ไม่ใช่ของอ็อบเจกต์ใหม่ที่ได้ id ซ้ำ
+        with _registry_lock:
+            if registry.get(key, (None,))[0] is ref:
+                del registry[key]
+
+    try:
+        ref = weakref.ref(obj, forget)
+    except TypeError:
+        return False
+    with _registry_lock:
+        registry[key] = (ref, value)
+    return True
+
+
+def cached_dataset_hash(data, hash_function: Callable = dataset_hash) -> str:
+    """`hash_function(data)` (default `dataset_hash`), computed once per DataFrame object."""
+    with _registry_lock:
+        registry = _content_hashes.setdefault(hash_function, {})
+    value = _lookup(registry, data)
+    if value is _MISSING:
+        value = hash_function(data)
+        _remember(registry, data, value)
+    return value
+
+
+def object_token(obj) -> Any:
+    """
+    Cache-key stand-in for an object without a content hash (a model, an
+    embedding matrix): a counter value never reused for another object while
+    this one is alive, unlike `id(obj)`. None for None.
+    """
+    if obj is None:
+        return None
+    token = _lookup(_object_tokens, obj)
+    if token is _MISSING:
+        token = next(_next_token)
+        if not _remember(_object_tokens, obj, token):
+            # ไม่รองรับ weakref: ใช้ทั้ง id และ type (แคชอาจพลาด แต่ไม่ปนข้ามชนิดข้อมูล)
+            token = (type(obj).__name__, id(obj))
+    return token
+
+
+def dataset_fingerprint(data, embeddings) -> Tuple:
+    """Identifies the dataset contents and the embedding matrix in use."""
+    return (cached_dataset_hash(data), object_token(embeddings), len(embeddings) if embeddings is not None else 0)
+
+
+def _index_key(data, name: str, input_hash: Optional[Callable]) -> Tuple:
+    inputs = cached_dataset_hash(data, input_hash) if input_hash is not None else None
+    return (name, cached_dataset_hash(data), inputs)
+
+
+def dataset_index(data, name: str, input_hash: Optional[Callable] = None) -> Any:
+    """
+    Prebuilt index `name` for this dataset version, loaded once from the
+    artifacts written by `build_index.py` (see `functions.artifacts`) and
+    shared process-wide; raises `ArtifactError` when it was not built for
+    this data. An index that reads more than the recipe text passes
+    `input_hash`, a content hash of everything it reads, which is then part
+    of the key as well.
+    """
+    key = _index_key(data, name, input_hash)
+    index = index_cache.get(key)
+    if index is None:
+        index = load_index(name, key[1], key[2])
+        index_cache.put(key, index)
+    return index
+
+
+def put_dataset_index(data, name: str, index: Any, input_hash: Optional[Callable] = None) -> None:
+    """Serve `index` as `dataset_index(data, name)` without artifacts on disk (e.g. a synthetic corpus)."""
+    index_cache.put(_index_key(data, name, input_hash), index)
+
+
+def dataset_value(data, name: str, build: Callable) -> Any:
+    """`build(data)` once per dataset version, shared process-wide; for values that are not artifacts."""
+    key = _index_key(data, name, None)
+    value = index_cache.get(key)
+    if value is None:
+        value = build(data)
+        index_cache.put(key, value)
+    return value
+
+
+def cache_stats() -> Dict[str, Dict[str, float]]:
+    return {
+        'query_embeddings': query_embedding_cache.stats(),
+        'search_results': search_result_cache.stats(),
+    }
+
+
+def clear_caches() -> None:
+    query_embedding_cache.clear()
+    search_result_cache.clear()
+    index_cache.clear()
@@ -6,20 +6,20 @@ import streamlit as st
 DATA_PATH = "thai_food_processed_cleaned.csv"
 LEGACY_DATA_PATH = "thai_food_processed.csv"
 
-@st.cache_data
-def load_food_data():
-    """Load Thai food dataset, handling legacy column names."""
-    if os.path.exists(DATA_PATH):
-        df = pd.read_csv(DATA_PATH)
-    elif os.path.exists(LEGACY_DATA_PATH):
-        df = pd.read_csv(LEGACY_DATA_PATH)
-    else:
-        return pd.DataFrame()
-
+def read_food_csv(path: str) -> pd.DataFrame:
+    """Read a recipe CSV, renaming legacy columns (no Streamlit caching)."""
+    df = pd.read_csv(path)
     if 'text_ingradiant' in df.columns:
         df = df.rename(columns={'text_ingradiant': 'ingredient'})
     if 'food_method' in df.columns:
         df = df.rename(columns={'food_method': 'method'})
     return df
 
-
+@st.cache_data
+def load_food_data():
+    """Load Thai food dataset, handling legacy column names."""
+    if os.path.exists(DATA_PATH):
+        return read_food_csv(DATA_PATH)
+    if os.path.exists(LEGACY_DATA_PATH):
+        return read_food_csv(LEGACY_DATA_PATH)
+    return pd.DataFrame()
@@ -0,0 +1,226 @@
+"""
+On-disk embedding store: a raw float32 matrix plus a small JSON header.
+
+The matrix file is opened with `np.memmap`, so every Streamlit worker maps the
+same page-cache pages instead of unpickling a private copy. The header records
+the model name, dimension, row count and a content hash of the dataset; any
+mismatch makes `open_store` return None. The app only loads stores, so
+`functions.search.open_embeddings` turns that into an `ArtifactError`;
+rebuilding is left to build_index.py.
+
+Vectors are stored L2-normalized, so cosine scoring needs no per-load copy.
+A sidecar `.rowhash` file keeps a 64-bit hash of each row's source text, so
+`build_incremental` can reuse vectors of unchanged recipes and only encode
+new or edited ones.
+"""
+
+import hashlib
+import json
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from functions.scoring import normalize_rows
+
+# v2: rows are stored L2-normalized
+STORE_FORMAT_VERSION = 2
+REUSABLE_FORMAT_VERSIONS = (1, 2)
+STORE_DTYPE = np.float32
+HASH_COLUMNS = ('name', 'ingredient', 'method')
+
+
+def header_path(path: str) -> str:
+    """Path of the JSON header that describes the matrix at `path`."""
+    return os.path.splitext(path)[0] + '.json'
+
+
+def row_hash_path(path: str) -> str:
+    return os.path.splitext(path)[0] + '.rowhash'
+
+
+def row_hashes(texts: List[str]) -> np.ndarray:
+    """64-bit content hash per text, used to match rows across rebuilds."""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(t.encode('utf-8'), digest_size=8).digest(), 'little')
+         for t in texts),
+        dtype=np.uint64,
+        count=len(texts),
+    )
+
+
+def read_row_hashes(path: str, rows: int) -> Optional[np.ndarray]:
+    try:
+        hashes = np.fromfile(row_hash_path(path), dtype=np.uint64)
+    except (OSError, ValueError):
+        return None
+    return hashes if len(hashes) == rows else None
+
+
+def dataset_hash(data) -> str:
+    """Content hash of the recipe text columns, in row order."""
+    digest = hashlib.sha256()
+    digest.update(str(len(data)).encode('utf-8'))
+    for column in HASH_COLUMNS:
+        if column in data.columns:
+            values = data[column].fillna('').astype(str).tolist()
+        else:
+            values = [''] * len(data)
+        digest.update(b'\x1e')
+        digest.update('\x1f'.join(values).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def read_header(path: str) -> Optional[Dict]:
+    try:
+        with open(header_path(path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def map_store(path: str) -> Optional[np.ndarray]:
+    """Map the matrix at `path` as its own header describes it, without dataset checks."""
+    header = read_header(path)
+    if not header:
+        return None
+    return open_store(path, header.get('model'), header.get('dataset_hash'), int(header.get('rows', 0)),
+                      REUSABLE_FORMAT_VERSIONS)
+
+
+def open_store(path: str, model_name: str, data_hash: str, rows: int,
+               versions: Tuple[int, ...] = (STORE_FORMAT_VERSION,)) -> Optional[np.ndarray]:
+    """
+    Map the stored matrix read-only if its header matches the expected model,
+    row count and dataset hash; otherwise return None.
+    """
+    header = read_header(path)
+    if not header:
+        return None
+    if (header.get('version') not in versions
+            or header.get('model') != model_name
+            or header.get('rows') != rows
+            or header.get('dataset_hash') != data_hash):
+        return None
+
+    dim = int(header.get('dim', 0))
+    expected_bytes = rows * dim * np.dtype(STORE_DTYPE).itemsize
+    try:
+        if os.path.getsize(path) != expected_bytes:
+            return None
+    except OSError:
+        return None
+
+    if rows == 0 or dim == 0:
+        return np.zeros((rows, dim), dtype=STORE_DTYPE)
+    return np.memmap(path, dtype=STORE_DTYPE, mode='r', shape=(rows, dim))
+
+
+def write_store(path: str, embeddings, model_name: str, data_hash: str,
+                hashes: Optional[np.ndarray] = None, normalized: bool = False) -> Dict:
+    """
+    Write `embeddings` as a raw float32 matrix and its header, plus the
+    per-row `hashes` when given.
+
+    The old header is removed first and the new one written last, so an
+    interrupted write never leaves a header that vouches for the wrong matrix.
+    """
+    matrix = np.ascontiguousarray(embeddings, dtype=STORE_DTYPE)
+    if matrix.ndim != 2:
+        raise ValueError(f"embeddings must be 2-D, got shape {matrix.shape}")
+
+    meta_path = header_path(path)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = path + '.tmp'
+    matrix.tofile(tmp_path)
+    os.replace(tmp_path, path)
+
+    hash_file = row_hash_path(path)
+    if hashes is not None:
+        tmp_hash = hash_file + '.tmp'
+        np.ascontiguousarray(hashes, dtype=np.uint64).tofile(tmp_hash)
+        os.replace(tmp_hash, hash_file)
+    elif os.path.exists(hash_file):
+        os.remove(hash_file)
+
+    header = {
+        'version': STORE_FORMAT_VERSION,
+        'model': model_name,
+        'dtype': np.dtype(STORE_DTYPE).name,
+        'rows': int(matrix.shape[0]),
+        'dim': int(matrix.shape[1]),
+        'dataset_hash': data_hash,
+        'normalized': normalized,
+    }
+    tmp_meta = meta_path + '.tmp'
+    with open(tmp_meta, 'w', encoding='utf-8') as f:
+        json.dump(header, f, indent=2)
+    os.replace(tmp_meta, meta_path)
+    return header
+
+
+def build_incremental(path: str, texts: List[str], encode: Callable, model_name: str,
+                      data_hash: str) -> Tuple[np.ndarray, Dict]:
+    """
+    Open the store at `path`, re-encoding only rows whose text changed.
+
+    Rows are matched to the previous build by text hash, so reordering,
+    insertions and deletions all reuse existing vectors. `encode` receives
+    the list of texts that need new vectors; results are stored normalized.
+    Returns the (memory-mapped)
+    matrix and a stats dict with `reused` and `encoded` counts.
+    """
+    rows = len(texts)
+    embeddings = open_store(path, model_name, data_hash, rows)
+    if embeddings is not None:
+        return embeddings, {'reused': rows, 'encoded': 0}
+
+    new_hashes = row_hashes(texts)
+    old_matrix = None
+    old_positions = {}
+    header = read_header(path)
+    if header and header.get('version') in REUSABLE_FORMAT_VERSIONS and header.get('model') == model_name:
+        old_rows = int(header.get('rows', 0))
+        old_hashes = read_row_hashes(path, old_rows)
+        if old_hashes is not None and old_rows > 0:
+            old_matrix = open_store(path, model_name, header.get('dataset_hash'), old_rows,
+                                    REUSABLE_FORMAT_VERSIONS)
+        if old_matrix is not None:
+            old_positions = dict(zip(old_hashes.tolist(), range(old_rows)))
+
+    source = np.array([old_positions.get(h, -1) for h in new_hashes.tolist()], dtype=np.int64)
+    reuse_mask = source >= 0
+    missing = np.flatnonzero(~reuse_mask)
+
+    encoded = None
+    if len(missing) > 0:
+        encoded = normalize_rows(encode([texts[i] for i in missing]))
+
+    if old_matrix is not None:
+        dim = old_matrix.shape[1]
+    elif encoded is not None:
+        dim = encoded.shape[1]
+    else:
+        dim = 0
+    matrix = np.empty((rows, dim), dtype=STORE_DTYPE)
+    if reuse_mask.any():
+        # v1 stores are not normalized; normalizing again is a no-op for v2
+        matrix[reuse_mask] = normalize_rows(old_matrix[source[reuse_mask]])
+    if encoded is not None:
+        matrix[missing] = encoded
+    # ปล่อย memmap เดิมก่อนเขียนทับไฟล์
+    del old_matrix
+
+    stats = {'reused': int(reuse_mask.sum()), 'encoded': int(len(missing))}
+    try:
+        write_store(path, matrix, model_name, data_hash, new_hashes, normalized=True)
+    except OSError:
+        return matrix, stats
+    reopened = open_store(path, model_name, data_hash, rows)
+    return (reopened if reopened is not None else matrix), stats
@@ -0,0 +1,123 @@
+"""
+Parallel, batched corpus encoding for embedding builds.
+
+`ParallelEncoder` spreads `encode(texts)` over a pool of worker processes.
+Each worker builds its own encoder once (for the app: a SentenceTransformer
+loaded from the saved model directory) and caps torch at
+`threads_per_worker` intra-op threads, so N workers x T threads match the
+cores instead of every process fighting for all of them. Texts are sent in
+chunks of `batch_size * CHUNK_BATCHES` and reassembled in input order.
+
+The pool uses the 'spawn' start method: torch is not fork-safe once it has
+started its thread pool. Small jobs (below `min_parallel_rows`) are encoded
+in-process, since starting workers and loading the model in each costs
+seconds. Every call records rows, seconds and rows/s in `stats`.
+
+`build_index.py` drives it for full builds (`--workers`, `--batch-size`,
+`--threads-per-worker`).
+"""
+
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_BATCH_SIZE = 64
+CHUNK_BATCHES = 8
+MIN_PARALLEL_ROWS = 2000
+
+# สถานะของแต่ละ worker process (ตั้งครั้งเดียวตอนเริ่ม worker)
+_worker_encoder = None
+
+
+def set_torch_threads(threads: Optional[int]) -> None:
+    """Cap torch intra-op threads in this process; no-op without torch or when None."""
+    if not threads:
+        return
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+def load_sentence_transformer(model_path: str):
+    """Picklable encoder factory for workers: the SentenceTransformer at `model_path`."""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_path)
+
+
+def _init_worker(factory: Callable, factory_args: tuple, threads: Optional[int]) -> None:
+    global _worker_encoder
+    set_torch_threads(threads)
+    _worker_encoder = factory(*factory_args)
+
+
+def _encode_chunk(job) -> np.ndarray:
+    texts, batch_size = job
+    return np.asarray(_worker_encoder.encode(texts, batch_size=batch_size), dtype=np.float32)
+
+
+class ParallelEncoder:
+    """
+    `encode(texts)` over `workers` processes. `factory(*factory_args)` must be
+    picklable and return an object with `encode(texts, batch_size=...)`;
+    `local` (optional) is an already-loaded encoder used for small jobs and
+    when `workers` is 1.
+    """
+
+    def __init__(self, factory: Callable, factory_args: tuple = (), local=None, workers: int = 1,
+                 batch_size: int = DEFAULT_BATCH_SIZE, threads_per_worker: Optional[int] = None,
+                 min_parallel_rows: int = MIN_PARALLEL_ROWS):
+        self.factory = factory
+        self.factory_args = tuple(factory_args)
+        self.local = local
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.threads_per_worker = threads_per_worker
+        self.min_parallel_rows = min_parallel_rows
+        self.stats: Dict[str, float] = {}
+
+    def _encode_local(self, texts: List[str]) -> np.ndarray:
+        if self.local is None:
+            self.local = self.factory(*self.factory_args)
+        return np.asarray(self.local.encode(texts, batch_size=self.batch_size), dtype=np.float32)
+
+    def _encode_pool(self, texts: List[str]) -> np.ndarray:
+        import multiprocessing
+
+        chunk_rows = self.batch_size * CHUNK_BATCHES
+        jobs = [(texts[i:i + chunk_rows], self.batch_size) for i in range(0, len(texts), chunk_rows)]
+        workers = min(self.workers, len(jobs))
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(workers, initializer=_init_worker,
+                          initargs=(self.factory, self.factory_args, self.threads_per_worker)) as pool:
+            return np.concatenate(pool.map(_encode_chunk, jobs, chunksize=1))
+
+    def encode(self, texts: Sequence[str], **_) -> np.ndarray:
+        texts = list(texts)
+        started = time.perf_counter()
+        parallel = self.workers > 1 and len(texts) >= self.min_parallel_rows
+        matrix = self._encode_pool(texts) if parallel else self._encode_local(texts)
+        seconds = time.perf_counter() - started
+        self.stats = {
+            'rows': len(texts),
+            'seconds': seconds,
+            'rows_per_second': len(texts) / seconds if seconds > 0 else 0.0,
+            'workers': self.workers if parallel else 1,
+            'batch_size': self.batch_size,
+        }
+        return matrix
+
+
+def combined_texts(data) -> List[str]:
+    """'name ingredient method' per row, from whole columns (NaN reads as 'nan', as `str()` does)."""
+    columns = [data[column].to_numpy(dtype=object) if column in data.columns else np.full(len(data), '', dtype=object)
+               for column in ('name', 'ingredient', 'method')]
+    return [f"{name} {ingredient} {method}" for name, ingredient, method in zip(*columns)]
+
+
+def ingredient_texts(data) -> List[str]:
+    return data['ingredient'].fillna('').astype(str).tolist()
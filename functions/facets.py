@@ -0,0 +1,135 @@
+"""
+Structured facet filters (category, complexity, ingredient count) for search.
+
+`FacetIndex` precomputes one boolean row mask per category and complexity
+value and keeps `ingredient_count` as an int32 column, so a filter such as
+`{'category': {'อาหารผัด', 'แกงและซุป'}, 'complexity': 'ง่าย',
+'ingredient_count': (3, 8)}` becomes a few OR/AND operations over
+pre-built masks. The resulting mask is handed to the vector, lexical and
+fuzzy backends, which drop disallowed rows before top-k selection, so a
+filtered query still fills all k slots.
+
+Datasets without the columns written by `preprocess.enhance_recipe_data`
+(e.g. the raw `thai_food_processed.csv`) get them derived with the same
+rules (`functions.recipe_tags`) on first use.
+
+The masks depend on those columns as well as on the recipe text, so they
+are cached and prebuilt under `facet_hash`, which covers both: editing a
+category or complexity invalidates them even when `dataset_hash` is unchanged.
+"""
+
+import hashlib
+from typing import Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+from functions.embedding_store import dataset_hash
+from functions.recipe_tags import categorize_food, count_ingredients, estimate_complexity
+
+CATEGORICAL_FACETS = ('category', 'complexity')
+RANGE_FACETS = ('ingredient_count',)
+FACETS = CATEGORICAL_FACETS + RANGE_FACETS
+
+
+def facet_hash(data) -> str:
+    """Content hash of the facet inputs: `dataset_hash` plus the stored facet columns."""
+    digest = hashlib.sha256(dataset_hash(data).encode('utf-8'))
+    for column in FACETS:
+        digest.update(b'\x1e' + column.encode('utf-8'))
+        if column in data.columns:
+            digest.update(b'\x1d' + '\x1f'.join(data[column].astype(str).tolist()).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _column(data, column: str, derive):
+    if column in data.columns:
+        return data[column]
+    return derive()
+
+
+class FacetIndex:
+    """Per-value boolean masks for categorical facets plus numeric range columns."""
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, data):
+        self.size = len(data)
+        ingredients = data['ingredient'].fillna('') if 'ingredient' in data.columns else [''] * len(data)
+        methods = data['method'].fillna('') if 'method' in data.columns else [''] * len(data)
+        counts = _column(data, 'ingredient_count', lambda: [count_ingredients(t) for t in ingredients])
+        self.ranges: Dict[str, np.ndarray] = {
+            'ingredient_count': np.nan_to_num(np.asarray(counts, dtype=np.float64)).astype(np.int32),
+        }
+
+        categorical = {
+            'category': _column(data, 'category', lambda: [categorize_food(n) for n in data['name']]),
+            'complexity': _column(data, 'complexity', lambda: [
+                estimate_complexity(c, m) for c, m in zip(self.ranges['ingredient_count'].tolist(), methods)
+            ]),
+        }
+        self.masks: Dict[str, Dict[str, np.ndarray]] = {}
+        for facet, values in categorical.items():
+            distinct, codes = np.unique(np.array([str(v) for v in values], dtype=object), return_inverse=True)
+            self.masks[facet] = {value: codes == i for i, value in enumerate(distinct.tolist())}
+
+    def values(self, facet: str) -> Dict[str, int]:
+        """Value -> row count for a categorical facet, most common first."""
+        counts = {value: int(mask.sum()) for value, mask in self.masks.get(facet, {}).items()}
+        return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+
+    def value_range(self, facet: str) -> Tuple[int, int]:
+        column = self.ranges[facet]
+        if len(column) == 0:
+            return 0, 0
+        return int(column.min()), int(column.max())
+
+    def mask(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        """
+        Rows allowed by `filters`, or None when nothing is filtered. Categorical
+        facets take one value or a collection of values (OR within a facet);
+        range facets take `(low, high)`, inclusive, either end None for open.
+        Facets are ANDed together; unknown facet names raise ValueError.
+        """
+        if not filters:
+            return None
+        allowed = np.ones(self.size, dtype=bool)
+        filtered = False
+        for facet, wanted in filters.items():
+            if wanted is None:
+                continue
+            if facet in self.masks:
+                values = [wanted] if isinstance(wanted, str) else list(wanted)
+                facet_mask = np.zeros(self.size, dtype=bool)
+                for value in values:
+                    value_mask = self.masks[facet].get(str(value))
+                    if value_mask is not None:
+                        facet_mask |= value_mask
+                allowed &= facet_mask
+            elif facet in self.ranges:
+                low, high = wanted
+                column = self.ranges[facet]
+                if low is not None:
+                    allowed &= column >= low
+                if high is not None:
+                    allowed &= column <= high
+            else:
+                raise ValueError(f"unknown facet {facet!r}; expected one of {FACETS}")
+            filtered = True
+        return allowed if filtered else None
+
+
+def filter_key(filters: Optional[Dict]) -> Optional[Hashable]:
+    """Hashable, order-independent form of `filters` for cache keys."""
+    if not filters:
+        return None
+    key = []
+    for facet, wanted in sorted(filters.items()):
+        if wanted is None:
+            continue
+        if facet in RANGE_FACETS:
+            key.append((facet, tuple(wanted)))
+        elif isinstance(wanted, str):
+            key.append((facet, (wanted,)))
+        else:
+            key.append((facet, tuple(sorted(str(v) for v in wanted))))
+    return tuple(key) or None
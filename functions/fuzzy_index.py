@@ -0,0 +1,460 @@
+"""
+Prebuilt lexical indexes for the fuzzy (no-model) search path.
+
+`TokenIndex` maps every distinct lower-cased name / ingredient token / method
+token to the rows that contain it. A query is compared once per distinct
+token instead of once per token occurrence per row, and the
+`SequenceMatcher.real_quick_ratio` / `quick_ratio` upper bounds (token length
+and character-multiset overlap) are evaluated for the whole vocabulary with
+NumPy, so the exact `ratio()` only runs on tokens that can pass the threshold.
+Scores are identical to scanning every row.
+
+`NgramIndex` is a character-trigram index over recipe names and ingredient
+names (the text of each ingredient line before its amount). Thai text has
+few spaces, so trigrams are taken over grapheme clusters: a base character
+keeps its combining vowels and tone marks, which are put in canonical order
+so that typing order does not matter. Candidates come from trigram overlap
+and only those are rescored with `SequenceMatcher`.
+
+`SymSpellIndex` precomputes the deletion neighbourhood of every recipe name
+(SymSpell), so edit-distance-bounded name correction costs a few dictionary
+lookups instead of a scan. Its `close_matches` returns exactly what
+`difflib.get_close_matches` returns over all names: per-character postings
+give every name's `quick_ratio` bound in one NumPy pass, and `ratio()` only
+runs on names whose bound can still beat the current n-th best.
+
+`NameIndex` maps normalized recipe names to rows for exact-name queries:
+`name_key` (whitespace, case, Thai mark order) for exact hits and
+`loose_name_key` (also ignoring tone marks, punctuation and ใ/ไ) for
+near-exact ones.
+"""
+
+import difflib
+import heapq
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+FIELDS = ('name', 'ingredient', 'method')
+
+
+def _column_text(data, column: str) -> List[str]:
+    # เหมือน str(row.get(column, '')) ในการวนทีละแถว (NaN -> 'nan')
+    if column not in data.columns:
+        return [''] * len(data)
+    return [str(value).lower() for value in data[column].tolist()]
+
+
+class TokenIndex:
+    """Token -> row posting lists over the name, ingredient and method fields."""
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, data):
+        self.size = len(data)
+        self.vocab: Dict[str, List[str]] = {}
+        self.postings: Dict[str, List[np.ndarray]] = {}
+        self.lengths: Dict[str, np.ndarray] = {}
+        self.char_columns: Dict[str, Dict[str, int]] = {}
+        self.char_counts: Dict[str, np.ndarray] = {}
+        for field in FIELDS:
+            texts = _column_text(data, field)
+            if field == 'name':
+                tokenized = [[text] for text in texts]
+            else:
+                tokenized = [text.split() for text in texts]
+            rows_by_token: Dict[str, List[int]] = {}
+            for row, tokens in enumerate(tokenized):
+                for token in set(tokens):
+                    rows_by_token.setdefault(token, []).append(row)
+            self.vocab[field] = list(rows_by_token)
+            self.postings[field] = [np.array(rows, dtype=np.int32) for rows in rows_by_token.values()]
+            self.lengths[field] = np.array([len(token) for token in rows_by_token], dtype=np.int64)
+            self.char_columns[field], self.char_counts[field] = self._char_count_matrix(self.vocab[field])
+
+    @staticmethod
+    def _char_count_matrix(tokens: List[str]):
+        """(tokens x characters) count matrix, column-major for per-character slicing."""
+        columns: Dict[str, int] = {}
+        for token in tokens:
+            for ch in token:
+                columns.setdefault(ch, len(columns))
+        counts = np.zeros((len(tokens), len(columns)), dtype=np.int32, order='F')
+        for i, token in enumerate(tokens):
+            for ch, count in Counter(token).items():
+                counts[i, columns[ch]] = count
+        return columns, counts
+
+    def field_scores(self, query_lower: str, field: str, threshold: float) -> Dict[int, float]:
+        """
+        Best `SequenceMatcher(None, query, token).ratio()` per row for `field`,
+        keeping only rows whose best score is above `threshold`.
+        """
+        matcher = difflib.SequenceMatcher(None, query_lower)
+        scores: Dict[int, float] = {}
+        lengths = self.lengths[field]
+        total = lengths + len(query_lower)
+        # real_quick_ratio: ขึ้นกับความยาวอย่างเดียว
+        real_quick = np.divide(2.0 * np.minimum(lengths, len(query_lower)), total,
+                               out=np.ones(len(lengths)), where=total > 0)
+        # quick_ratio: จำนวนตัวอักษรที่ซ้ำกันแบบ multiset
+        matches = np.zeros(len(lengths), dtype=np.int64)
+        columns = self.char_columns[field]
+        counts = self.char_counts[field]
+        for ch, count in Counter(query_lower).items():
+            column = columns.get(ch)
+            if column is not None:
+                matches += np.minimum(counts[:, column], count)
+        quick = np.divide(2.0 * matches, total, out=np.ones(len(lengths)), where=total > 0)
+
+        vocab = self.vocab[field]
+        postings = self.postings[field]
+        for i in np.flatnonzero((real_quick > threshold) & (quick > threshold)).tolist():
+            matcher.set_seq2(vocab[i])
+            rows = postings[i]
+            score = matcher.ratio()
+            if score <= threshold:
+                continue
+            for row in rows.tolist():
+                if score > scores.get(row, 0.0):
+                    scores[row] = score
+        return scores
+
+    def content_scores(self, query_lower: str, search_mode: str, threshold: float) -> Dict[int, float]:
+        """Per-row content score for `search_mode`, only for rows above `threshold`."""
+        if search_mode == 'ingredient':
+            fields = ('ingredient',)
+        elif search_mode == 'name':
+            fields = ('name',)
+        else:
+            fields = FIELDS
+        scores: Dict[int, float] = {}
+        for field in fields:
+            for row, score in self.field_scores(query_lower, field, threshold).items():
+                if score > scores.get(row, 0.0):
+                    scores[row] = score
+        return scores
+
+
+# สระบน/ล่าง และวรรณยุกต์ที่ต้องอยู่กับพยัญชนะตัวหน้า
+THAI_VOWEL_MARKS = '\u0e31\u0e34\u0e35\u0e36\u0e37\u0e38\u0e39\u0e3a'
+THAI_TONE_MARKS = '\u0e47\u0e48\u0e49\u0e4a\u0e4b\u0e4c\u0e4d\u0e4e'
+_THAI_CLUSTER_RE = re.compile(
+    f'[^{THAI_VOWEL_MARKS}{THAI_TONE_MARKS}][{THAI_VOWEL_MARKS}{THAI_TONE_MARKS}]*'
+)
+_MARK_ORDER = {ch: i for i, ch in enumerate(THAI_VOWEL_MARKS + THAI_TONE_MARKS)}
+# ใ/ไ สลับกันบ่อยเวลาพิมพ์ผิด: รวมเป็นตัวเดียวตอนหา candidate เท่านั้น
+_CANDIDATE_FOLD = str.maketrans({'\u0e43': '\u0e44'})
+# วรรณยุกต์ การันต์ และเครื่องหมายวรรคตอน: ไม่นับตอนเทียบชื่อแบบเกือบตรง
+_LOOSE_DROP_RE = re.compile(f'[{THAI_TONE_MARKS}]|[^\\w{THAI_VOWEL_MARKS}]')
+_INGREDIENT_BULLET_RE = re.compile(r'^[-•*\s]+')
+_INGREDIENT_AMOUNT_RE = re.compile(r'[^\d]*')
+
+NGRAM_SIZE = 3
+NGRAM_MIN_OVERLAP = 0.25
+NGRAM_MAX_CANDIDATES = 200
+
+
+def thai_clusters(text: str) -> List[str]:
+    """
+    Split `text` into grapheme clusters: each base character with its Thai
+    combining vowels and tone marks, marks sorted vowel-first.
+    """
+    text = unicodedata.normalize('NFC', text.lower())
+    clusters = []
+    for cluster in _THAI_CLUSTER_RE.findall(text):
+        if len(cluster) > 2:
+            cluster = cluster[0] + ''.join(sorted(cluster[1:], key=_MARK_ORDER.__getitem__))
+        clusters.append(cluster)
+    return clusters
+
+
+def normalize_thai(text: str) -> str:
+    return ''.join(thai_clusters(text))
+
+
+def name_key(text: str) -> str:
+    """Lookup key for a name: whitespace removed, lower-cased, Thai marks in canonical order."""
+    return normalize_thai(''.join(str(text).split()))
+
+
+def loose_name_key(text: str) -> str:
+    """`name_key` without tone marks or punctuation, and with ใ/ไ folded: near-exact matching."""
+    return _LOOSE_DROP_RE.sub('', name_key(text).translate(_CANDIDATE_FOLD))
+
+
+def char_ngrams(text: str, n: int = NGRAM_SIZE) -> List[str]:
+    """Distinct cluster n-grams of `text`, padded with start/end markers."""
+    units = ['\x02'] + [c for c in thai_clusters(text.translate(_CANDIDATE_FOLD)) if not c.isspace()] + ['\x03']
+    if len(units) < n:
+        return ['\x1f'.join(units)]
+    return list(dict.fromkeys('\x1f'.join(units[i:i + n]) for i in range(len(units) - n + 1)))
+
+
+def ingredient_names(ingredient_text: str) -> List[str]:
+    """Ingredient names from a bullet list: each line's text before its amount."""
+    names = []
+    for line in str(ingredient_text).split('\n'):
+        line = _INGREDIENT_BULLET_RE.sub('', line).strip()
+        if not line:
+            continue
+        name = _INGREDIENT_AMOUNT_RE.match(line).group().strip()
+        names.append(name or line)
+    return names
+
+
+class NgramIndex:
+    """Cluster n-gram (trigram by default) postings over recipe names and ingredient names."""
+
+    FORMAT_VERSION = 1
+    NAME = 0
+    INGREDIENT = 1
+
+    def __init__(self, data, n: int = NGRAM_SIZE):
+        self.n = n
+        texts: List[str] = []
+        rows: List[int] = []
+        fields: List[int] = []
+        names = data['name'].astype(str).tolist()
+        ingredients = data['ingredient'].fillna('').astype(str).tolist() if 'ingredient' in data.columns else [''] * len(data)
+        for row, (name, ingredient_text) in enumerate(zip(names, ingredients)):
+            texts.append(name)
+            rows.append(row)
+            fields.append(self.NAME)
+            for ingredient in dict.fromkeys(ingredient_names(ingredient_text)):
+                texts.append(ingredient)
+                rows.append(row)
+                fields.append(self.INGREDIENT)
+
+        self.texts = [normalize_thai(text) for text in texts]
+        self.rows = np.array(rows, dtype=np.int32)
+        self.fields = np.array(fields, dtype=np.int8)
+        postings: Dict[str, List[int]] = {}
+        for entry, text in enumerate(texts):
+            for gram in char_ngrams(text, n):
+                postings.setdefault(gram, []).append(entry)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def candidates(self, query: str, fields: Tuple[int, ...]) -> np.ndarray:
+        """Entry ids sharing enough trigrams with `query`, capped to the best-overlapping ones."""
+        grams = char_ngrams(query, self.n)
+        lists = [self.postings[g] for g in grams if g in self.postings]
+        if not lists:
+            return np.array([], dtype=np.int32)
+        entries, overlap = np.unique(np.concatenate(lists), return_counts=True)
+        keep = (overlap >= max(1.0, NGRAM_MIN_OVERLAP * len(grams))) & np.isin(self.fields[entries], fields)
+        entries, overlap = entries[keep], overlap[keep]
+        if len(entries) > NGRAM_MAX_CANDIDATES:
+            best = np.argsort(-overlap, kind='stable')[:NGRAM_MAX_CANDIDATES]
+            entries = np.sort(entries[best])
+        return entries
+
+    def search(self, query: str, search_mode: str, threshold: float) -> Dict[int, float]:
+        """Best rescored `SequenceMatcher` ratio per row, for rows above `threshold`."""
+        if search_mode == 'ingredient':
+            fields = (self.INGREDIENT,)
+        elif search_mode == 'name':
+            fields = (self.NAME,)
+        else:
+            fields = (self.NAME, self.INGREDIENT)
+        matcher = difflib.SequenceMatcher(None, normalize_thai(query))
+        scores: Dict[int, float] = {}
+        for entry in self.candidates(query, fields).tolist():
+            matcher.set_seq2(self.texts[entry])
+            score = matcher.ratio()
+            row = int(self.rows[entry])
+            if score >= threshold and score > scores.get(row, 0.0):
+                scores[row] = score
+        return scores
+
+
+SYMSPELL_MAX_DISTANCE = 2
+SYMSPELL_PREFIX_LENGTH = 7
+
+
+def _deletes(word: str, max_distance: int) -> set:
+    """`word` and every string reachable from it by up to `max_distance` deletions."""
+    results = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - results
+        results |= frontier
+    return results
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Optimal-string-alignment distance (adjacent transpositions count as one
+    edit); returns `max_distance + 1` as soon as the bound is exceeded.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
+
+
+class SymSpellIndex:
+    """
+    Deletion-neighbourhood index over normalized recipe names, plus character
+    postings over the distinct names for `close_matches`.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, data, max_distance: int = SYMSPELL_MAX_DISTANCE,
+                 prefix_length: int = SYMSPELL_PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.name_rows: Dict[str, List[int]] = {}
+        for row, name in enumerate(data['name'].astype(str).tolist()):
+            self.name_rows.setdefault(normalize_thai(name), []).append(row)
+
+        deletes: Dict[str, List[str]] = {}
+        for key in self.name_rows:
+            for variant in _deletes(key[:prefix_length], max_distance):
+                deletes.setdefault(variant, []).append(key)
+        self.deletes = deletes
+
+        # ชื่อที่ไม่ซ้ำกัน (ตามตัวอักษรเดิม ไม่ normalize) กับแถวแรกของแต่ละชื่อ
+        name_ids: Dict[str, int] = {}
+        row_name_ids = []
+        for name in data['name'].astype(str).tolist():
+            row_name_ids.append(name_ids.setdefault(name, len(name_ids)))
+        self.names: List[str] = list(name_ids)
+        self.row_name_ids = np.array(row_name_ids, dtype=np.int32)
+        self.name_first_rows = np.zeros(len(self.names), dtype=np.int64)
+        self.name_first_rows[self.row_name_ids[::-1]] = np.arange(len(row_name_ids))[::-1]
+        self.name_lengths = np.array([len(name) for name in self.names], dtype=np.int64)
+        # character -> (name ids, count in that name): upper bound of matching characters
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for name_id, name in enumerate(self.names):
+            for ch, count in Counter(name).items():
+                ids, counts = postings.setdefault(ch, ([], []))
+                ids.append(name_id)
+                counts.append(count)
+        self.char_postings = {ch: (np.array(ids, dtype=np.int32), np.array(counts, dtype=np.int32))
+                              for ch, (ids, counts) in postings.items()}
+
+    def close_matches(self, query: str, n: int, cutoff: float, seed_rows: Iterable[int] = (),
+                      mask=None) -> List[Tuple[float, int]]:
+        """
+        Same names, scores and order as `difflib.get_close_matches(query,
+        names, n, cutoff)` over the distinct names, as (score, first row).
+        With a boolean row `mask`, only names with an allowed row compete and
+        the first allowed row is returned.
+
+        `real_quick_ratio` / `quick_ratio` bounds are computed for every name
+        at once from the character postings; `ratio()` then runs on names in
+        decreasing bound order (after `seed_rows`, likely good matches such as
+        SymSpell hits) and stops once no remaining bound can reach the n-th
+        best score.
+        """
+        if n <= 0 or not self.names:
+            return []
+        total = self.name_lengths + len(query)
+        real_quick = np.divide(2.0 * np.minimum(self.name_lengths, len(query)), total,
+                               out=np.ones(len(total)), where=total > 0)
+        matches = np.zeros(len(self.names), dtype=np.int64)
+        for ch, count in Counter(query).items():
+            posting = self.char_postings.get(ch)
+            if posting is not None:
+                matches[posting[0]] += np.minimum(posting[1], count)
+        quick = np.divide(2.0 * matches, total, out=np.ones(len(total)), where=total > 0)
+
+        passes = (real_quick >= cutoff) & (quick >= cutoff)
+        first_rows = self.name_first_rows
+        if mask is not None:
+            allowed_rows = np.flatnonzero(mask)
+            allowed_ids, first = np.unique(self.row_name_ids[allowed_rows], return_index=True)
+            first_rows = np.full(len(self.names), -1, dtype=np.int64)
+            first_rows[allowed_ids] = allowed_rows[first]
+            passes &= first_rows >= 0
+        eligible = np.flatnonzero(passes)
+        seeds = np.unique(self.row_name_ids[np.fromiter(seed_rows, dtype=np.int64)])
+        seeds = seeds[passes[seeds]]
+        rest = eligible[np.argsort(-quick[eligible], kind='stable')]
+
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(query)
+        best: List[Tuple[float, str, int]] = []  # min-heap ของ n อันดับแรก (score, name, id)
+        for name_id in seeds.tolist():
+            self._push(best, n, cutoff, matcher, name_id)
+        seen = set(seeds.tolist())
+        for name_id in rest.tolist():
+            # เรียงตาม bound: ถ้า bound ต่ำกว่าคะแนนอันดับที่ n แล้ว ชื่อที่เหลือแซงไม่ได้
+            if len(best) == n and quick[name_id] < best[0][0]:
+                break
+            if name_id not in seen:
+                self._push(best, n, cutoff, matcher, name_id)
+        return [(score, int(first_rows[name_id])) for score, _, name_id in sorted(best, reverse=True)]
+
+    def _push(self, best: List[Tuple[float, str, int]], n: int, cutoff: float, matcher, name_id: int) -> None:
+        matcher.set_seq1(self.names[name_id])
+        score = matcher.ratio()
+        if score < cutoff:
+            return
+        entry = (score, self.names[name_id], name_id)
+        if len(best) < n:
+            heapq.heappush(best, entry)
+        elif entry > best[0]:
+            heapq.heapreplace(best, entry)
+
+    def lookup(self, query: str) -> List[Tuple[str, int]]:
+        """
+        Normalized names within the edit-distance bound of `query`, as
+        (name, distance) sorted by distance. Short queries allow one edit.
+        """
+        query_key = normalize_thai(query)
+        if not query_key:
+            return []
+        max_distance = self.max_distance if len(query_key) >= 4 else 1
+        candidates = set()
+        for variant in _deletes(query_key[:self.prefix_length], max_distance):
+            candidates.update(self.deletes.get(variant, ()))
+
+        matches = []
+        for key in candidates:
+            distance = edit_distance(query_key, key, max_distance)
+            if distance <= max_distance:
+                matches.append((key, distance))
+        matches.sort(key=lambda m: (m[1], m[0]))
+        return matches
+
+
+class NameIndex:
+    """
+    Exact-name lookup: hash maps from `name_key` and from `loose_name_key`
+    of every recipe name to its rows.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, data):
+        self.exact: Dict[str, List[int]] = {}
+        self.loose: Dict[str, List[int]] = {}
+        for row, name in enumerate(data['name'].astype(str).tolist()):
+            self.exact.setdefault(name_key(name), []).append(row)
+            self.loose.setdefault(loose_name_key(name), []).append(row)
+
+    def lookup(self, query: str) -> Tuple[List[int], bool]:
+        """(rows, exact): rows whose name equals `query` exactly, else near-exactly, else ([], False)."""
+        rows = self.exact.get(name_key(query))
+        if rows:
+            return rows, True
+        key = loose_name_key(query)
+        return (self.loose.get(key, []) if key else []), False
@@ -0,0 +1,97 @@
+"""
+Dependency-free hashed bag-of-n-grams embeddings (the "hashing trick").
+
+Features are Thai grapheme-cluster n-grams within each run of Thai text and
+whole Latin/digit words. Each feature is hashed with CRC-32 into one of
+`n_features` float32 columns, with a sign bit taken from the same hash to
+cancel collisions on average. CRC-32 does not depend on `PYTHONHASHSEED`, so
+the same text gives the same vector in every process and the matrices can be
+stored on disk like model embeddings.
+
+benchmark.py uses it to embed synthetic corpora without a model. The app's
+no-model tier is the sparse TF-IDF index (`functions.tfidf_index`), which is
+equally dependency-free.
+"""
+
+import re
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from functions.fuzzy_index import normalize_thai, thai_clusters
+from functions.scoring import normalize_rows
+
+HASHING_FORMAT_VERSION = 1
+HASHING_FEATURES = 2 ** 13
+HASHING_NGRAM_SIZES = (1, 2, 3)
+ENCODE_CHUNK_ROWS = 1024
+# จำนวน feature ที่จำค่า hash ไว้ (n-gram ที่พบบ่อยซ้ำกันมาก; จำกัดไว้ไม่ให้โตตามคลังข้อความ)
+FEATURE_HASH_CACHE_SIZE = 2 ** 16
+
+_RUN_RE = re.compile(r'[\u0e00-\u0e7f]+|[a-z0-9]+')
+
+
+@lru_cache(maxsize=FEATURE_HASH_CACHE_SIZE)
+def _feature_hash(feature: str) -> int:
+    return zlib.crc32(feature.encode('utf-8'))
+
+
+def hashing_features(text: str, ngram_sizes: Sequence[int] = HASHING_NGRAM_SIZES) -> List[str]:
+    """Features of `text`, with repeats: cluster n-grams of Thai runs and whole Latin words."""
+    features = []
+    for run in _RUN_RE.findall(str(text).lower()):
+        if not ('\u0e00' <= run[0] <= '\u0e7f'):
+            features.append(run)
+            continue
+        clusters = thai_clusters(normalize_thai(run))
+        for n in ngram_sizes:
+            if n == 1:
+                features.extend(clusters)
+            else:
+                features.extend(map(''.join, zip(*(clusters[i:] for i in range(n)))))
+    return features
+
+
+class HashingEncoder:
+    """
+    Stateless encoder with the `encode(texts)` shape of a SentenceTransformer:
+    returns a (len(texts) x n_features) float32 matrix with unit-length rows.
+    """
+
+    def __init__(self, n_features: int = HASHING_FEATURES,
+                 ngram_sizes: Sequence[int] = HASHING_NGRAM_SIZES):
+        self.n_features = n_features
+        self.ngram_sizes = tuple(ngram_sizes)
+
+    @property
+    def name(self) -> str:
+        """Identifies the feature space, for embedding-store headers."""
+        sizes = ','.join(str(n) for n in self.ngram_sizes)
+        return f'hashing-v{HASHING_FORMAT_VERSION}-{self.n_features}-{sizes}'
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        h = _feature_hash(feature)
+        return h % self.n_features, -1.0 if h & 0x80000000 else 1.0
+
+    def encode(self, texts: Sequence[str], **_) -> np.ndarray:
+        texts = list(texts)
+        matrix = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        for start in range(0, len(texts), ENCODE_CHUNK_ROWS):
+            chunk = texts[start:start + ENCODE_CHUNK_ROWS]
+            rows, columns, signs = [], [], []
+            for row, text in enumerate(chunk):
+                for feature, count in Counter(hashing_features(text, self.ngram_sizes)).items():
+                    column, sign = self._bucket(feature)
+                    rows.append(row)
+                    columns.append(column)
+                    signs.append(sign * count)
+            if not rows:
+                continue
+            # รวมทุก feature ของ chunk ในครั้งเดียวด้วย bincount แทนการวนบวกทีละช่อง
+            flat = np.array(rows, dtype=np.int64) * self.n_features + np.array(columns, dtype=np.int64)
+            counts = np.bincount(flat, weights=signs, minlength=len(chunk) * self.n_features)
+            matrix[start:start + len(chunk)] = counts.reshape(len(chunk), self.n_features)
+        return normalize_rows(matrix)
@@ -0,0 +1,121 @@
+"""
+Building the search artifacts for one dataset: everything the app loads.
+
+`build_index.py` runs these ahead of deploy and records the results in
+`artifacts.json`; `benchmark.py` uses them on its synthetic corpora. The
+app and service.py never call this module: they only load what it wrote
+(see `functions.search`) and raise `ArtifactError` when something is
+missing, so no request ever pays for a build.
+
+The choice of vector backend follows the settings in `functions.search`
+(`EMBEDDING_PCA_DIM`, `EMBEDDING_QUANTIZATION`, `EMBEDDING_SHARD_ROWS`),
+and `functions.search.open_vector_index` loads the same choice back.
+"""
+
+import warnings
+from typing import Optional
+
+from functions.ann import index_path, load_or_build_ivf
+from functions.autocomplete import Autocomplete
+from functions.bm25 import BM25Index
+from functions.cache import put_dataset_index
+from functions.embedding_store import build_incremental, dataset_hash
+from functions.encoding import ParallelEncoder, load_sentence_transformer
+from functions.facets import FacetIndex
+from functions.fuzzy_index import NameIndex, NgramIndex, SymSpellIndex, TokenIndex
+from functions.neighbours import NeighbourList
+from functions.pca import load_or_build_pca
+from functions.quantize import load_or_build_quantized, quantized_path
+from functions.scoring import ExactIndex
+from functions.search import (
+    EMBEDDING_PCA_DIM, EMBEDDING_QUANTIZATION, EMBEDDING_SHARD_ROWS, INDEX_INPUT_HASHES, MODEL_NAME, MODEL_PATH
+)
+from functions.sharded_store import ShardedIndex, ShardedStore, build_sharded, exact_index
+
+# Corpus encoding: 1 = in-process; >1 = worker processes, each capped at ENCODE_THREADS_PER_WORKER torch threads
+ENCODE_WORKERS = 1
+ENCODE_BATCH_SIZE = 64
+ENCODE_THREADS_PER_WORKER = None
+
+
+def bigram_index(data) -> NgramIndex:
+    return NgramIndex(data, n=2)
+
+
+# ดัชนีในหน่วยความจำต่อชุดข้อมูล: build_index.py บันทึกเป็น pickle ใน indexes/ แอปโหลดด้วยชื่อเดียวกัน
+INDEX_BUILDERS = {
+    'bm25': BM25Index,
+    'token': TokenIndex,
+    'ngram': NgramIndex,
+    'bigram': bigram_index,
+    'symspell': SymSpellIndex,
+    'facets': FacetIndex,
+    'autocomplete': Autocomplete,
+    'names': NameIndex,
+}
+
+
+def cache_indexes(data, neighbours: Optional[NeighbourList] = None) -> None:
+    """
+    Build every `INDEX_BUILDERS` index for `data` straight into the
+    process-wide cache, with no files written, so the search functions run
+    on a corpus that has no artifacts (benchmark.py). `neighbours` defaults
+    to an empty list: exact-name queries are then encoded as usual.
+    """
+    for name, build in INDEX_BUILDERS.items():
+        put_dataset_index(data, name, build(data), INDEX_INPUT_HASHES.get(name))
+    put_dataset_index(data, 'neighbours', neighbours if neighbours is not None else NeighbourList.empty(len(data)))
+
+
+def corpus_encoder(model=None, workers: int = ENCODE_WORKERS, batch_size: int = ENCODE_BATCH_SIZE,
+                   threads_per_worker: Optional[int] = ENCODE_THREADS_PER_WORKER) -> ParallelEncoder:
+    """Encoder for embedding builds; worker processes load the model saved at MODEL_PATH."""
+    return ParallelEncoder(load_sentence_transformer, (MODEL_PATH,), local=model, workers=workers,
+                           batch_size=batch_size, threads_per_worker=threads_per_worker)
+
+
+def build_embeddings(data, path, texts, encode):
+    """
+    Open or incrementally rebuild the store at `path` (sharded when
+    `EMBEDDING_SHARD_ROWS` is set), encoding only new or changed rows.
+    Returns the store and build stats.
+    """
+    if EMBEDDING_SHARD_ROWS:
+        return build_sharded(path, texts, encode, MODEL_NAME, dataset_hash(data), EMBEDDING_SHARD_ROWS)
+    return build_incremental(path, texts, encode, MODEL_NAME, dataset_hash(data))
+
+
+def build_vector_index(embeddings, path: str, data_hash: str):
+    """
+    Vector index for the store at `path`, loaded from or written next to it:
+    IVF for large corpora, its probed lists scored over the PCA projection
+    (`EMBEDDING_PCA_DIM`) or else the int8/float16 copy
+    (`EMBEDDING_QUANTIZATION`) when one is configured; below the IVF size,
+    that compact copy alone, or exact scoring. A sharded store is always
+    scored shard by shard.
+    """
+    if isinstance(embeddings, ShardedStore):
+        # IVF/PCA/quantized copies need the whole matrix in one piece
+        return ShardedIndex(embeddings)
+    # สำเนาขนาดเล็ก (PCA หรือ int8/float16) ใช้ทั้งแบบเดี่ยวและเป็นตัวให้คะแนนของ IVF
+    compact_index = None
+    if EMBEDDING_PCA_DIM:
+        if EMBEDDING_QUANTIZATION:
+            warnings.warn('EMBEDDING_PCA_DIM and EMBEDDING_QUANTIZATION are both set; '
+                          'scoring in the PCA-reduced space and ignoring EMBEDDING_QUANTIZATION')
+        compact_index = load_or_build_pca(embeddings, path, data_hash, EMBEDDING_PCA_DIM)
+    elif EMBEDDING_QUANTIZATION:
+        compact_index = load_or_build_quantized(
+            embeddings, quantized_path(path, EMBEDDING_QUANTIZATION), data_hash, EMBEDDING_QUANTIZATION
+        )
+    ivf_index = load_or_build_ivf(embeddings, index_path(path), data_hash, scorer=compact_index)
+    if ivf_index is not None:
+        return ivf_index
+    if compact_index is not None:
+        return compact_index
+    return ExactIndex(embeddings, normalized=True)
+
+
+def build_neighbours(embeddings) -> NeighbourList:
+    """The `NEIGHBOUR_COUNT` most similar recipes of every row, scored exactly."""
+    return NeighbourList.build(embeddings, exact_index(embeddings))
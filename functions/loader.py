@@ -0,0 +1,76 @@
+"""
+Background loading for slow start-up work, plus start-up timings.
+
+`BackgroundLoader` runs one build function on a daemon thread, so the app
+can render and serve lexical/fuzzy search while the sentence-transformer
+model and its indexes load, then switch to semantic search once `result`
+is available. `mark_startup` records, once per process, how long after
+import each start-up milestone was reached.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+PROCESS_STARTED = time.monotonic()
+
+_startup_timings: Dict[str, float] = {}
+_startup_lock = threading.Lock()
+
+
+def mark_startup(event: str) -> float:
+    """Seconds from process start to the first time `event` was marked."""
+    with _startup_lock:
+        if event not in _startup_timings:
+            _startup_timings[event] = time.monotonic() - PROCESS_STARTED
+        return _startup_timings[event]
+
+
+def startup_timings() -> Dict[str, float]:
+    with _startup_lock:
+        return dict(_startup_timings)
+
+
+class BackgroundLoader:
+    """Runs `build()` once on a daemon thread; status is 'pending', 'loading', 'ready' or 'failed'."""
+
+    def __init__(self, build: Callable[[], Any], name: str = 'background-loader'):
+        self._build = build
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._lock = threading.Lock()
+        self.status = 'pending'
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.seconds: Optional[float] = None
+
+    def start(self) -> 'BackgroundLoader':
+        with self._lock:
+            if self.status == 'pending':
+                self.status = 'loading'
+                self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        started = time.monotonic()
+        try:
+            result = self._build()
+        except Exception as e:
+            with self._lock:
+                self.error = e
+                self.status = 'failed'
+        else:
+            with self._lock:
+                self.result = result
+                self.status = 'ready'
+        finally:
+            self.seconds = time.monotonic() - started
+
+    @property
+    def ready(self) -> bool:
+        return self.status == 'ready'
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the build finishes (for scripts and tests); True when ready."""
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        return self.ready
@@ -0,0 +1,99 @@
+"""
+Precomputed semantic neighbours: the `NEIGHBOUR_COUNT` most similar recipes
+of every recipe, by cosine similarity of the combined embeddings.
+
+The exact-name fast path in `functions.search` uses them to follow an exact
+recipe-name hit with similar dishes without encoding the query: the hit's
+row already has an embedding, so its neighbours can be scored once, offline.
+`build_index.py` builds the list after the embedding store and saves it
+next to it (`embeddings.neighbours.npz`), with the dataset hash and row
+count it was built for.
+"""
+
+import json
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+NEIGHBOURS_FORMAT_VERSION = 1
+NEIGHBOUR_COUNT = 20
+NEIGHBOUR_CHUNK_ROWS = 1024
+
+
+def neighbours_path(path: str) -> str:
+    """Path of the neighbour list that sits next to the embedding store at `path`."""
+    return os.path.splitext(path)[0] + '.neighbours.npz'
+
+
+class NeighbourList:
+    """(rows x k) neighbour ids and cosine scores, best first; -1 pads rows with fewer than k."""
+
+    def __init__(self, ids: np.ndarray, scores: np.ndarray):
+        self.ids = ids
+        self.scores = scores
+
+    @property
+    def k(self) -> int:
+        return self.ids.shape[1]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def empty(cls, rows: int) -> 'NeighbourList':
+        return cls(np.zeros((rows, 0), dtype=np.int32), np.zeros((rows, 0), dtype=np.float32))
+
+    @classmethod
+    def build(cls, embeddings, index, k: int = NEIGHBOUR_COUNT,
+              chunk_rows: int = NEIGHBOUR_CHUNK_ROWS) -> 'NeighbourList':
+        """
+        Neighbours of every row of `embeddings` (row-normalized) via
+        `index.search_batch`, one chunk of rows at a time; a row is never its
+        own neighbour.
+        """
+        rows = len(embeddings)
+        k = min(k, max(rows - 1, 0))
+        ids = np.full((rows, k), -1, dtype=np.int32)
+        scores = np.zeros((rows, k), dtype=np.float32)
+        for start in range(0, rows, chunk_rows):
+            chunk = np.asarray(embeddings[start:start + chunk_rows], dtype=np.float32)
+            chunk_ids, chunk_scores = index.search_batch(chunk, k + 1)
+            for offset, (row_ids, row_scores) in enumerate(zip(chunk_ids, chunk_scores)):
+                # แถวที่ข้อความซ้ำกันได้คะแนน 1.0 เท่ากัน ตัวเองจึงอาจไม่อยู่อันดับแรก
+                keep = np.asarray(row_ids) != start + offset
+                row_ids, row_scores = np.asarray(row_ids)[keep][:k], np.asarray(row_scores)[keep][:k]
+                ids[start + offset, :len(row_ids)] = row_ids
+                scores[start + offset, :len(row_ids)] = row_scores
+        return cls(ids, scores)
+
+    def of(self, row: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, scores) of the neighbours of `row`, best first."""
+        ids = self.ids[row]
+        keep = ids >= 0
+        return ids[keep].astype(np.int64), self.scores[row][keep]
+
+    def save(self, path: str, data_hash: str) -> None:
+        meta = {
+            'version': NEIGHBOURS_FORMAT_VERSION,
+            'rows': int(len(self)),
+            'k': int(self.k),
+            'dataset_hash': data_hash,
+        }
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, ids=self.ids, scores=self.scores, meta=np.array(json.dumps(meta)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, rows: int, data_hash: str) -> Optional['NeighbourList']:
+        """Load the list at `path` if it was built for this dataset and row count."""
+        try:
+            with np.load(path) as archive:
+                meta = json.loads(str(archive['meta']))
+                if (meta.get('version') != NEIGHBOURS_FORMAT_VERSION
+                        or meta.get('rows') != rows
+                        or meta.get('dataset_hash') != data_hash):
+                    return None
+                return cls(archive['ids'], archive['scores'])
+        except (OSError, ValueError, KeyError):
+            return None
@@ -0,0 +1,244 @@
+"""
+PCA dimensionality reduction for embedding stores.
+
+The projection is fitted offline on the corpus: the top `dim` eigenvectors of
+the (uncentred) second-moment matrix, which best preserve the dot products
+used for cosine scoring. The projection matrix is saved next to the store as
+`.pca<dim>.npz` and the reduced, re-normalized corpus as its own embedding
+store (`.pca<dim>.f32`), so the app maps it like the full-size matrix.
+Queries are projected with the same matrix, and the best `k * rescore_factor`
+candidates can be rescored against the full-dimension store. `search_rows`
+scores only given rows, which lets an IVF index (`functions.ann`) probe
+lists in the reduced space.
+
+Run `python -m functions.pca embeddings.f32 --dim 64` to fit and save the
+projection and print recall@k against full-dimension search.
+"""
+
+import argparse
+import json
+import os
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from functions.embedding_store import map_store, open_store, read_header, write_store
+from functions.scoring import (
+    ExactIndex, exact_neighbours, masked_top_k, measure_recall, normalize_rows, normalize_vector, sample_queries, top_k
+)
+
+PCA_FORMAT_VERSION = 1
+DEFAULT_PCA_DIM = 64
+DEFAULT_RESCORE_FACTOR = 4
+FIT_SAMPLE_ROWS = 100000
+PROJECT_CHUNK_ROWS = 65536
+
+
+def projection_path(path: str, dim: int) -> str:
+    """Path of the projection matrix that sits next to the embedding store at `path`."""
+    return os.path.splitext(path)[0] + f'.pca{dim}.npz'
+
+
+def reduced_store_path(path: str, dim: int) -> str:
+    return os.path.splitext(path)[0] + f'.pca{dim}.f32'
+
+
+class PCAProjection:
+    """(dim x full_dim) projection; `transform` returns unit-length reduced rows."""
+
+    def __init__(self, components: np.ndarray, explained_variance: float):
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        self.explained_variance = explained_variance
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, embeddings, dim: int = DEFAULT_PCA_DIM, sample_rows: int = FIT_SAMPLE_ROWS,
+            seed: int = 0) -> 'PCAProjection':
+        rows, full_dim = embeddings.shape
+        dim = min(dim, full_dim)
+        if rows > sample_rows:
+            sample = np.sort(np.random.default_rng(seed).choice(rows, sample_rows, replace=False))
+            train = np.asarray(embeddings[sample], dtype=np.float64)
+        else:
+            train = np.asarray(embeddings, dtype=np.float64)
+        eigenvalues, eigenvectors = np.linalg.eigh(train.T @ train / max(1, len(train)))
+        order = np.argsort(eigenvalues)[::-1][:dim]
+        explained = float(eigenvalues[order].sum() / max(eigenvalues.sum(), 1e-12))
+        return cls(eigenvectors[:, order].T, explained)
+
+    def transform(self, matrix) -> np.ndarray:
+        reduced = np.empty((len(matrix), self.dim), dtype=np.float32)
+        for start in range(0, len(matrix), PROJECT_CHUNK_ROWS):
+            chunk = np.asarray(matrix[start:start + PROJECT_CHUNK_ROWS], dtype=np.float32)
+            reduced[start:start + len(chunk)] = normalize_rows(chunk @ self.components.T)
+        return reduced
+
+    def transform_vector(self, vector) -> np.ndarray:
+        return normalize_vector(self.components @ normalize_vector(vector))
+
+    def save(self, path: str, data_hash: str, rows: int) -> None:
+        meta = {
+            'version': PCA_FORMAT_VERSION,
+            'dim': self.dim,
+            'full_dim': int(self.components.shape[1]),
+            'rows': rows,
+            'dataset_hash': data_hash,
+            'explained_variance': self.explained_variance,
+        }
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, components=self.components, meta=np.array(json.dumps(meta)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, data_hash: str, rows: int, full_dim: int) -> Optional['PCAProjection']:
+        try:
+            with np.load(path) as archive:
+                meta = json.loads(str(archive['meta']))
+                if (meta.get('version') != PCA_FORMAT_VERSION
+                        or meta.get('rows') != rows
+                        or meta.get('full_dim') != full_dim
+                        or meta.get('dataset_hash') != data_hash):
+                    return None
+                return cls(archive['components'], float(meta.get('explained_variance', 0.0)))
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+class PCAIndex:
+    """
+    Cosine search in the reduced space; same `search` interface as the other
+    backends. With `rescore_factor` > 0 and the full matrix available, the
+    returned scores are exact full-dimension cosines.
+    """
+
+    def __init__(self, projection: PCAProjection, reduced, embeddings=None,
+                 rescore_factor: int = DEFAULT_RESCORE_FACTOR):
+        self.projection = projection
+        self.reduced = reduced
+        self.embeddings = embeddings
+        self.rescore_factor = rescore_factor if embeddings is not None else 0
+
+    def search(self, query_vector, k: int, rescore_factor: Optional[int] = None,
+               mask=None) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self.reduced @ self.projection.transform_vector(query_vector)
+        factor = self.rescore_factor if rescore_factor is None else rescore_factor
+        if factor <= 0 or self.embeddings is None:
+            top = masked_top_k(scores, k, mask)
+            return top, scores[top]
+        candidates = np.sort(masked_top_k(scores, k * factor, mask))
+        exact = np.asarray(self.embeddings[candidates], dtype=np.float32) @ normalize_vector(query_vector)
+        top = top_k(exact, k)
+        return candidates[top], exact[top]
+
+    def search_rows(self, rows: np.ndarray, query_vector, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Best k of `rows` (sorted ids): reduced-space scores, then exact rescoring as in `search`."""
+        scores = np.asarray(self.reduced[rows], dtype=np.float32) @ self.projection.transform_vector(query_vector)
+        if self.rescore_factor <= 0:
+            top = top_k(scores, k)
+            return rows[top], scores[top]
+        candidates = np.sort(rows[top_k(scores, k * self.rescore_factor)])
+        exact = np.asarray(self.embeddings[candidates], dtype=np.float32) @ normalize_vector(query_vector)
+        top = top_k(exact, k)
+        return candidates[top], exact[top]
+
+    def search_batch(self, query_vectors, k: int, mask=None):
+        results = [self.search(query, k, mask=mask) for query in np.asarray(query_vectors)]
+        return [r[0] for r in results], [r[1] for r in results]
+
+
+def _reduced_model_name(path: str, dim: int) -> str:
+    header = read_header(path) or {}
+    return f"{header.get('model', '')}+pca{dim}"
+
+
+def load_pca(embeddings, path: str, data_hash: str, dim: int = DEFAULT_PCA_DIM,
+             rescore_factor: int = DEFAULT_RESCORE_FACTOR) -> Optional[PCAIndex]:
+    """PCA index for the store at `path` if its projection and reduced store were written for this dataset."""
+    rows, full_dim = embeddings.shape
+    projection = PCAProjection.load(projection_path(path, dim), data_hash, rows, full_dim)
+    if projection is None:
+        return None
+    reduced = open_store(reduced_store_path(path, dim), _reduced_model_name(path, dim), data_hash, rows)
+    if reduced is None:
+        return None
+    return PCAIndex(projection, reduced, embeddings, rescore_factor)
+
+
+def load_or_build_pca(embeddings, path: str, data_hash: str, dim: int = DEFAULT_PCA_DIM,
+                      rescore_factor: int = DEFAULT_RESCORE_FACTOR) -> Optional[PCAIndex]:
+    """
+    PCA index for the store at `path`: projection and reduced store loaded from
+    disk, or fitted and written there.
+    """
+    if embeddings is None or np.ndim(embeddings) != 2 or len(embeddings) == 0:
+        return None
+    index = load_pca(embeddings, path, data_hash, dim, rescore_factor)
+    if index is not None:
+        return index
+    projection = PCAProjection.fit(embeddings, dim)
+    reduced = projection.transform(embeddings)
+    try:
+        write_store(reduced_store_path(path, dim), reduced, _reduced_model_name(path, dim), data_hash,
+                    normalized=True)
+        projection.save(projection_path(path, dim), data_hash, len(embeddings))
+    except OSError:
+        pass
+    return PCAIndex(projection, reduced, embeddings, rescore_factor)
+
+
+def recall_report(embeddings, dims: Sequence[int], k: int = 10, n_queries: int = 200, seed: int = 0,
+                  rescore_factor: int = DEFAULT_RESCORE_FACTOR) -> Dict[str, Dict[str, float]]:
+    """recall@k of each reduced dimension, with and without rescoring, against full-dimension search."""
+    queries = sample_queries(embeddings, n_queries, seed)
+    reference = exact_neighbours(embeddings, queries, k)
+
+    report = {}
+    for dim in dims:
+        projection = PCAProjection.fit(embeddings, dim)
+        index = PCAIndex(projection, projection.transform(embeddings), embeddings, rescore_factor)
+        for label, factor in (('', 0), ('+rescore', rescore_factor)):
+            recall, ms_per_query = measure_recall(
+                lambda query, k: index.search(query, k, factor), queries, reference, k
+            )
+            report[f'pca{projection.dim}{label}'] = {
+                'recall_at_k': recall,
+                'explained_variance': projection.explained_variance,
+                'ms_per_query': ms_per_query,
+            }
+    _, ms_per_query = measure_recall(ExactIndex(embeddings, normalized=True).search, queries, reference, k)
+    report[f'full{embeddings.shape[1]}'] = {'recall_at_k': 1.0, 'explained_variance': 1.0,
+                                            'ms_per_query': ms_per_query}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ลดมิติ embedding ด้วย PCA และรายงาน recall@k เทียบกับมิติเต็ม')
+    parser.add_argument('store', nargs='?', default='embeddings.f32', help='ไฟล์ embedding store (default: embeddings.f32)')
+    parser.add_argument('--dim', type=int, default=DEFAULT_PCA_DIM, help='จำนวนมิติที่ต้องการบันทึก')
+    parser.add_argument('--report-dims', type=int, nargs='*', default=[32, 64, 128],
+                        help='จำนวนมิติที่จะวัด recall (default: 32 64 128)')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    embeddings = map_store(args.store)
+    header = read_header(args.store)
+    if embeddings is None or header is None:
+        print(f"Error: ไม่พบ embedding store ที่ใช้ได้: {args.store}")
+        return
+
+    index = load_or_build_pca(embeddings, args.store, header['dataset_hash'], args.dim)
+    print(f"บันทึก projection {args.dim} มิติ: {projection_path(args.store, args.dim)} "
+          f"(explained variance {index.projection.explained_variance:.1%})")
+
+    report = recall_report(embeddings, sorted(set(args.report_dims) | {args.dim}), args.k, args.queries)
+    print(f"{'mode':<18}{'recall@' + str(args.k):>10}{'variance':>10}{'ms/query':>10}")
+    for mode, row in report.items():
+        print(f"{mode:<18}{row['recall_at_k']:>10.4f}{row['explained_variance']:>10.1%}{row['ms_per_query']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
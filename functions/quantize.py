@@ -0,0 +1,247 @@
+"""
+Compact int8 / float16 copies of an embedding store, with exact rescoring.
+
+int8 rows are scaled per row (`row ~= codes * scale`, scale = max|row| / 127);
+float16 rows are a plain cast. Queries are scored against the compact matrix
+in row chunks, so no full-size float32 copy is ever made, and the best
+`k * rescore_factor` candidates are rescored against the full-precision store
+(a memmap, so only those rows are paged in).
+
+int8 scores at roughly float32 speed for a quarter of the memory; NumPy's
+float16 upcast is much slower, so float16 only pays off when recall matters
+more than latency.
+
+The codes are saved as a raw `.npy` array (`.int8.npy` / `.float16.npy`) and
+memory-mapped on load, like the float32 store they stand in for, so every
+process shares one page-cache copy. Per-row scales and metadata sit in a
+small `.npz` next to it. `search_rows` scores only given rows, which lets an
+IVF index (`functions.ann`) probe lists over the compact copy.
+
+Run `python -m functions.quantize embeddings.f32` for a recall@k report of
+each mode against exact float32 search.
+"""
+
+import argparse
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from functions.embedding_store import STORE_DTYPE, map_store
+from functions.scoring import (
+    ExactIndex, exact_neighbours, masked_top_k, measure_recall, normalize_vector, sample_queries, top_k
+)
+
+QUANTIZED_FORMAT_VERSION = 2
+QUANTIZATION_DTYPES = ('int8', 'float16')
+DEFAULT_RESCORE_FACTOR = 4
+QUANTIZE_CHUNK_ROWS = 65536
+# small enough that the float32 upcast of a chunk stays in cache
+SCORE_CHUNK_ROWS = 2048
+
+
+def quantized_path(path: str, dtype: str) -> str:
+    """Path of the `dtype` copy's scales and metadata, next to the embedding store at `path`."""
+    return os.path.splitext(path)[0] + f'.{dtype}.npz'
+
+
+def codes_path(path: str, dtype: str) -> str:
+    """Path of the `dtype` copy's memory-mapped codes, next to the embedding store at `path`."""
+    return os.path.splitext(path)[0] + f'.{dtype}.npy'
+
+
+def quantize(embeddings, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """(codes, per-row scales) for int8; (float16 matrix, None) for float16."""
+    if dtype not in QUANTIZATION_DTYPES:
+        raise ValueError(f"dtype must be one of {QUANTIZATION_DTYPES}, got {dtype!r}")
+    rows = len(embeddings)
+    dim = embeddings.shape[1] if np.ndim(embeddings) == 2 else 0
+    codes = np.empty((rows, dim), dtype=np.int8 if dtype == 'int8' else np.float16)
+    scales = np.empty(rows, dtype=np.float32) if dtype == 'int8' else None
+    for start in range(0, rows, QUANTIZE_CHUNK_ROWS):
+        chunk = np.asarray(embeddings[start:start + QUANTIZE_CHUNK_ROWS], dtype=np.float32)
+        if dtype == 'float16':
+            codes[start:start + len(chunk)] = chunk
+            continue
+        chunk_scales = np.abs(chunk).max(axis=1) / 127.0
+        chunk_scales[chunk_scales == 0] = 1.0
+        codes[start:start + len(chunk)] = np.rint(chunk / chunk_scales[:, None])
+        scales[start:start + len(chunk)] = chunk_scales
+    return codes, scales
+
+
+class QuantizedIndex:
+    """
+    Cosine search over a compact copy of row-normalized `embeddings`; same
+    `search` interface as the other backends. With `rescore_factor` > 0 the
+    returned scores are exact float32 cosines.
+    """
+
+    def __init__(self, codes: np.ndarray, scales: Optional[np.ndarray], embeddings=None,
+                 rescore_factor: int = DEFAULT_RESCORE_FACTOR):
+        self.codes = codes
+        self.scales = scales
+        self.embeddings = embeddings
+        self.rescore_factor = rescore_factor if embeddings is not None else 0
+
+    @property
+    def dtype(self) -> str:
+        return 'int8' if self.scales is not None else 'float16'
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    @classmethod
+    def build(cls, embeddings, dtype: str = 'int8',
+              rescore_factor: int = DEFAULT_RESCORE_FACTOR) -> 'QuantizedIndex':
+        codes, scales = quantize(embeddings, dtype)
+        return cls(codes, scales, embeddings, rescore_factor)
+
+    def scores(self, query_vector) -> np.ndarray:
+        """Approximate cosine of the query to every row, from the compact matrix."""
+        query = normalize_vector(query_vector)
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), SCORE_CHUNK_ROWS):
+            # แปลงทีละ chunk เพื่อไม่ต้องมีสำเนา float32 ทั้งเมทริกซ์
+            chunk = self.codes[start:start + SCORE_CHUNK_ROWS].astype(np.float32)
+            scores[start:start + len(chunk)] = chunk @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def search(self, query_vector, k: int, rescore_factor: Optional[int] = None,
+               mask=None) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self.scores(query_vector)
+        factor = self.rescore_factor if rescore_factor is None else rescore_factor
+        if factor <= 0 or self.embeddings is None:
+            top = masked_top_k(scores, k, mask)
+            return top, scores[top]
+        candidates = np.sort(masked_top_k(scores, k * factor, mask))
+        exact = np.asarray(self.embeddings[candidates], dtype=np.float32) @ normalize_vector(query_vector)
+        top = top_k(exact, k)
+        return candidates[top], exact[top]
+
+    def search_rows(self, rows: np.ndarray, query_vector, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Best k of `rows` (sorted ids): compact scores, then exact rescoring as in `search`."""
+        scores = self.codes[rows].astype(np.float32) @ normalize_vector(query_vector)
+        if self.scales is not None:
+            scores *= self.scales[rows]
+        if self.rescore_factor <= 0:
+            top = top_k(scores, k)
+            return rows[top], scores[top]
+        candidates = np.sort(rows[top_k(scores, k * self.rescore_factor)])
+        exact = np.asarray(self.embeddings[candidates], dtype=np.float32) @ normalize_vector(query_vector)
+        top = top_k(exact, k)
+        return candidates[top], exact[top]
+
+    def search_batch(self, query_vectors, k: int, mask=None):
+        results = [self.search(query, k, mask=mask) for query in np.asarray(query_vectors)]
+        return [r[0] for r in results], [r[1] for r in results]
+
+    def save(self, path: str, data_hash: str) -> None:
+        meta = {
+            'version': QUANTIZED_FORMAT_VERSION,
+            'dtype': self.dtype,
+            'rows': int(len(self.codes)),
+            'dim': int(self.codes.shape[1]),
+            'dataset_hash': data_hash,
+        }
+        # codes เป็น .npy ดิบเพื่อ memory-map ได้ (ใน .npz ต้องอ่านทั้งก้อนเข้าหน่วยความจำของแต่ละ process)
+        codes_file = os.path.splitext(path)[0] + '.npy'
+        with open(codes_file + '.tmp', 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.codes))
+        os.replace(codes_file + '.tmp', codes_file)
+        arrays = {'meta': np.array(json.dumps(meta))}
+        if self.scales is not None:
+            arrays['scales'] = self.scales
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, embeddings, data_hash: str, dtype: str,
+             rescore_factor: int = DEFAULT_RESCORE_FACTOR) -> Optional['QuantizedIndex']:
+        """Load the copy at `path` if it was built from this dataset and matrix shape."""
+        try:
+            with np.load(path) as archive:
+                meta = json.loads(str(archive['meta']))
+                if (meta.get('version') != QUANTIZED_FORMAT_VERSION
+                        or meta.get('dtype') != dtype
+                        or meta.get('rows') != len(embeddings)
+                        or meta.get('dim') != embeddings.shape[1]
+                        or meta.get('dataset_hash') != data_hash):
+                    return None
+                scales = archive['scales'] if dtype == 'int8' else None
+            codes = np.load(os.path.splitext(path)[0] + '.npy', mmap_mode='r')
+            if codes.shape != (len(embeddings), embeddings.shape[1]) or codes.dtype != np.dtype(dtype):
+                return None
+            return cls(codes, scales, embeddings, rescore_factor)
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+def load_or_build_quantized(embeddings, path: str, data_hash: str, dtype: str,
+                            rescore_factor: int = DEFAULT_RESCORE_FACTOR) -> Optional[QuantizedIndex]:
+    """`dtype` copy of `embeddings`, loaded from `path` or built and saved there."""
+    if embeddings is None or np.ndim(embeddings) != 2 or len(embeddings) == 0:
+        return None
+    index = QuantizedIndex.load(path, embeddings, data_hash, dtype, rescore_factor)
+    if index is not None:
+        return index
+    index = QuantizedIndex.build(embeddings, dtype, rescore_factor)
+    try:
+        index.save(path, data_hash)
+    except OSError:
+        return index
+    # ใช้สำเนาที่ map จากไฟล์ แทนสำเนาในหน่วยความจำที่เพิ่งสร้าง
+    return QuantizedIndex.load(path, embeddings, data_hash, dtype, rescore_factor) or index
+
+
+def recall_report(embeddings, k: int = 10, n_queries: int = 200, seed: int = 0,
+                  rescore_factor: int = DEFAULT_RESCORE_FACTOR) -> Dict[str, Dict[str, float]]:
+    """
+    recall@k of each quantized mode, with and without rescoring, against exact
+    float32 search. Queries are corpus rows plus small noise.
+    """
+    queries = sample_queries(embeddings, n_queries, seed)
+    reference = exact_neighbours(embeddings, queries, k)
+
+    report = {}
+    for dtype in QUANTIZATION_DTYPES:
+        index = QuantizedIndex.build(embeddings, dtype, rescore_factor)
+        for label, factor in (('', 0), ('+rescore', rescore_factor)):
+            recall, ms_per_query = measure_recall(
+                lambda query, k: index.search(query, k, factor), queries, reference, k
+            )
+            report[dtype + label] = {'recall_at_k': recall, 'bytes': index.nbytes, 'ms_per_query': ms_per_query}
+    _, ms_per_query = measure_recall(ExactIndex(embeddings, normalized=True).search, queries, reference, k)
+    report['float32'] = {
+        'recall_at_k': 1.0,
+        'bytes': int(len(embeddings) * embeddings.shape[1] * np.dtype(STORE_DTYPE).itemsize),
+        'ms_per_query': ms_per_query,
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='recall@k ของ embedding แบบ int8/float16 เทียบกับ float32')
+    parser.add_argument('store', nargs='?', default='embeddings.f32', help='ไฟล์ embedding store (default: embeddings.f32)')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--rescore-factor', type=int, default=DEFAULT_RESCORE_FACTOR)
+    args = parser.parse_args()
+
+    embeddings = map_store(args.store)
+    if embeddings is None:
+        print(f"Error: ไม่พบ embedding store ที่ใช้ได้: {args.store}")
+        return
+    report = recall_report(embeddings, args.k, args.queries, rescore_factor=args.rescore_factor)
+    print(f"{'mode':<18}{'recall@' + str(args.k):>10}{'MB':>10}{'ms/query':>10}")
+    for mode, row in report.items():
+        print(f"{mode:<18}{row['recall_at_k']:>10.4f}{row['bytes'] / 2**20:>10.2f}{row['ms_per_query']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Recipe tags derived from recipe text: ingredient count, complexity and category.
+
+`preprocess.enhance_recipe_data` writes them as the `ingredient_count`,
+`complexity` and `category` columns of the cleaned CSV; `functions.facets`
+derives them with the same rules for datasets that lack those columns.
+"""
+
+
+def count_ingredients(text) -> int:
+    """จำนวนบรรทัดวัตถุดิบที่ไม่ว่าง"""
+    return len([line for line in str(text).split('\n') if line.strip()])
+
+
+def estimate_complexity(ingredient_count: int, method_text) -> str:
+    """ประเมินความซับซ้อนของสูตรจากจำนวนวัตถุดิบและความยาววิธีทำ"""
+    method_length = len(str(method_text))
+
+    if ingredient_count <= 3 and method_length <= 100:
+        return 'ง่าย'
+    elif ingredient_count <= 7 and method_length <= 300:
+        return 'ปานกลาง'
+    else:
+        return 'ยาก'
+
+
+def categorize_food(name) -> str:
+    """แท็กหมวดหมู่อาหารจากชื่อเมนู"""
+    name_lower = str(name).lower()
+
+    if any(word in name_lower for word in ['แกง', 'ต้มยำ', 'ต้มข่า']):
+        return 'แกงและซุป'
+    elif any(word in name_lower for word in ['ผัด', 'ผัดไท', 'ผัดกะเพรา']):
+        return 'อาหารผัด'
+    elif any(word in name_lower for word in ['ทอด', 'ปอเปี๊ยะ']):
+        return 'อาหารทอด'
+    elif any(word in name_lower for word in ['ยำ', 'ตำ', 'ลาบ']):
+        return 'ยำและตำ'
+    elif any(word in name_lower for word in ['ข้าว', 'เสี้ยว', 'ก๋วยเตี๋ยว']):
+        return 'อาหารหลัก'
+    elif any(word in name_lower for word in ['ขนม', 'เค้ก', 'ลูกชุบ']):
+        return 'ขนมและของหวาน'
+    else:
+        return 'อื่นๆ'
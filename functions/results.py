@@ -0,0 +1,138 @@
+"""
+Compact search results: row positions and scores, with recipe fields read
+in bulk from column arrays only for the rows actually shown.
+
+`SearchHits` holds NumPy arrays (positions, similarities, result types and,
+for hybrid search, RRF scores), so ranking, merging, de-duplication and
+caching never touch pandas. `materialize` turns a slice of hits into the
+familiar result dicts by indexing `RecipeColumns`, object arrays built
+once per dataset, instead of building a `data.iloc[idx]` Series per field
+per hit.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+RESULT_FIELDS = (('name', 'name'), ('ingredients', 'ingredient'), ('method', 'method'))
+
+
+class RecipeColumns:
+    """Object arrays of the result fields of `data`, in row order."""
+
+    def __init__(self, data):
+        self.size = len(data)
+        self.columns: Dict[str, np.ndarray] = {}
+        for key, column in RESULT_FIELDS:
+            if column in data.columns:
+                self.columns[key] = data[column].to_numpy(dtype=object)
+            else:
+                self.columns[key] = np.full(len(data), '', dtype=object)
+
+    def take(self, positions: np.ndarray) -> Dict[str, list]:
+        """Field -> list of values for `positions`, one fancy-index per field."""
+        return {key: values[positions].tolist() for key, values in self.columns.items()}
+
+
+class SearchHits:
+    """
+    Ranked hits as parallel arrays. `types` and `search_modes` are small
+    object arrays (search_mode is None for fuzzy hits, which never carried
+    one); `rrf_scores` is NaN where a hit has no fused score.
+    """
+
+    __slots__ = ('positions', 'similarities', 'types', 'search_modes', 'rrf_scores')
+
+    def __init__(self, positions, similarities, types, search_modes=None, rrf_scores=None):
+        self.positions = np.asarray(positions, dtype=np.int64)
+        self.similarities = np.asarray(similarities, dtype=np.float64)
+        n = len(self.positions)
+        self.types = _object_array(types, n)
+        self.search_modes = _object_array(search_modes, n)
+        if rrf_scores is None:
+            rrf_scores = np.full(n, np.nan)
+        self.rrf_scores = np.asarray(rrf_scores, dtype=np.float64)
+
+    @classmethod
+    def empty(cls) -> 'SearchHits':
+        return cls([], [], None)
+
+    @classmethod
+    def ranked(cls, positions, similarities, result_type: str, search_mode: Optional[str],
+               rrf_scores=None) -> 'SearchHits':
+        return cls(positions, similarities, result_type, search_mode, rrf_scores)
+
+    @classmethod
+    def from_tuples(cls, hits: Iterable[Tuple[int, float, str]]) -> 'SearchHits':
+        """Hits from (position, similarity, type) tuples, in the given order."""
+        hits = list(hits)
+        if not hits:
+            return cls.empty()
+        positions, similarities, types = zip(*hits)
+        return cls(positions, similarities, np.array(types, dtype=object))
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    @property
+    def best_similarity(self) -> float:
+        return float(self.similarities[0]) if len(self) else 0.0
+
+    def take(self, order) -> 'SearchHits':
+        return SearchHits(self.positions[order], self.similarities[order], self.types[order],
+                          self.search_modes[order], self.rrf_scores[order])
+
+    def head(self, k: int) -> 'SearchHits':
+        return self.take(slice(0, max(0, k)))
+
+    def above(self, threshold: float) -> 'SearchHits':
+        """Hits with similarity >= `threshold`, order kept."""
+        return self.take(self.similarities >= threshold)
+
+    def concat(self, other: 'SearchHits') -> 'SearchHits':
+        return SearchHits(np.concatenate([self.positions, other.positions]),
+                          np.concatenate([self.similarities, other.similarities]),
+                          np.concatenate([self.types, other.types]),
+                          np.concatenate([self.search_modes, other.search_modes]),
+                          np.concatenate([self.rrf_scores, other.rrf_scores]))
+
+    def unique(self) -> 'SearchHits':
+        """First hit per position, order kept."""
+        _, first = np.unique(self.positions, return_index=True)
+        return self.take(np.sort(first))
+
+    def sorted(self) -> 'SearchHits':
+        """By similarity, best first; ties keep their current order."""
+        return self.take(np.argsort(-self.similarities, kind='stable'))
+
+    def materialize(self, data, start: int = 0, stop: Optional[int] = None,
+                    columns: Optional[RecipeColumns] = None) -> List[Dict]:
+        """Result dicts for hits[start:stop], with fields gathered from `columns`."""
+        if columns is None:
+            columns = RecipeColumns(data)
+        page = self.take(slice(start, stop))
+        fields = columns.take(page.positions)
+        results = []
+        for i, position in enumerate(page.positions.tolist()):
+            result = {
+                'name': fields['name'][i],
+                'similarity': float(page.similarities[i]),
+                'ingredients': fields['ingredients'][i],
+                'method': fields['method'][i],
+                'index': position,
+                'type': page.types[i],
+            }
+            if page.search_modes[i] is not None:
+                result['search_mode'] = page.search_modes[i]
+            if not np.isnan(page.rrf_scores[i]):
+                result['rrf_score'] = float(page.rrf_scores[i])
+            results.append(result)
+        return results
+
+
+def _object_array(values, n: int) -> np.ndarray:
+    if isinstance(values, np.ndarray) and values.dtype == object and len(values) == n:
+        return values
+    array = np.empty(n, dtype=object)
+    array[:] = values if not isinstance(values, (list, tuple)) else list(values)
+    return array
@@ -0,0 +1,135 @@
+"""
+Cosine scoring over row-normalized embedding matrices, pure NumPy.
+
+Rows are L2-normalized once (at build or load time), so a query costs one
+matrix-vector product and top-k selection uses `np.argpartition` followed by
+a sort of only the k winners. Works the same with or without scikit-learn.
+"""
+
+import time
+from typing import Callable, List, Set, Tuple
+
+import numpy as np
+
+
+def normalize_rows(matrix) -> np.ndarray:
+    """float32 copy of `matrix` with unit-length rows (zero rows stay zero)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def normalize_vector(vector) -> np.ndarray:
+    return normalize_rows(np.asarray(vector).ravel())[0]
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def masked_top_k(scores: np.ndarray, k: int, mask=None) -> np.ndarray:
+    """`top_k` restricted to rows where `mask` is True (all rows when None)."""
+    if mask is None:
+        return top_k(scores, k)
+    allowed = np.flatnonzero(mask)
+    return allowed[top_k(scores[allowed], k)]
+
+
+# a filter keeping less than this share of rows is scored on the allowed rows only
+MASK_GATHER_FRACTION = 0.5
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row-wise `top_k` for a (queries x rows) score matrix."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    picked = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-picked, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+BATCH_QUERY_CHUNK = 256
+
+
+class ExactIndex:
+    """Brute-force cosine search; same `search` interface as the ANN backends."""
+
+    def __init__(self, embeddings, normalized: bool = False):
+        self.embeddings = embeddings if normalized else normalize_rows(embeddings)
+
+    def scores(self, query_vector) -> np.ndarray:
+        return self.embeddings @ normalize_vector(query_vector)
+
+    def search(self, query_vector, k: int, mask=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best k rows; with a boolean `mask`, only allowed rows compete, so a
+        filtered search still returns k rows when k are allowed.
+        """
+        if mask is not None and np.count_nonzero(mask) < MASK_GATHER_FRACTION * len(mask):
+            # ตัวกรองแคบ: คำนวณเฉพาะแถวที่ผ่านตัวกรอง
+            allowed = np.flatnonzero(mask)
+            scores = np.asarray(self.embeddings[allowed], dtype=np.float32) @ normalize_vector(query_vector)
+            top = top_k(scores, k)
+            return allowed[top], scores[top]
+        scores = self.scores(query_vector)
+        indices = masked_top_k(scores, k, mask)
+        return indices, scores[indices]
+
+    def search_batch(self, query_vectors, k: int, mask=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score many queries with one matrix-matrix product per chunk of
+        `BATCH_QUERY_CHUNK` queries; returns (queries x k) indices and scores.
+        With `mask`, only the allowed rows are scored.
+        """
+        queries = normalize_rows(query_vectors)
+        rows = np.flatnonzero(mask) if mask is not None else None
+        matrix = np.asarray(self.embeddings if rows is None else self.embeddings[rows])
+        k = min(k, len(matrix))
+        indices = np.zeros((len(queries), k), dtype=np.int64)
+        scores = np.zeros((len(queries), k), dtype=np.float32)
+        for start in range(0, len(queries), BATCH_QUERY_CHUNK):
+            chunk_scores = queries[start:start + BATCH_QUERY_CHUNK] @ matrix.T
+            chunk_top = top_k_rows(chunk_scores, k)
+            indices[start:start + len(chunk_top)] = chunk_top if rows is None else rows[chunk_top]
+            scores[start:start + len(chunk_top)] = np.take_along_axis(chunk_scores, chunk_top, axis=1)
+        return indices, scores
+
+
+def sample_queries(embeddings, n_queries: int, seed: int = 0, noise: float = 0.02) -> np.ndarray:
+    """Evaluation queries: randomly chosen corpus rows plus small Gaussian noise."""
+    rng = np.random.default_rng(seed)
+    picked = np.sort(rng.choice(len(embeddings), min(n_queries, len(embeddings)), replace=False))
+    rows = np.asarray(embeddings[picked], dtype=np.float32)
+    return normalize_rows(rows + rng.normal(0, noise, rows.shape).astype(np.float32))
+
+
+def exact_neighbours(embeddings, queries, k: int) -> List[Set[int]]:
+    """Exact top-k row sets per query, the reference for `measure_recall`."""
+    indices, _ = ExactIndex(embeddings, normalized=True).search_batch(queries, k)
+    return [set(row.tolist()) for row in indices]
+
+
+def measure_recall(search: Callable, queries, reference: List[Set[int]], k: int) -> Tuple[float, float]:
+    """(recall@k, ms per query) of `search(query, k) -> (indices, scores)` against `reference`."""
+    started = time.perf_counter()
+    found = [search(query, k)[0] for query in queries]
+    elapsed = time.perf_counter() - started
+    hits = sum(len(expected & set(np.asarray(f).tolist())) for f, expected in zip(found, reference))
+    expected_total = sum(len(expected) for expected in reference)
+    return hits / max(1, expected_total), elapsed * 1000 / max(1, len(queries))
@@ -1,270 +1,590 @@
+import importlib.util
 import os
-import pickle
 import numpy as np
 import streamlit as st
 import difflib
-import re
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 
-try:
-    from sentence_transformers import SentenceTransformer
-    SENTENCE_TRANSFORMERS_AVAILABLE = True
-except ImportError:
-    SentenceTransformer = None
-    SENTENCE_TRANSFORMERS_AVAILABLE = False
-
-try:
-    from sklearn.metrics.pairwise import cosine_similarity
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    SKLEARN_AVAILABLE = True
-except ImportError:
-    cosine_similarity = None
-    TfidfVectorizer = None
-    SKLEARN_AVAILABLE = False
-
-EMBEDDINGS_PATH = "embeddings.pkl"
-EMBEDDINGS_INGREDIENT_PATH = "embeddings_ingredient.pkl"
+from functions.ann import ANN_MIN_ROWS, IVFIndex, index_path
+from functions.artifacts import ArtifactError, require_manifest
+from functions.autocomplete import DEFAULT_SUGGESTIONS
+from functions.cache import (
+    cached_dataset_hash, dataset_fingerprint, dataset_index, dataset_value, object_token, query_embedding_cache,
+    search_result_cache
+)
+from functions.embedding_store import dataset_hash, open_store
+from functions.facets import FacetIndex, facet_hash, filter_key
+from functions.fuzzy_index import NgramIndex
+from functions.loader import BackgroundLoader, mark_startup
+from functions.neighbours import NeighbourList, neighbours_path
+from functions.pca import load_pca, projection_path
+from functions.quantize import QuantizedIndex, quantized_path
+from functions.results import RecipeColumns, SearchHits
+from functions.scoring import ExactIndex
+from functions.sharded_store import ShardedIndex, ShardedStore, exact_index, open_sharded
+from functions.tfidf_index import TFIDF_COLUMNS, TfidfIndex
+
+# ตรวจแค่ว่าติดตั้งไว้หรือไม่ ยังไม่ import จริง (torch ใช้เวลาหลายวินาที)
+SENTENCE_TRANSFORMERS_AVAILABLE = importlib.util.find_spec('sentence_transformers') is not None
+SKLEARN_AVAILABLE = importlib.util.find_spec('sklearn') is not None
+
+EMBEDDINGS_PATH = "embeddings.f32"
+EMBEDDINGS_INGREDIENT_PATH = "embeddings_ingredient.f32"
+TFIDF_PATH = "tfidf.npz"
+TFIDF_INGREDIENT_PATH = "tfidf_ingredient.npz"
 MODEL_PATH = "model"
+MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+TFIDF_THRESHOLD = 0.1
+# ค่าด้านล่างใช้ทั้งตอนสร้าง (functions.index_build) และตอนโหลด: เปลี่ยนแล้วต้องรัน build_index.py ใหม่
+# None = float32; 'int8' / 'float16' = compact memory-mapped copy, rescored in float32
+EMBEDDING_QUANTIZATION = None
+# None = full dimension; e.g. 64 = score in a PCA-reduced space (see functions.pca).
+# Takes precedence over EMBEDDING_QUANTIZATION; either one also scores IVF's probed lists
+EMBEDDING_PCA_DIM = None
+# None = one memory-mapped matrix; e.g. 65536 = fixed-size shards streamed at query time (see functions.sharded_store)
+EMBEDDING_SHARD_ROWS = None
+# Reciprocal rank fusion: score = sum(weight / (RRF_K + rank)) over retrievers
+RRF_K = 60
+HYBRID_WEIGHTS = {'vector': 1.0, 'lexical': 1.0}
+HYBRID_MIN_CANDIDATES = 20
+# คะแนนของผลที่ชื่อตรงกับคำค้น (ตรงทุกตัว / ต่างแค่วรรณยุกต์ ช่องว่าง หรือเครื่องหมาย)
+EXACT_NAME_SIMILARITY = 1.0
+NEAR_EXACT_NAME_SIMILARITY = 0.95
+
+# ตัวค้นหาแบบเวกเตอร์ของโหมด hybrid รันในเธรดนี้ ขนานกับ BM25
+_retrieval_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='retrieval')
+
+def load_search_model(spinner_text=None):
+    """Import sentence-transformers (and torch) on first use and load the model."""
+    from sentence_transformers import SentenceTransformer
+    
+    if os.path.exists(MODEL_PATH):
+        return SentenceTransformer(MODEL_PATH)
+    if spinner_text is None:
+        model = SentenceTransformer(MODEL_NAME)
+    else:
+        with st.spinner(spinner_text):
+            model = SentenceTransformer(MODEL_NAME)
+    os.makedirs(MODEL_PATH, exist_ok=True)
+    model.save(MODEL_PATH)
+    return model
 
 @st.cache_resource
 def load_model():
     if not SENTENCE_TRANSFORMERS_AVAILABLE:
         return None
-    if os.path.exists(MODEL_PATH):
-        return SentenceTransformer(MODEL_PATH)
-    with st.spinner("กำลังดาวน์โหลดโมเดล AI... (ใช้เวลาประมาณ 2-3 นาที)"):
-        model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-        os.makedirs(MODEL_PATH, exist_ok=True)
-        model.save(MODEL_PATH)
-        return model
+    return load_search_model("กำลังดาวน์โหลดโมเดล AI... (ใช้เวลาประมาณ 2-3 นาที)")
+
+def embeddings_path(search_mode: str) -> str:
+    return EMBEDDINGS_INGREDIENT_PATH if search_mode == 'ingredient' else EMBEDDINGS_PATH
+
+def _missing(what: str) -> ArtifactError:
+    return ArtifactError(f"ไม่พบ {what} ที่สร้างไว้สำหรับข้อมูลชุดนี้: รัน python build_index.py ก่อน")
+
+def require_artifacts(data) -> Dict:
+    """The `artifacts.json` manifest for `data`; raises `ArtifactError` when build_index.py was not run on it."""
+    return require_manifest(cached_dataset_hash(data))
+
+def open_embeddings(data, path):
+    """
+    Map the prebuilt store at `path` for this dataset; never encodes.
+    Raises `ArtifactError` when build_index.py has not been run for this data.
+    """
+    data_hash = dataset_hash(data)
+    if EMBEDDING_SHARD_ROWS:
+        embeddings = open_sharded(path, MODEL_NAME, data_hash, len(data))
+    else:
+        embeddings = open_store(path, MODEL_NAME, data_hash, len(data))
+    if embeddings is None:
+        raise _missing(f"embedding ({path})")
+    return embeddings
 
-@st.cache_data
+# cache_resource: a memmap is shared as-is rather than pickled into every session
+@st.cache_resource
 def get_embeddings(_model, data):
     if _model is None or not SENTENCE_TRANSFORMERS_AVAILABLE:
-        return get_tfidf_embeddings(data)
-    if os.path.exists(EMBEDDINGS_PATH):
-        try:
-            with open(EMBEDDINGS_PATH, 'rb') as f:
-                return pickle.load(f)
-        except Exception:
-            pass
+        return get_tfidf_index(data)
     if data.empty:
         return np.array([])
-    texts = []
-    for _, row in data.iterrows():
-        ingredient_text = str(row.get('ingredient', ''))
-        method_text = str(row.get('method', ''))
-        combined_text = f"{row['name']} {ingredient_text} {method_text}"
-        texts.append(combined_text)
-    with st.spinner("กำลังสร้างดัชนีการค้นหา... (ใช้เวลาประมาณ 1-2 นาที)"):
-        embeddings = _model.encode(texts)
-    try:
-        with open(EMBEDDINGS_PATH, 'wb') as f:
-            pickle.dump(embeddings, f)
-    except Exception:
-        pass
-    return embeddings
+    return open_embeddings(data, EMBEDDINGS_PATH)
     
-@st.cache_data
+@st.cache_resource
 def get_ingredient_embeddings(_model, data):
     if _model is None or not SENTENCE_TRANSFORMERS_AVAILABLE:
-        return get_tfidf_embeddings(data['ingredient'])
-    
-    if os.path.exists(EMBEDDINGS_INGREDIENT_PATH):
-        try:
-            with open(EMBEDDINGS_INGREDIENT_PATH, 'rb') as f:
-                return pickle.load(f)
-        except Exception:
-            pass
+        return get_tfidf_index(data, ('ingredient',))
     
     if data.empty:
         return np.array([])
     
-    # สร้าง embedding เฉพาะ ingredient
-    texts = data['ingredient'].fillna('').astype(str).tolist()
+    # embedding เฉพาะ ingredient
+    return open_embeddings(data, EMBEDDINGS_INGREDIENT_PATH)
+
+def open_vector_index(embeddings, data, search_mode: str):
+    """
+    Load the vector index that `functions.index_build.build_vector_index` wrote
+    for this store, with the same choice of backend; raises `ArtifactError`
+    when it is missing or was built for other data.
+    """
+    if isinstance(embeddings, ShardedStore):
+        return ShardedIndex(embeddings)
+    path = embeddings_path(search_mode)
+    data_hash = dataset_hash(data)
+    compact_index = None
+    if EMBEDDING_PCA_DIM:
+        compact_index = load_pca(embeddings, path, data_hash, EMBEDDING_PCA_DIM)
+        if compact_index is None:
+            raise _missing(f"PCA projection ({projection_path(path, EMBEDDING_PCA_DIM)})")
+    elif EMBEDDING_QUANTIZATION:
+        compact_index = QuantizedIndex.load(quantized_path(path, EMBEDDING_QUANTIZATION), embeddings, data_hash,
+                                            EMBEDDING_QUANTIZATION)
+        if compact_index is None:
+            raise _missing(f"สำเนา {EMBEDDING_QUANTIZATION} ({quantized_path(path, EMBEDDING_QUANTIZATION)})")
+    if len(embeddings) >= ANN_MIN_ROWS:
+        ivf_index = IVFIndex.load(index_path(path), embeddings, data_hash, scorer=compact_index)
+        if ivf_index is None:
+            raise _missing(f"ดัชนี IVF ({index_path(path)})")
+        return ivf_index
+    if compact_index is not None:
+        return compact_index
+    return ExactIndex(embeddings, normalized=True)
+
+@st.cache_resource
+def get_vector_index(_model, _embeddings, data, search_mode: str = 'combined'):
+    """
+    Search backend over the semantic embeddings for `search_mode`: the IVF index
+    prebuilt next to the embedding store for large corpora, otherwise exact
+    scoring over the (already normalized) matrix. With `EMBEDDING_PCA_DIM`
+    (or else `EMBEDDING_QUANTIZATION`) set, rows are scored over the PCA
+    projection (or the int8/float16 copy), by IVF's probed lists as well. A sharded store (`EMBEDDING_SHARD_ROWS`)
+    is always scored shard by shard. None when there is no model; raises
+    `ArtifactError` when build_index.py did not build it.
+    """
+    if _model is None or not SENTENCE_TRANSFORMERS_AVAILABLE or data.empty:
+        return None
+    return open_vector_index(_embeddings, data, search_mode)
+
+def build_semantic_backend(data) -> Dict:
+    """
+    Model, prebuilt embeddings, vector indexes for both search modes and the
+    neighbour list; runs off the script thread. Raises `ArtifactError` when
+    the artifacts from build_index.py are missing or were built from other
+    data, before the model is loaded.
+    """
+    require_artifacts(data)
+    embeddings = open_embeddings(data, EMBEDDINGS_PATH)
+    ingredient_embeddings = open_embeddings(data, EMBEDDINGS_INGREDIENT_PATH)
+    vector_index = open_vector_index(embeddings, data, 'combined')
+    ingredient_vector_index = open_vector_index(ingredient_embeddings, data, 'ingredient')
+    neighbour_list(data)
+    model = load_search_model()
+    mark_startup('model_loaded')
+    backend = {
+        'model': model,
+        'embeddings': embeddings,
+        'ingredient_embeddings': ingredient_embeddings,
+        'vector_index': vector_index,
+        'ingredient_vector_index': ingredient_vector_index,
+    }
+    mark_startup('semantic_ready')
+    return backend
+
+@st.cache_resource
+def get_semantic_loader(data):
+    """
+    Process-wide background load of the semantic backend for `data`; until
+    `loader.ready`, callers search with the lexical indexes. None when
+    sentence-transformers is not installed.
+    """
+    if not SENTENCE_TRANSFORMERS_AVAILABLE or data.empty:
+        return None
+    return BackgroundLoader(lambda: build_semantic_backend(data), name='semantic-loader').start()
+
+def open_tfidf(data, columns=TFIDF_COLUMNS) -> TfidfIndex:
+    """The TF-IDF index build_index.py fitted on `data` and `columns`; raises `ArtifactError` otherwise."""
+    path = TFIDF_INGREDIENT_PATH if tuple(columns) == ('ingredient',) else TFIDF_PATH
+    index = TfidfIndex.load(path, dataset_hash(data), columns)
+    if index is None:
+        raise _missing(f"TF-IDF ({path})")
+    return index
+
+@st.cache_resource
+def get_tfidf_index(data, columns=TFIDF_COLUMNS):
+    """
+    Sparse TF-IDF index used when no sentence-transformer model is available;
+    the vocabulary, IDF and CSR matrix fitted by build_index.py are loaded from disk.
+    """
+    return open_tfidf(data, columns)
+
+def _ranked_hits(data, top_indices, top_scores, search_mode: str, result_type: str, threshold: float) -> SearchHits:
+    positions = np.asarray(top_indices, dtype=np.int64)
+    similarities = np.asarray(top_scores, dtype=np.float64)
+    keep = (positions < len(data)) & (similarities >= threshold)
+    return SearchHits.ranked(positions[keep], similarities[keep], result_type, search_mode)
+
+# ดัชนีที่อ่านคอลัมน์อื่นนอกจากชื่อ/วัตถุดิบ/วิธีทำ: hash ของทุกอย่างที่อ่าน เป็นส่วนหนึ่งของ key
+INDEX_INPUT_HASHES = {
+    'facets': facet_hash,
+}
+
+def _index(data, name: str):
+    """Prebuilt index `name` (see `functions.index_build.INDEX_BUILDERS`) for `data`, loaded once."""
+    return dataset_index(data, name, INDEX_INPUT_HASHES.get(name))
+
+def recipe_columns(data) -> RecipeColumns:
+    """Result-field column arrays for `data`, built once per dataset."""
+    return dataset_value(data, 'columns', RecipeColumns)
+
+def result_page(hits: SearchHits, data, start: int = 0, stop: Optional[int] = None) -> List[Dict]:
+    """Result dicts for hits[start:stop]; only those rows' fields are read."""
+    return hits.materialize(data, start, stop, recipe_columns(data))
+
+def suggest(data, prefix: str, limit: int = DEFAULT_SUGGESTIONS, kind: Optional[str] = None) -> List[Dict]:
+    """
+    Type-ahead: recipe and ingredient names starting with `prefix`, most
+    frequent first, as {'text', 'kind', 'count'} (see `functions.autocomplete`).
+    """
+    if data.empty:
+        return []
+    return _index(data, 'autocomplete').suggest(prefix, limit, kind)
+
+def facet_index(data) -> FacetIndex:
+    """Category / complexity / ingredient-count masks for `data`, loaded once per dataset."""
+    return _index(data, 'facets')
+
+def _facet_mask(data, filters: Optional[Dict]):
+    return facet_index(data).mask(filters) if filters else None
+
+def _filter_cache_key(data, filters: Optional[Dict]):
+    # ผลที่กรองแล้วขึ้นกับคอลัมน์ facet ด้วย ไม่ใช่แค่ข้อความสูตร
+    key = filter_key(filters)
+    return (key, cached_dataset_hash(data, facet_hash)) if key is not None else None
+
+def _semantic_hits(data, top_indices, top_scores, search_mode: str) -> SearchHits:
+    # ปรับ threshold ตาม search_mode
+    threshold = 0.25 if search_mode == 'ingredient' else 0.3
+    return _ranked_hits(data, top_indices, top_scores, search_mode, 'semantic', threshold)
+
+def _bm25_hits(query: str, data, top_k: int, mask=None) -> SearchHits:
+    top_indices, top_scores = _index(data, 'bm25').search(query, top_k, mask)
+    return _ranked_hits(data, top_indices, top_scores, 'bm25', 'bm25', 0.0)
+
+def bm25_search_recipes(query: str, data, top_k: int = 5, filters: Optional[Dict] = None) -> List[Dict]:
+    """BM25 lexical search over name, ingredient and method; needs no model."""
+    if data.empty:
+        return []
+    return result_page(_bm25_hits(query, data, top_k, _facet_mask(data, filters)), data)
+
+def _rrf_fuse(data, hit_lists, top_k: int) -> SearchHits:
+    """
+    Reciprocal rank fusion of `{retriever: (positions, similarities)}`. Only the
+    union of the candidate lists is touched. Results are ordered by fused score;
+    'similarity' is the best calibrated score any retriever gave the recipe.
+    """
+    fused: Dict[int, float] = {}
+    best: Dict[int, float] = {}
+    for name, (positions, similarities) in hit_lists.items():
+        weight = HYBRID_WEIGHTS.get(name, 1.0)
+        for rank, (pos, similarity) in enumerate(zip(positions.tolist(), similarities.tolist()), 1):
+            fused[pos] = fused.get(pos, 0.0) + weight / (RRF_K + rank)
+            best[pos] = max(best.get(pos, 0.0), similarity)
     
-    with st.spinner("กำลังสร้างดัชนีส่วนผสม..."):
-        embeddings = _model.encode(texts)
+    ranked = [pos for pos in sorted(fused, key=lambda pos: (-fused[pos], -best[pos])) if pos < len(data)][:top_k]
+    return SearchHits.ranked(ranked, [best[pos] for pos in ranked], 'hybrid', 'hybrid',
+                             [fused[pos] for pos in ranked])
+
+def _vector_hits(query: str, model, selected_embeddings, selected_index, k: int, mask=None):
+    """(positions, similarities) from the semantic index, or TF-IDF without a model."""
+    if model is not None and len(selected_embeddings) > 0:
+        if selected_index is None:
+            selected_index = exact_index(selected_embeddings)
+        return selected_index.search(_encode_query(model, query), k, mask=mask)
+    if isinstance(selected_embeddings, TfidfIndex):
+        return selected_embeddings.search(query, k, mask)
+    return None
+
+def _hybrid_hits(query: str, model, data, embeddings, top_k: int, vector_index=None, mask=None) -> SearchHits:
+    k = max(top_k * 2, HYBRID_MIN_CANDIDATES)
+    vector_future = _retrieval_pool.submit(_vector_hits, query, model, embeddings, vector_index, k, mask)
+    lexical_hits = _index(data, 'bm25').search(query, k, mask)
+    vector_hits = vector_future.result()
     
-    try:
-        with open(embeddings_path, 'wb') as f:
-            pickle.dump(embeddings, f)
-    except Exception:
-        pass
+    hit_lists = {'lexical': lexical_hits}
+    if vector_hits is not None:
+        hit_lists['vector'] = vector_hits
+    return _rrf_fuse(data, hit_lists, top_k)
+
+def hybrid_search_recipes(query: str, model, data, embeddings, top_k: int = 5, vector_index=None,
+                          filters: Optional[Dict] = None) -> List[Dict]:
+    """
+    Vector and BM25 candidates retrieved side by side and merged with
+    reciprocal rank fusion, so latency follows the slower retriever.
+    """
+    if data.empty:
+        return []
+    hits = _hybrid_hits(query, model, data, embeddings, top_k, vector_index, _facet_mask(data, filters))
+    return result_page(hits, data)
+
+def _load_neighbours(data) -> NeighbourList:
+    neighbours = NeighbourList.load(neighbours_path(EMBEDDINGS_PATH), len(data), dataset_hash(data))
+    if neighbours is None:
+        raise _missing(f"รายการเมนูใกล้เคียง ({neighbours_path(EMBEDDINGS_PATH)})")
+    return neighbours
+
+def neighbour_list(data) -> NeighbourList:
+    """
+    Precomputed similar recipes per recipe (see `functions.neighbours`), loaded
+    once per dataset; raises `ArtifactError` when build_index.py did not build them.
+    """
+    return dataset_value(data, 'neighbours', _load_neighbours)
+
+def _exact_name_hits(query: str, data, top_k: int, search_mode: str, mask=None) -> Optional[SearchHits]:
+    """
+    Recipes named exactly (or near-exactly) `query`, followed by their
+    precomputed semantic neighbours; None when the name matches nothing or
+    there are no neighbours to fill `top_k`, so the query is encoded as usual.
+    """
+    rows, exact = _index(data, 'names').lookup(query)
+    positions = np.asarray(rows, dtype=np.int64)
+    if mask is not None:
+        positions = positions[mask[positions]]
+    neighbours = neighbour_list(data)
+    if len(positions) == 0 or (neighbours.k == 0 and len(positions) < top_k):
+        return None
     
-    return embeddings
+    similarity = EXACT_NAME_SIMILARITY if exact else NEAR_EXACT_NAME_SIMILARITY
+    hits = SearchHits.ranked(positions, np.full(len(positions), similarity), 'exact', search_mode)
+    if neighbours.k and len(positions) < top_k:
+        ids, scores = zip(*(neighbours.of(row) for row in positions.tolist()))
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+        if mask is not None:
+            ids, scores = ids[mask[ids]], scores[mask[ids]]
+        hits = hits.concat(_semantic_hits(data, ids, scores, search_mode).sorted())
+    return hits.unique().head(top_k)
+
+def _needs_fuzzy(hits: SearchHits, model) -> bool:
+    return len(hits) == 0 or hits.best_similarity < 0.3 or model is None
+
+def _merge_fuzzy(query: str, data, hits: SearchHits, top_k: int, search_mode: str, mask=None,
+                 fuzzy_first: bool = False) -> SearchHits:
+    """
+    `hits` merged with fuzzy hits, one per row at its best similarity. With
+    `fuzzy_first` (the no-model tier, where `hits` are TF-IDF cosines on a
+    lower scale than fuzzy ratios), fuzzy hits rank first and TF-IDF hits
+    only fill the remaining places.
+    """
+    fuzzy_hits = _fuzzy_hits(query, data, top_k, search_mode, mask)
+    
+    if len(hits) == 0:
+        return fuzzy_hits
+    
+    if fuzzy_first:
+        return fuzzy_hits.concat(hits.sorted()).unique().head(top_k)
+    # เรียงก่อนตัดซ้ำ: แต่ละแถวเก็บคะแนนที่สูงที่สุด
+    return hits.concat(fuzzy_hits).sorted().unique().head(top_k)
 
-@st.cache_data
-def get_tfidf_embeddings(data):
+def _select_backend(embeddings, ingredient_embeddings, search_mode, vector_index, ingredient_vector_index):
+    # เลือก embeddings ตาม search_mode
+    if search_mode == 'ingredient' and ingredient_embeddings is not None:
+        return ingredient_embeddings, ingredient_vector_index
+    return embeddings, vector_index
+
+def _encode_query(model, query: str) -> np.ndarray:
+    key = (object_token(model), query)
+    query_embedding = query_embedding_cache.get(key)
+    if query_embedding is None:
+        query_embedding = model.encode([query])[0]
+        query_embedding_cache.put(key, query_embedding)
+    return query_embedding
+
+def search_recipe_hits(query: str, model, data, embeddings, ingredient_embeddings=None, top_k: int = 5,
+                       search_mode: str = 'combined', vector_index=None, ingredient_vector_index=None,
+                       filters: Optional[Dict] = None) -> SearchHits:
+    """
+    `search_recipes` without materializing results: ranked positions and
+    scores as a `SearchHits`. Render a page of it with `result_page`, so
+    only the rows shown are read from the DataFrame.
+    """
     if data.empty:
-        return np.array([])
-    texts = []
-    for _, row in data.iterrows():
-        ingredient_text = str(row.get('ingredient', ''))
-        method_text = str(row.get('method', ''))
-        combined_text = f"{row['name']} {ingredient_text} {method_text}"
-        texts.append(combined_text)
-    if SKLEARN_AVAILABLE:
-        vectorizer = TfidfVectorizer(max_features=1000)
-        embeddings = vectorizer.fit_transform(texts).toarray()
-        return embeddings
-    else:
-        return create_simple_embeddings(texts)
-
-def create_simple_embeddings(texts):
-    all_words = set()
-    processed_texts = []
-    for text in texts:
-        words = re.findall(r'\w+', text.lower())
-        processed_texts.append(words)
-        all_words.update(words)
-    vocab = list(all_words)[:1000]
-    embeddings = []
-    for words in processed_texts:
-        vector = [words.count(word) for word in vocab]
-        embeddings.append(vector)
-    return np.array(embeddings)
-
-def simple_cosine_similarity(query_vec, embeddings):
-    similarities = []
-    query_norm = np.linalg.norm(query_vec)
-    for embedding in embeddings:
-        if query_norm == 0 or np.linalg.norm(embedding) == 0:
-            similarities.append(0)
+        return SearchHits.empty()
+    
+    selected_embeddings, selected_index = _select_backend(
+        embeddings, ingredient_embeddings, search_mode, vector_index, ingredient_vector_index
+    )
+    
+    cache_key = (query, search_mode, top_k, object_token(model),
+                 dataset_fingerprint(data, selected_embeddings), _filter_cache_key(data, filters))
+    cached = search_result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    hits = SearchHits.empty()
+    mask = _facet_mask(data, filters)
+    if mask is not None and not mask.any():
+        search_result_cache.put(cache_key, hits)
+        return hits
+    
+    if search_mode in ('bm25', 'hybrid'):
+        if search_mode == 'bm25':
+            hits = _bm25_hits(query, data, top_k, mask)
         else:
-            dot_product = np.dot(query_vec, embedding)
-            similarity = dot_product / (query_norm * np.linalg.norm(embedding))
-            similarities.append(similarity)
-    return np.array(similarities)
+            hits = _hybrid_hits(query, model, data, selected_embeddings, top_k, selected_index, mask)
+        if len(hits) == 0:
+            hits = _fuzzy_hits(query, data, top_k, 'combined', mask)
+        search_result_cache.put(cache_key, hits)
+        return hits
+    
+    # Semantic search
+    if model is not None and len(selected_embeddings) > 0:
+        # ชื่อเมนูตรงตัว: ตอบจากดัชนีชื่อ + เมนูใกล้เคียงที่คำนวณไว้ ไม่ต้อง encode
+        if search_mode in ('combined', 'name'):
+            name_hits = _exact_name_hits(query, data, top_k, search_mode, mask)
+            if name_hits is not None:
+                search_result_cache.put(cache_key, name_hits)
+                return name_hits
+        query_embedding = _encode_query(model, query)
+        
+        if selected_index is None:
+            selected_index = exact_index(selected_embeddings)
+        top_indices, top_scores = selected_index.search(query_embedding, top_k * 2, mask=mask)  # เอาเผื่อกรอง
+        hits = _semantic_hits(data, top_indices, top_scores, search_mode)
+    elif isinstance(selected_embeddings, TfidfIndex):
+        top_indices, top_scores = selected_embeddings.search(query, top_k * 2, mask)
+        hits = _ranked_hits(data, top_indices, top_scores, search_mode, 'tfidf', TFIDF_THRESHOLD)
+    
+    # Fallback to fuzzy search if results are poor or no model
+    if _needs_fuzzy(hits, model):
+        hits = _merge_fuzzy(query, data, hits, top_k, search_mode, mask, fuzzy_first=model is None)
+    
+    hits = hits.head(top_k)
+    search_result_cache.put(cache_key, hits)
+    return hits
 
-def search_recipes(query: str, model, data, embeddings, ingredient_embeddings=None, top_k: int = 5, search_mode: str = 'combined'):
+def search_recipes(query: str, model, data, embeddings, ingredient_embeddings=None, top_k: int = 5, search_mode: str = 'combined',
+                   vector_index=None, ingredient_vector_index=None, filters: Optional[Dict] = None):
     """
     search_mode options:
     - 'combined': ค้นหาจากทั้งชื่อ วัตถุดิบ และวิธีทำ (default)
     - 'ingredient': ค้นหาเฉพาะจากวัตถุดิบ
     - 'name': ค้นหาเฉพาะจากชื่อเมนู
+    - 'bm25': ค้นหาแบบ BM25 จากคำในชื่อ วัตถุดิบ และวิธีทำ (ไม่ใช้โมเดล AI)
+    - 'hybrid': รวมผล AI (หรือ TF-IDF) กับ BM25 ด้วย reciprocal rank fusion
+
+    vector_index / ingredient_vector_index: search backends from
+    `get_vector_index`; when None, an exact index is used for this call.
+
+    filters: facet predicates (see `functions.facets`), e.g.
+    `{'category': {'อาหารผัด'}, 'complexity': 'ง่าย', 'ingredient_count': (3, 8)}`.
+    They are applied inside every backend before top-k selection, so a
+    filtered query still returns up to `top_k` matching recipes.
+
+    A query that is a recipe name (exactly, or up to whitespace, case and
+    tone marks) in 'combined' / 'name' mode is answered without encoding:
+    the named recipes first, then their precomputed neighbours (see
+    `functions.neighbours`).
+
+    Query embeddings and ranked hits are memoized process-wide (see
+    `functions.cache`), keyed by the dataset fingerprint. Returns every hit
+    as a dict; use `search_recipe_hits` + `result_page` to build only the
+    rows that are displayed.
     """
-    if data.empty:
-        return []
+    hits = search_recipe_hits(query, model, data, embeddings, ingredient_embeddings, top_k, search_mode,
+                              vector_index, ingredient_vector_index, filters)
+    return result_page(hits, data)
+
+
+def search_recipes_batch(queries: List[str], model, data, embeddings, ingredient_embeddings=None, top_k: int = 5,
+                         search_mode: str = 'combined', vector_index=None, ingredient_vector_index=None,
+                         batch_size: int = 64, filters: Optional[Dict] = None) -> List[List[Dict]]:
+    """
+    Offline variant of `search_recipes` for many queries: all queries are
+    encoded in one `model.encode` call and scored together, and fuzzy fallback
+    runs only for queries whose best semantic score is below the threshold.
+    Returns one result list per query, in input order; `filters` apply to
+    every query.
+    """
+    if data.empty or not queries:
+        return [[] for _ in queries]
     
-    results = []
+    if search_mode in ('bm25', 'hybrid'):
+        # ไม่มีการ encode ร่วมกันให้ประหยัด: ค้นทีละ query
+        return [search_recipes(query, model, data, embeddings, ingredient_embeddings, top_k, search_mode,
+                               vector_index, ingredient_vector_index, filters) for query in queries]
     
-    # เลือก embeddings ตาม search_mode
-    if search_mode == 'ingredient' and ingredient_embeddings is not None:
-        selected_embeddings = ingredient_embeddings
-    else:
-        selected_embeddings = embeddings
+    mask = _facet_mask(data, filters)
+    if mask is not None and not mask.any():
+        return [[] for _ in queries]
     
-    # Semantic search
-    if model is not None and SENTENCE_TRANSFORMERS_AVAILABLE and len(selected_embeddings) > 0:
-        query_embedding = model.encode([query])
-        
-        if SKLEARN_AVAILABLE:
-            similarities = cosine_similarity(query_embedding, selected_embeddings)[0]
-        else:
-            similarities = simple_cosine_similarity(query_embedding[0], selected_embeddings)
-        
-        # ปรับ threshold ตาม search_mode
-        threshold = 0.25 if search_mode == 'ingredient' else 0.3
-        
-        top_indices = np.argsort(-similarities)[:top_k * 2]  # เอาเผื่อกรอง
-        
-        for idx in top_indices:
-            if idx < len(data) and similarities[idx] >= threshold:
-                results.append({
-                    'name': data.iloc[idx]['name'],
-                    'similarity': float(similarities[idx]),
-                    'ingredients': data.iloc[idx].get('ingredient', ''),
-                    'method': data.iloc[idx].get('method', ''),
-                    'index': int(idx),
-                    'type': 'semantic',
-                    'search_mode': search_mode
-                })
+    batch_hits = [SearchHits.empty() for _ in queries]
+    selected_embeddings, selected_index = _select_backend(
+        embeddings, ingredient_embeddings, search_mode, vector_index, ingredient_vector_index
+    )
     
-    # Fallback to fuzzy search if results are poor or no model
-    if not results or (results and results[0]['similarity'] < 0.3) or model is None:
-        fuzzy_results = fuzzy_search_recipes(query, data, top_k, search_mode)
+    if model is not None and len(selected_embeddings) > 0:
+        pending = list(range(len(queries)))
+        if search_mode in ('combined', 'name'):
+            name_hits = [_exact_name_hits(query, data, top_k, search_mode, mask) for query in queries]
+            for i, hits in enumerate(name_hits):
+                if hits is not None:
+                    batch_hits[i] = hits
+            pending = [i for i, hits in enumerate(name_hits) if hits is None]
         
-        if not results:
-            results = fuzzy_results
-        else:
-            # Combine and deduplicate
-            all_results = results + fuzzy_results
-            seen_indices = set()
-            unique_results = []
+        if pending:
+            query_embeddings = model.encode([queries[i] for i in pending], batch_size=batch_size)
             
-            for result in all_results:
-                if result['index'] not in seen_indices:
-                    unique_results.append(result)
-                    seen_indices.add(result['index'])
-            
-            # Sort by similarity and take top_k
-            results = sorted(unique_results, key=lambda x: x['similarity'], reverse=True)[:top_k]
+            if selected_index is None:
+                selected_index = exact_index(selected_embeddings)
+            all_indices, all_scores = selected_index.search_batch(query_embeddings, top_k * 2, mask=mask)
+            for j, i in enumerate(pending):
+                batch_hits[i] = _semantic_hits(data, all_indices[j], all_scores[j], search_mode)
+    elif isinstance(selected_embeddings, TfidfIndex):
+        for i, query in enumerate(queries):
+            top_indices, top_scores = selected_embeddings.search(query, top_k * 2, mask)
+            batch_hits[i] = _ranked_hits(data, top_indices, top_scores, search_mode, 'tfidf', TFIDF_THRESHOLD)
+    
+    for i, query in enumerate(queries):
+        if _needs_fuzzy(batch_hits[i], model):
+            batch_hits[i] = _merge_fuzzy(query, data, batch_hits[i], top_k, search_mode, mask,
+                                         fuzzy_first=model is None)
+        batch_hits[i] = batch_hits[i].head(top_k)
     
-    return results[:top_k]
+    return [result_page(hits, data) for hits in batch_hits]
 
 
-def fuzzy_search_recipes(query: str, data, top_k: int = 5, search_mode: str = 'combined') -> List[Dict]:
-    """Fuzzy search with mode support"""
-    results = []
+def _fuzzy_hits(query: str, data, top_k: int, search_mode: str, mask=None) -> SearchHits:
+    hits = []
     
     # Phase 1: Direct name matching
+    # ผลเหมือน difflib.get_close_matches ทุกชื่อ แต่คำนวณ ratio() เฉพาะชื่อที่ขอบบนยังแซงอันดับ top_k ได้
+    # (เริ่มจาก candidate ของ SymSpell + bigram ของชื่อ ซึ่งมักเป็นคำตอบอยู่แล้ว)
     if search_mode in ['combined', 'name']:
-        food_names = data['name'].tolist()
-        close_matches = difflib.get_close_matches(query, food_names, n=top_k, cutoff=0.3)
-        
-        for match in close_matches:
-            idx = data[data['name'] == match].index[0]
-            similarity = difflib.SequenceMatcher(None, query.lower(), match.lower()).ratio()
-            results.append({
-                'name': match,
-                'similarity': similarity,
-                'ingredients': data.iloc[idx].get('ingredient', ''),
-                'method': data.iloc[idx].get('method', ''),
-                'index': idx,
-                'type': 'fuzzy'
-            })
+        names = recipe_columns(data).columns['name']
+        name_index = _index(data, 'symspell')
+        bigram_index = _index(data, 'bigram')
+        seed_rows = [name_index.name_rows[key][0] for key, _ in name_index.lookup(query)]
+        seed_rows += bigram_index.rows[bigram_index.candidates(query, (NgramIndex.NAME,))].tolist()
+        query_lower = query.lower()
+        for _, pos in name_index.close_matches(query, top_k, 0.3, seed_rows, mask):
+            similarity = difflib.SequenceMatcher(None, query_lower, str(names[pos]).lower()).ratio()
+            hits.append((pos, similarity, 'fuzzy'))
     
-    # Phase 2: Content matching
-    if len(results) < top_k:
-        for idx, row in data.iterrows():
-            if idx in [r['index'] for r in results]:
-                continue
-            
-            name = str(row['name']).lower()
-            ingredients = str(row.get('ingredient', '')).lower()
-            method = str(row.get('method', '')).lower()
-            query_lower = query.lower()
-            
-            # Calculate scores based on search_mode
-            if search_mode == 'ingredient':
-                # Focus only on ingredients
-                ingredient_words = ingredients.split()
-                ingredient_score = max([difflib.SequenceMatcher(None, query_lower, word).ratio() 
-                                       for word in ingredient_words] + [0])
-                max_score = ingredient_score
-                
-            elif search_mode == 'name':
-                # Focus only on name
-                name_score = difflib.SequenceMatcher(None, query_lower, name).ratio()
-                max_score = name_score
-                
-            else:  # combined
-                name_score = difflib.SequenceMatcher(None, query_lower, name).ratio()
-                ingredient_score = max([difflib.SequenceMatcher(None, query_lower, word).ratio() 
-                                       for word in ingredients.split()] + [0])
-                method_score = max([difflib.SequenceMatcher(None, query_lower, word).ratio() 
-                                   for word in method.split()] + [0])
-                max_score = max(name_score, ingredient_score, method_score)
-            
-            if max_score > 0.4:
-                results.append({
-                    'name': row['name'],
-                    'similarity': max_score,
-                    'ingredients': row.get('ingredient', ''),
-                    'method': row.get('method', ''),
-                    'index': idx,
-                    'type': 'content_match'
-                })
+    # Phase 2: Content matching ผ่าน posting list (คะแนนเท่ากับการวนทุกแถว)
+    # รวมกับ trigram ระดับ grapheme ของชื่อเมนู/ชื่อวัตถุดิบ (รองรับพิมพ์ผิดภาษาไทย) ก่อนตัดเหลือ top_k
+    # แต่ละแถวได้คะแนนที่สูงกว่าของสองแบบ จึงไม่มีผลคะแนนสูงถูกแทนที่ด้วยผลคะแนนต่ำ
+    if len(hits) < top_k:
+        scores = {pos: (score, 'content_match') for pos, score in
+                  _index(data, 'token').content_scores(query.lower(), search_mode, 0.4).items()}
+        for pos, score in _index(data, 'ngram').search(query, search_mode, 0.5).items():
+            if score > scores.get(pos, (0.0,))[0]:
+                scores[pos] = (score, 'ngram')
+        seen = {pos for pos, _, _ in hits}
+        hits.extend((pos, score, result_type) for pos, (score, result_type) in sorted(scores.items())
+                    if pos not in seen and (mask is None or mask[pos]))
     
-    return sorted(results, key=lambda x: x['similarity'], reverse=True)[:top_k]
+    return SearchHits.from_tuples(hits).sorted().head(top_k)
+
+
+def fuzzy_search_recipes(query: str, data, top_k: int = 5, search_mode: str = 'combined',
+                         filters: Optional[Dict] = None) -> List[Dict]:
+    """Fuzzy search with mode support; `filters` as in `search_recipes`"""
+    return result_page(_fuzzy_hits(query, data, top_k, search_mode, _facet_mask(data, filters)), data)
@@ -0,0 +1,300 @@
+"""
+Sharded on-disk embedding store for corpora larger than RAM.
+
+The matrix is split into fixed-size row ranges (`shard_rows`, 65536 by
+default). Each shard is an ordinary embedding store (raw float32 matrix,
+JSON header, `.rowhash` sidecar; see `functions.embedding_store`) kept in
+a `<name>.shards/` directory and named after a content hash of its rows'
+text hashes. A `manifest.json`, written last, lists every shard with its
+row range and content hash, plus the model and dataset hash.
+
+Because shard files are content-addressed, a rebuild only writes shards
+whose rows changed; unchanged shards are kept as they are, and vectors of
+rows that merely moved to another shard are copied rather than re-encoded.
+Files no longer referenced by the manifest are removed afterwards.
+
+`ShardedIndex` scores one shard (in row chunks) at a time and merges each
+chunk's winners into a running top-k, so peak memory depends on the chunk
+size, not on the corpus size.
+"""
+
+import hashlib
+import json
+import os
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from functions.embedding_store import (
+    STORE_DTYPE, header_path, open_store, read_row_hashes, row_hash_path, row_hashes, write_store
+)
+from functions.scoring import ExactIndex, normalize_rows, normalize_vector, top_k, top_k_rows
+
+SHARDED_FORMAT_VERSION = 1
+DEFAULT_SHARD_ROWS = 65536
+SCORE_CHUNK_ROWS = 16384
+MANIFEST_NAME = 'manifest.json'
+
+
+def shard_dir(path: str) -> str:
+    """Directory that holds the shards of the store at `path`."""
+    return os.path.splitext(path)[0] + '.shards'
+
+
+def shard_content_hash(hashes: np.ndarray) -> str:
+    """Content hash of a shard: its rows' text hashes, in order."""
+    return hashlib.blake2b(np.ascontiguousarray(hashes, dtype=np.uint64).tobytes(), digest_size=12).hexdigest()
+
+
+def _shard_file(directory: str, content_hash: str) -> str:
+    return os.path.join(directory, f'shard-{content_hash}.f32')
+
+
+def read_manifest(path: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(shard_dir(path), MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(path: str, manifest: Dict) -> None:
+    manifest_path = os.path.join(shard_dir(path), MANIFEST_NAME)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+class ShardedStore:
+    """
+    Row-ordered view over the shards of one store. Each shard is memory-mapped
+    on first use; `len()`, `shape` and integer-array indexing behave like the
+    single-file matrix, so callers that only gather a few rows need no changes.
+    """
+
+    def __init__(self, directory: str, manifest: Dict):
+        self.directory = directory
+        self.manifest = manifest
+        self.shards: List[Dict] = manifest['shards']
+        self.starts = np.array([s['start'] for s in self.shards] + [manifest['rows']], dtype=np.int64)
+        self._maps: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return int(self.manifest['rows'])
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self), int(self.manifest['dim'])
+
+    @property
+    def ndim(self) -> int:
+        return 2
+
+    def shard(self, i: int) -> np.ndarray:
+        """Memory-mapped matrix of shard `i` (checked against its header on first open)."""
+        matrix = self._maps.get(i)
+        if matrix is None:
+            info = self.shards[i]
+            matrix = open_store(os.path.join(self.directory, info['file']), self.manifest['model'],
+                                info['content_hash'], info['rows'])
+            if matrix is None:
+                raise OSError(f"shard {info['file']} is missing or does not match the manifest")
+            self._maps[i] = matrix
+        return matrix
+
+    def iter_shards(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """(first row, matrix) per shard, in row order."""
+        for i, info in enumerate(self.shards):
+            yield info['start'], self.shard(i)
+
+    def __getitem__(self, rows) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64)
+        single = rows.ndim == 0
+        rows = np.atleast_1d(rows)
+        out = np.empty((len(rows), self.shape[1]), dtype=STORE_DTYPE)
+        owners = np.searchsorted(self.starts, rows, side='right') - 1
+        for i in np.unique(owners).tolist():
+            picked = owners == i
+            out[picked] = self.shard(i)[rows[picked] - self.starts[i]]
+        return out[0] if single else out
+
+
+def open_sharded(path: str, model_name: str, data_hash: str, rows: int) -> Optional[ShardedStore]:
+    """The sharded store for `path` if its manifest matches model, dataset and row count."""
+    manifest = read_manifest(path)
+    if (not manifest
+            or manifest.get('version') != SHARDED_FORMAT_VERSION
+            or manifest.get('model') != model_name
+            or manifest.get('dataset_hash') != data_hash
+            or manifest.get('rows') != rows):
+        return None
+    directory = shard_dir(path)
+    if not all(os.path.exists(os.path.join(directory, s['file'])) for s in manifest['shards']):
+        return None
+    return ShardedStore(directory, manifest)
+
+
+def _old_rows(path: str, model_name: str) -> Tuple[Dict[int, Tuple[int, int]], List[Optional[np.ndarray]]]:
+    """text hash -> (old shard, offset) for every readable shard of the previous build."""
+    manifest = read_manifest(path)
+    positions: Dict[int, Tuple[int, int]] = {}
+    maps: List[Optional[np.ndarray]] = []
+    if not manifest or manifest.get('version') != SHARDED_FORMAT_VERSION or manifest.get('model') != model_name:
+        return positions, maps
+    directory = shard_dir(path)
+    for i, info in enumerate(manifest['shards']):
+        shard_path = os.path.join(directory, info['file'])
+        hashes = read_row_hashes(shard_path, info['rows'])
+        matrix = open_store(shard_path, model_name, info['content_hash'], info['rows'])
+        maps.append(matrix if hashes is not None else None)
+        if matrix is None or hashes is None:
+            continue
+        for offset, h in enumerate(hashes.tolist()):
+            positions.setdefault(h, (i, offset))
+    return positions, maps
+
+
+def build_sharded(path: str, texts: List[str], encode: Callable, model_name: str, data_hash: str,
+                  shard_rows: int = DEFAULT_SHARD_ROWS) -> Tuple[ShardedStore, Dict]:
+    """
+    Open or (re)build the sharded store for `path`, one shard at a time.
+    Shards whose content hash is unchanged are kept; other shards copy the
+    vectors of rows seen in any previous shard and encode only new texts.
+    Returns the store and stats with `shards_written`, `reused` and `encoded`.
+    """
+    rows = len(texts)
+    store = open_sharded(path, model_name, data_hash, rows)
+    if store is not None:
+        return store, {'shards_written': 0, 'reused': rows, 'encoded': 0}
+
+    directory = shard_dir(path)
+    os.makedirs(directory, exist_ok=True)
+    old_positions, old_maps = _old_rows(path, model_name)
+    all_hashes = row_hashes(texts)
+
+    shards = []
+    dim = 0
+    stats = {'shards_written': 0, 'reused': 0, 'encoded': 0}
+    for start in range(0, rows, shard_rows):
+        hashes = all_hashes[start:start + shard_rows]
+        content_hash = shard_content_hash(hashes)
+        shard_path = _shard_file(directory, content_hash)
+        info = {'start': start, 'rows': int(len(hashes)), 'content_hash': content_hash,
+                'file': os.path.basename(shard_path)}
+        existing = open_store(shard_path, model_name, content_hash, len(hashes))
+        if existing is not None:
+            dim = existing.shape[1]
+            stats['reused'] += len(hashes)
+            shards.append(info)
+            continue
+
+        sources = [old_positions.get(h) for h in hashes.tolist()]
+        missing = [i for i, source in enumerate(sources) if source is None]
+        encoded = normalize_rows(encode([texts[start + i] for i in missing])) if missing else None
+        if encoded is not None:
+            dim = encoded.shape[1]
+        elif old_maps:
+            dim = next(m.shape[1] for m in old_maps if m is not None)
+        matrix = np.empty((len(hashes), dim), dtype=STORE_DTYPE)
+        for i, source in enumerate(sources):
+            if source is not None:
+                matrix[i] = old_maps[source[0]][source[1]]
+        if encoded is not None:
+            matrix[missing] = encoded
+        write_store(shard_path, matrix, model_name, content_hash, hashes, normalized=True)
+        stats['shards_written'] += 1
+        stats['reused'] += len(hashes) - len(missing)
+        stats['encoded'] += len(missing)
+        shards.append(info)
+
+    manifest = {
+        'version': SHARDED_FORMAT_VERSION,
+        'model': model_name,
+        'dataset_hash': data_hash,
+        'rows': rows,
+        'dim': int(dim),
+        'shard_rows': shard_rows,
+        'shards': shards,
+    }
+    del old_maps
+    _write_manifest(path, manifest)
+    _remove_unreferenced(directory, {s['file'] for s in shards})
+    return ShardedStore(directory, manifest), stats
+
+
+def _remove_unreferenced(directory: str, keep: set) -> None:
+    for name in os.listdir(directory):
+        if not (name.startswith('shard-') and name.endswith('.f32')) or name in keep:
+            continue
+        shard_path = os.path.join(directory, name)
+        for stale in (shard_path, header_path(shard_path), row_hash_path(shard_path)):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def _merge(best_ids: np.ndarray, best_scores: np.ndarray, ids: np.ndarray, scores: np.ndarray,
+           k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Running top-k: keep the best k of the current winners and a new batch."""
+    ids = np.concatenate([best_ids, ids])
+    scores = np.concatenate([best_scores, scores])
+    top = top_k(scores, k)
+    return ids[top], scores[top]
+
+
+class ShardedIndex:
+    """Exact cosine search streamed over a `ShardedStore`; same `search` interface as the other backends."""
+
+    def __init__(self, store: ShardedStore, chunk_rows: int = SCORE_CHUNK_ROWS):
+        self.embeddings = store
+        self.chunk_rows = chunk_rows
+
+    def _chunks(self) -> Iterator[Tuple[int, np.ndarray]]:
+        for start, matrix in self.embeddings.iter_shards():
+            for offset in range(0, len(matrix), self.chunk_rows):
+                yield start + offset, np.asarray(matrix[offset:offset + self.chunk_rows], dtype=np.float32)
+
+    def search(self, query_vector, k: int, mask=None) -> Tuple[np.ndarray, np.ndarray]:
+        query = normalize_vector(query_vector)
+        best_ids = np.array([], dtype=np.int64)
+        best_scores = np.array([], dtype=np.float32)
+        for start, chunk in self._chunks():
+            scores = chunk @ query
+            ids = np.arange(start, start + len(chunk), dtype=np.int64)
+            if mask is not None:
+                keep = mask[start:start + len(chunk)]
+                ids, scores = ids[keep], scores[keep]
+            top = top_k(scores, k)
+            best_ids, best_scores = _merge(best_ids, best_scores, ids[top], scores[top], k)
+        return best_ids, best_scores
+
+    def search_batch(self, query_vectors, k: int, mask=None) -> Tuple[np.ndarray, np.ndarray]:
+        """One pass over the shards for all queries; returns (queries x k) indices and scores."""
+        queries = normalize_rows(query_vectors)
+        best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+        best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+        for start, chunk in self._chunks():
+            ids = np.arange(start, start + len(chunk), dtype=np.int64)
+            if mask is not None:
+                keep = mask[start:start + len(chunk)]
+                ids, chunk = ids[keep], chunk[keep]
+            if len(ids) == 0:
+                continue
+            scores = np.concatenate([best_scores, queries @ chunk.T], axis=1)
+            candidates = np.concatenate([best_ids, np.broadcast_to(ids, (len(queries), len(ids)))], axis=1)
+            top = top_k_rows(scores, k)
+            best_ids = np.take_along_axis(candidates, top, axis=1)
+            best_scores = np.take_along_axis(scores, top, axis=1)
+        return best_ids, best_scores
+
+
+def exact_index(embeddings):
+    """
+    Brute-force backend for `embeddings`: streamed shard by shard for a
+    sharded store. Rows are taken as already normalized, as every store is.
+    """
+    if isinstance(embeddings, ShardedStore):
+        return ShardedIndex(embeddings)
+    return ExactIndex(embeddings, normalized=True)
@@ -0,0 +1,156 @@
+"""
+Persisted sparse TF-IDF index, pure NumPy (no scikit-learn needed).
+
+The fitted vocabulary, IDF weights and the L2-normalized document matrix in
+CSR form (`indptr`, `indices`, `values`) are saved to one `.npz` next to the
+embedding stores, so startup is a file load rather than a refit. Queries are
+projected with the same vocabulary and IDF and scored with a sparse dot
+product over the stored non-zeros.
+
+Terms are the same Thai cluster bigrams and Latin words as the BM25 index.
+"""
+
+import json
+import os
+from collections import Counter
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from functions.bm25 import lexical_terms
+from functions.scoring import masked_top_k
+
+TFIDF_FORMAT_VERSION = 1
+TFIDF_COLUMNS = ('name', 'ingredient', 'method')
+
+
+def _document_texts(data, columns: Sequence[str]):
+    parts = [data[c].fillna('').astype(str) for c in columns if c in data.columns]
+    if not parts:
+        return [''] * len(data)
+    texts = parts[0]
+    for part in parts[1:]:
+        texts = texts + ' ' + part
+    return texts.tolist()
+
+
+class TfidfIndex:
+    """
+    Sublinear-tf, smoothed-idf TF-IDF over `columns`, with unit-length rows.
+    `len(index)` is the number of documents, so it can stand in for an
+    embedding matrix wherever only the row count is read.
+    """
+
+    def __init__(self, vocabulary: Dict[str, int], idf: np.ndarray, indptr: np.ndarray,
+                 indices: np.ndarray, values: np.ndarray, columns: Sequence[str] = TFIDF_COLUMNS):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.indptr = indptr
+        self.indices = indices
+        self.values = values
+        self.columns = tuple(columns)
+        # แถวของแต่ละ non-zero สำหรับรวมคะแนนด้วย bincount
+        self._rows = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self), len(self.vocabulary)
+
+    @classmethod
+    def fit(cls, data, columns: Sequence[str] = TFIDF_COLUMNS) -> 'TfidfIndex':
+        vocabulary: Dict[str, int] = {}
+        rows = []
+        for text in _document_texts(data, columns):
+            counts = Counter(lexical_terms(text))
+            rows.append({vocabulary.setdefault(t, len(vocabulary)): tf for t, tf in counts.items()})
+
+        lengths = np.array([len(r) for r in rows], dtype=np.int64)
+        indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        indices = np.fromiter((t for r in rows for t in r), dtype=np.int32, count=int(indptr[-1]))
+        tf = np.fromiter((c for r in rows for c in r.values()), dtype=np.float64, count=int(indptr[-1]))
+
+        df = np.bincount(indices, minlength=len(vocabulary))
+        idf = (np.log((1.0 + len(rows)) / (1.0 + df)) + 1.0).astype(np.float32)
+        values = (1.0 + np.log(tf)) * idf[indices]
+
+        # normalize แต่ละแถวให้ยาว 1 เพื่อให้ dot product เป็น cosine
+        row_ids = np.repeat(np.arange(len(rows)), lengths)
+        norms = np.sqrt(np.bincount(row_ids, weights=values ** 2, minlength=len(rows)))
+        norms[norms == 0] = 1.0
+        values = (values / norms[row_ids]).astype(np.float32)
+        return cls(vocabulary, idf, indptr, indices, values, columns)
+
+    def transform_query(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(term ids, unit-length weights) of `query`; out-of-vocabulary terms are dropped."""
+        counts = Counter(t for t in lexical_terms(query) if t in self.vocabulary)
+        if not counts:
+            return np.array([], dtype=np.int32), np.array([], dtype=np.float32)
+        term_ids = np.array([self.vocabulary[t] for t in counts], dtype=np.int32)
+        weights = (1.0 + np.log(np.array(list(counts.values()), dtype=np.float64))) * self.idf[term_ids]
+        return term_ids, (weights / np.linalg.norm(weights)).astype(np.float32)
+
+    def scores(self, query: str) -> np.ndarray:
+        """Cosine similarity of `query` to every document."""
+        term_ids, weights = self.transform_query(query)
+        if len(term_ids) == 0:
+            return np.zeros(len(self), dtype=np.float32)
+        query_vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        query_vector[term_ids] = weights
+        return np.bincount(self._rows, weights=self.values * query_vector[self.indices],
+                           minlength=len(self)).astype(np.float32)
+
+    def search(self, query: str, k: int, mask=None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (row indices, cosine scores) of the best k documents with a
+        non-zero score, among the rows allowed by `mask` when given.
+        """
+        scores = self.scores(query)
+        top = masked_top_k(scores, k, mask)
+        top = top[scores[top] > 0]
+        return top, scores[top]
+
+    def save(self, path: str, data_hash: str) -> None:
+        meta = {
+            'version': TFIDF_FORMAT_VERSION,
+            'rows': len(self),
+            'columns': list(self.columns),
+            'dataset_hash': data_hash,
+        }
+        terms = np.array(sorted(self.vocabulary, key=self.vocabulary.get))
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, terms=terms, idf=self.idf, indptr=self.indptr, indices=self.indices,
+                 values=self.values, meta=np.array(json.dumps(meta)))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, data_hash: str, columns: Sequence[str] = TFIDF_COLUMNS) -> Optional['TfidfIndex']:
+        """Load the index at `path` if it was fitted on this dataset and these columns."""
+        try:
+            with np.load(path) as archive:
+                meta = json.loads(str(archive['meta']))
+                if (meta.get('version') != TFIDF_FORMAT_VERSION
+                        or meta.get('columns') != list(columns)
+                        or meta.get('dataset_hash') != data_hash):
+                    return None
+                vocabulary = {str(term): i for i, term in enumerate(archive['terms'].tolist())}
+                return cls(vocabulary, archive['idf'], archive['indptr'], archive['indices'],
+                           archive['values'], columns)
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+def load_or_build_tfidf(data, path: str, data_hash: str,
+                        columns: Sequence[str] = TFIDF_COLUMNS) -> TfidfIndex:
+    """TF-IDF index for `data`, loaded from `path` or fitted and saved there."""
+    index = TfidfIndex.load(path, data_hash, columns)
+    if index is not None:
+        return index
+    index = TfidfIndex.fit(data, columns)
+    try:
+        index.save(path, data_hash)
+    except OSError:
+        pass
+    return index
@@ -7,6 +7,8 @@ from typing import List, Dict, Optional
 import json
 from datetime import datetime
 
+from functions.recipe_tags import categorize_food, count_ingredients, estimate_complexity
+
 def clean_text(text: str) -> str:
     """
     ทำความสะอาดและจัดรูปแบบข้อความ
@@ -176,47 +178,18 @@ def enhance_recipe_data(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: ข้อมูลที่เพิ่มเติมแล้ว
     """
     # เพิ่มคอลัมน์ข้อมูลเพิ่มเติม
-    df['ingredient_count'] = df['text_ingradiant'].apply(
-        lambda x: len([line for line in str(x).split('\n') if line.strip()])
-    )
+    df['ingredient_count'] = df['text_ingradiant'].apply(count_ingredients)
     
     df['cooking_methods'] = df['food_method'].apply(extract_cooking_methods)
     df['cooking_methods_str'] = df['cooking_methods'].apply(lambda x: ', '.join(x))
     
     # ประเมินความซับซ้อนของสูตร
-    def estimate_complexity(row):
-        ingredient_count = row['ingredient_count']
-        method_text = str(row['food_method'])
-        method_length = len(method_text)
-        
-        if ingredient_count <= 3 and method_length <= 100:
-            return 'ง่าย'
-        elif ingredient_count <= 7 and method_length <= 300:
-            return 'ปานกลาง'
-        else:
-            return 'ยาก'
-    
-    df['complexity'] = df.apply(estimate_complexity, axis=1)
+    df['complexity'] = [
+        estimate_complexity(count, method)
+        for count, method in zip(df['ingredient_count'], df['food_method'])
+    ]
     
     # เพิ่มแท็กหมวดหมู่อาหาร
-    def categorize_food(name):
-        name_lower = name.lower()
-        
-        if any(word in name_lower for word in ['แกง', 'ต้มยำ', 'ต้มข่า']):
-            return 'แกงและซุป'
-        elif any(word in name_lower for word in ['ผัด', 'ผัดไท', 'ผัดกะเพรา']):
-            return 'อาหารผัด'
-        elif any(word in name_lower for word in ['ทอด', 'ปอเปี๊ยะ']):
-            return 'อาหารทอด'
-        elif any(word in name_lower for word in ['ยำ', 'ตำ', 'ลาบ']):
-            return 'ยำและตำ'
-        elif any(word in name_lower for word in ['ข้าว', 'เสี้ยว', 'ก๋วยเตี๋ยว']):
-            return 'อาหารหลัก'
-        elif any(word in name_lower for word in ['ขนม', 'เค้ก', 'ลูกชุบ']):
-            return 'ขนมและของหวาน'
-        else:
-            return 'อื่นๆ'
-    
     df['category'] = df['name'].apply(categorize_food)
     
     return df
@@ -335,12 +308,8 @@ def preprocess_data(input_file: str, output_file: str, enhanced_mode: bool = Tru
             for category, count in category_counts.items():
                 print(f"  - {category}: {count} รายการ")
         
-        # ลบไฟล์ embeddings เก่า (ถ้ามี) เพื่อให้สร้างใหม่
-        embeddings_files = ['embeddings.pkl', 'recipe_embeddings.pkl']
-        for emb_file in embeddings_files:
-            if os.path.exists(emb_file):
-                os.remove(emb_file)
-                print(f"ลบไฟล์ embeddings เก่า: {emb_file}")
+        # ไม่ต้องลบ embeddings เก่า: build_index.py จะ encode ใหม่เฉพาะสูตรที่เปลี่ยน (เทียบ hash รายแถว)
+        # แอปไม่สร้างดัชนีเอง ต้องรัน build_index.py ก่อนเปิดแอปทุกครั้งที่ข้อมูลเปลี่ยน
         
         return True
         
@@ -410,7 +379,7 @@ def main():
     
     if success:
         print("\n✅ ประมวลผลสำเร็จ!")
-        print("🚀 พร้อมใช้งานกับแอปพลิเคชัน Thai Food Nutrition Analyzer")
+        print(f"🔨 ขั้นต่อไป: python build_index.py --input {args.output} (สร้างดัชนีการค้นหาที่แอปโหลด)")
     else:
         print("\n❌ ประมวลผลล้มเหลว!")
         print("🔧 กรุณาตรวจสอบไฟล์อินพุตและลองใหม่")
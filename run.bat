@@ -95,6 +95,10 @@ if "%CHECK_ONLY%"=="true" (
     exit /b 0
 )
 
+echo 🔨 กำลังตรวจสอบดัชนีการค้นหา...
+call :build_search_indexes
+if errorlevel 1 exit /b 1
+
 echo 🚀 กำลังเริ่มแอปพลิเคชัน...
 call :run_app
 goto :eof
@@ -182,6 +186,23 @@ if errorlevel 1 (
 )
 exit /b 0
 
+:build_search_indexes
+:: แอปโหลดดัชนีที่สร้างไว้เท่านั้น: สร้างใหม่ถ้ายังไม่มีหรือไม่ตรงกับข้อมูล
+python build_index.py --check >nul 2>&1
+if not errorlevel 1 (
+    echo ✅ ดัชนีการค้นหาตรงกับข้อมูล
+    exit /b 0
+)
+echo 📋 ยังไม่มีดัชนีหรือข้อมูลเปลี่ยน: กำลังสร้างใหม่ (encode เฉพาะสูตรที่เปลี่ยน)...
+python build_index.py
+if errorlevel 1 (
+    echo ❌ ไม่สามารถสร้างดัชนีการค้นหาได้
+    pause
+    exit /b 1
+)
+echo ✅ สร้างดัชนีการค้นหาสำเร็จ
+exit /b 0
+
 :check_port
 :: ตรวจสอบพอร์ต
 netstat -an | findstr ":%1 " >nul 2>&1
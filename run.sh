@@ -176,6 +176,24 @@ else:
     fi
 }
 
+# ฟังก์ชันตรวจสอบ/สร้างดัชนีการค้นหา (แอปโหลดดัชนีที่สร้างไว้เท่านั้น ไม่สร้างเอง)
+build_search_indexes() {
+    print_step "🔨 กำลังตรวจสอบดัชนีการค้นหา..."
+    
+    if python build_index.py --check >/dev/null 2>&1; then
+        print_success "ดัชนีการค้นหาตรงกับข้อมูล"
+        return 0
+    fi
+    
+    print_info "ยังไม่มีดัชนีหรือข้อมูลเปลี่ยน: กำลังสร้างใหม่ (encode เฉพาะสูตรที่เปลี่ยน)..."
+    if python build_index.py; then
+        print_success "สร้างดัชนีการค้นหาสำเร็จ"
+    else
+        print_error "ไม่สามารถสร้างดัชนีการค้นหาได้"
+        exit 1
+    fi
+}
+
 # ฟังก์ชันตรวจสอบพอร์ต
 check_port() {
     local port=${1:-8501}
@@ -381,6 +399,8 @@ main() {
         exit 0
     fi
     
+    build_search_indexes
+    
     # ตั้งค่าสำหรับ development mode
     if [[ $dev_mode == true ]]; then
         print_info "🔧 Development Mode เปิดใช้งาน"
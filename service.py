@@ -0,0 +1,386 @@
+"""
+Standalone JSON HTTP service for recipe search and nutrition, outside Streamlit.
+
+Endpoints:
+  GET  /health          status, worker pid and whether semantic search is ready
+  GET  /suggest?q=ผัด   type-ahead recipe / ingredient names (`limit`, `kind` optional)
+  POST /search          {"query", "top_k", "search_mode", "filters"} -> {"results": [...]}
+  POST /search/batch    {"queries": [...], ...} -> {"results": [[...], ...]} in one encode call
+  POST /nutrition       {"ingredients": "..."} -> calculate_recipe_nutrition(...)
+
+The parent process loads the dataset, checks `artifacts.json` against it
+(exiting if `build_index.py` was not run on this data), loads the prebuilt
+lexical, fuzzy and facet indexes, binds the socket, then forks `--workers`
+children that share it (pre-fork, like gunicorn's sync workers), so those read-only
+arrays are shared copy-on-write. A worker that dies is reaped and replaced. Each worker loads the sentence-transformer
+in the background after the fork (torch is not fork-safe) and maps the
+same prebuilt embedding store files, which the page cache shares between
+workers; the corpus is never encoded here.
+Until the model is ready, or for good when sentence-transformers is not
+installed, workers serve TF-IDF/BM25/fuzzy results.
+On platforms without `os.fork` a single threaded server is used.
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from functions.artifacts import ArtifactError
+from functions.autocomplete import KINDS
+from functions.cache import search_result_cache
+from functions.data import load_food_data
+from functions.facets import FACETS, RANGE_FACETS
+from functions.loader import BackgroundLoader
+from functions.nutrition import SimpleNutritionCalculator
+from functions.search import (
+    SENTENCE_TRANSFORMERS_AVAILABLE, build_semantic_backend, facet_index, open_tfidf, require_artifacts,
+    search_recipes, search_recipes_batch, suggest
+)
+
+SEARCH_MODES = ('combined', 'ingredient', 'name', 'bm25', 'hybrid')
+MAX_TOP_K = 100
+MAX_BATCH_QUERIES = 256
+MAX_SUGGESTIONS = 50
+MAX_BODY_BYTES = 1 << 20
+# worker ที่ตายเร็วกว่านี้หลังเริ่ม: รอก่อน fork ใหม่ เพื่อไม่ให้วน crash ถี่ ๆ
+MIN_WORKER_SECONDS = 1.0
+
+
+class RequestError(ValueError):
+    """Invalid request payload; reported to the client as HTTP 400."""
+
+
+def _json_default(value):
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _filters(filters) -> Optional[Dict]:
+    """`filters` from a request, checked against the facet types; raises RequestError."""
+    if filters is None:
+        return None
+    if not isinstance(filters, dict) or set(filters) - set(FACETS):
+        raise RequestError(f"filters must be an object with keys from {FACETS}")
+    checked = {}
+    for facet, wanted in filters.items():
+        if wanted is None:
+            continue
+        if facet in RANGE_FACETS:
+            if (not isinstance(wanted, list) or len(wanted) != 2
+                    or not all(bound is None or _is_int(bound) for bound in wanted)):
+                raise RequestError(f"filters.{facet} must be [low, high] with integer or null bounds")
+            checked[facet] = tuple(wanted)
+        elif isinstance(wanted, str):
+            checked[facet] = wanted
+        elif isinstance(wanted, list) and all(isinstance(value, str) for value in wanted):
+            checked[facet] = wanted
+        else:
+            raise RequestError(f"filters.{facet} must be a string or a list of strings")
+    return checked or None
+
+
+class SearchService:
+    """Search and nutrition over one dataset; semantic search once `semantic_loader` is ready."""
+
+    def __init__(self, data):
+        self.data = data
+        self.nutrition_calculator = SimpleNutritionCalculator()
+        self.tfidf = open_tfidf(data)
+        self.tfidf_ingredient = open_tfidf(data, ('ingredient',))
+        self.semantic_loader: Optional[BackgroundLoader] = None
+        self._warm_indexes()
+
+    def _warm_indexes(self) -> None:
+        """
+        Load the prebuilt BM25, fuzzy, facet and autocomplete indexes before forking,
+        so every worker shares them. 'hybrid' is left out: it would start the
+        retrieval thread pool in the parent, and threads do not survive a fork.
+        """
+        facet_index(self.data)
+        suggest(self.data, 'ก')
+        for search_mode in ('combined', 'bm25'):
+            search_recipes('ข้าว', None, self.data, self.tfidf, self.tfidf_ingredient, 1, search_mode)
+        search_result_cache.clear()
+
+    def start_semantic(self) -> None:
+        """Begin loading the model and embedding stores in this process (call after fork)."""
+        if SENTENCE_TRANSFORMERS_AVAILABLE and self.semantic_loader is None:
+            self.semantic_loader = BackgroundLoader(
+                lambda: build_semantic_backend(self.data), name='semantic-loader'
+            ).start()
+
+    @property
+    def semantic_ready(self) -> bool:
+        return self.semantic_loader is not None and self.semantic_loader.ready
+
+    def _backend(self) -> Dict:
+        if self.semantic_ready:
+            return self.semantic_loader.result
+        return {
+            'model': None,
+            'embeddings': self.tfidf,
+            'ingredient_embeddings': self.tfidf_ingredient,
+            'vector_index': None,
+            'ingredient_vector_index': None,
+        }
+
+    @staticmethod
+    def _options(payload: Dict) -> Dict:
+        try:
+            top_k = int(payload.get('top_k', 5))
+        except (TypeError, ValueError):
+            raise RequestError("top_k must be an integer")
+        if not 1 <= top_k <= MAX_TOP_K:
+            raise RequestError(f"top_k must be between 1 and {MAX_TOP_K}")
+        search_mode = payload.get('search_mode', 'combined')
+        if search_mode not in SEARCH_MODES:
+            raise RequestError(f"search_mode must be one of {SEARCH_MODES}")
+        return {'top_k': top_k, 'search_mode': search_mode, 'filters': _filters(payload.get('filters') or None)}
+
+    def search(self, payload: Dict) -> Dict:
+        query = payload.get('query')
+        if not isinstance(query, str) or not query.strip():
+            raise RequestError("query must be a non-empty string")
+        options = self._options(payload)
+        backend = self._backend()
+        results = search_recipes(
+            query, backend['model'], self.data, backend['embeddings'], backend['ingredient_embeddings'],
+            options['top_k'], options['search_mode'], backend['vector_index'],
+            backend['ingredient_vector_index'], options['filters']
+        )
+        return {'results': results, 'semantic': backend['model'] is not None}
+
+    def search_batch(self, payload: Dict) -> Dict:
+        queries = payload.get('queries')
+        if (not isinstance(queries, list) or not queries
+                or not all(isinstance(q, str) and q.strip() for q in queries)):
+            raise RequestError("queries must be a non-empty list of non-empty strings")
+        if len(queries) > MAX_BATCH_QUERIES:
+            raise RequestError(f"at most {MAX_BATCH_QUERIES} queries per batch")
+        options = self._options(payload)
+        backend = self._backend()
+        results = search_recipes_batch(
+            queries, backend['model'], self.data, backend['embeddings'], backend['ingredient_embeddings'],
+            options['top_k'], options['search_mode'], backend['vector_index'],
+            backend['ingredient_vector_index'], filters=options['filters']
+        )
+        return {'results': results, 'semantic': backend['model'] is not None}
+
+    def suggest(self, params: Dict[str, List[str]]) -> Dict:
+        prefix = params.get('q', [''])[0]
+        try:
+            limit = int(params.get('limit', ['8'])[0])
+        except ValueError:
+            raise RequestError("limit must be an integer")
+        if not 1 <= limit <= MAX_SUGGESTIONS:
+            raise RequestError(f"limit must be between 1 and {MAX_SUGGESTIONS}")
+        kind = params.get('kind', [None])[0]
+        if kind is not None and kind not in KINDS:
+            raise RequestError(f"kind must be one of {KINDS}")
+        return {'suggestions': suggest(self.data, prefix, limit, kind)}
+
+    def nutrition(self, payload: Dict) -> Dict:
+        ingredients = payload.get('ingredients')
+        if not isinstance(ingredients, str):
+            raise RequestError("ingredients must be a string")
+        return self.nutrition_calculator.calculate_recipe_nutrition(ingredients)
+
+    def health(self) -> Dict:
+        loader = self.semantic_loader
+        return {
+            'status': 'ok',
+            'pid': os.getpid(),
+            'recipes': len(self.data),
+            'semantic': loader.status if loader is not None else 'unavailable',
+            'semantic_error': str(loader.error) if loader is not None and loader.error is not None else None,
+        }
+
+
+def make_handler(service: SearchService):
+    routes = {
+        '/search': service.search,
+        '/search/batch': service.search_batch,
+        '/nutrition': service.nutrition,
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status: int, body: Dict) -> None:
+            payload = json.dumps(body, ensure_ascii=False, default=_json_default).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == '/health':
+                self._send(200, service.health())
+            elif url.path == '/suggest':
+                try:
+                    self._send(200, service.suggest(parse_qs(url.query)))
+                except RequestError as e:
+                    self._send(400, {'error': str(e)})
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            route = routes.get(self.path)
+            if route is None:
+                self._send(404, {'error': 'not found'})
+                return
+            length = int(self.headers.get('Content-Length') or 0)
+            if length > MAX_BODY_BYTES:
+                self._send(413, {'error': 'request body too large'})
+                return
+            try:
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                if not isinstance(payload, dict):
+                    raise RequestError("request body must be a JSON object")
+                self._send(200, route(payload))
+            except (RequestError, ValueError) as e:
+                self._send(400, {'error': str(e)})
+            except Exception as e:
+                self._send(500, {'error': f'{type(e).__name__}: {e}'})
+
+        def log_message(self, format, *args):
+            sys.stderr.write(f"[{os.getpid()}] {self.address_string()} {format % args}\n")
+
+    return Handler
+
+
+def _serve(server: HTTPServer) -> None:
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _fork_worker(service: SearchService, server: HTTPServer) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        service.start_semantic()
+        _serve(server)
+        os._exit(0)
+    return pid
+
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def run_prefork(service: SearchService, host: str, port: int, workers: int) -> None:
+    """
+    Bind once, then fork `workers` processes that accept on the shared socket.
+    The parent reaps workers that exit and forks replacements until it gets
+    SIGINT or SIGTERM, which it forwards to the workers.
+    """
+    server = HTTPServer((host, port), make_handler(service), bind_and_activate=False)
+    server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.server_bind()
+    server.server_activate()
+
+    started: Dict[int, float] = {}
+    for _ in range(workers):
+        started[_fork_worker(service, server)] = time.monotonic()
+
+    print(f"🚀 {workers} workers ฟังที่ http://{host}:{port} (pids {list(started)})")
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    try:
+        while True:
+            pid, status = os.wait()
+            if pid not in started:
+                continue
+            lifetime = time.monotonic() - started.pop(pid)
+            print(f"⚠️  worker {pid} หยุดทำงาน (status {status}): เริ่ม worker ใหม่", file=sys.stderr)
+            if lifetime < MIN_WORKER_SECONDS:
+                time.sleep(MIN_WORKER_SECONDS)
+            started[_fork_worker(service, server)] = time.monotonic()
+    except KeyboardInterrupt:
+        for pid in started:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in started:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+    finally:
+        server.server_close()
+
+
+def run_threaded(service: SearchService, host: str, port: int) -> None:
+    service.start_semantic()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f"🚀 ฟังที่ http://{host}:{port} (single process)")
+    _serve(server)
+
+
+def main():
+    """ฟังก์ชันหลักสำหรับรันสคริปต์"""
+    parser = argparse.ArgumentParser(
+        description='บริการค้นหาสูตรอาหารและคำนวณโภชนาการผ่าน HTTP/JSON (Search Service)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+ตัวอย่างการใช้งาน:
+  python service.py --workers 4 --port 8080
+  curl -X POST localhost:8080/search -d '{"query": "ผัดไทย", "top_k": 5}'
+  curl -X POST localhost:8080/search/batch -d '{"queries": ["ต้มยำกุ้ง", "ส้มตำ"]}'
+  curl -X POST localhost:8080/nutrition -d '{"ingredients": "- ไก่ 200 กรัม"}'
+  curl 'localhost:8080/suggest?q=%E0%B8%9C%E0%B8%B1%E0%B8%94&limit=5'
+        """
+    )
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='จำนวน worker process (default: จำนวน CPU)')
+    args = parser.parse_args()
+
+    data = load_food_data()
+    if data.empty:
+        print("Error: ไม่สามารถโหลดข้อมูลอาหารได้")
+        sys.exit(1)
+
+    try:
+        require_artifacts(data)
+        service = SearchService(data)
+    except ArtifactError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if not SENTENCE_TRANSFORMERS_AVAILABLE:
+        print("⚠️  ไม่พบ sentence-transformers: ใช้การค้นหาแบบคำ (TF-IDF/BM25/fuzzy)")
+
+    if args.workers > 1 and hasattr(os, 'fork'):
+        run_prefork(service, args.host, args.port, args.workers)
+    else:
+        run_threaded(service, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
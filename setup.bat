@@ -170,6 +170,26 @@ if not exist "thai_food_processed_cleaned.csv" (
     echo ✅ พบไฟล์ข้อมูลหลัก
 )
 
+echo.
+echo 🔨 กำลังสร้างดัชนีการค้นหา...
+if exist "thai_food_processed_cleaned.csv" (
+    set HAS_DATA=true
+) else if exist "thai_food_processed.csv" (
+    set HAS_DATA=true
+) else (
+    set HAS_DATA=false
+)
+if "%HAS_DATA%"=="true" (
+    python build_index.py
+    if errorlevel 1 (
+        echo ⚠️  การสร้างดัชนีล้มเหลว กรุณารัน python build_index.py ก่อนเปิดแอป
+    ) else (
+        echo ✅ สร้างดัชนีการค้นหาสำเร็จ
+    )
+) else (
+    echo ⚠️  ไม่พบไฟล์ข้อมูลหลัก ข้ามการสร้างดัชนี
+)
+
 echo.
 echo 🔧 กำลังสร้างไฟล์การตั้งค่า...
 if not exist ".streamlit\secrets.toml" (
@@ -199,6 +219,7 @@ echo.
 echo 📱 กำลังสร้างไฟล์ shortcuts...
 echo @echo off > run_app.bat
 echo call venv\Scripts\activate.bat >> run_app.bat
+echo python build_index.py --check ^>nul ^|^| python build_index.py >> run_app.bat
 echo streamlit run app.py >> run_app.bat
 echo pause >> run_app.bat
 
@@ -184,7 +184,22 @@ __pycache__/
 
 # Model files (too large for git)
 model/
-embeddings.pkl
+embeddings*.f32
+embeddings*.json
+embeddings*.rowhash
+embeddings*.ivf.npz
+embeddings*.int8.npz
+embeddings*.float16.npz
+embeddings*.int8.npy
+embeddings*.float16.npy
+embeddings*.pca*.npz
+embeddings*.neighbours.npz
+embeddings*.shards/
+tfidf*.npz
+
+# Search indexes (build_index.py)
+artifacts.json
+indexes/
 
 # Data files
 *.csv
@@ -346,6 +361,23 @@ setup_data_files() {
     fi
 }
 
+# ฟังก์ชันสร้างดัชนีการค้นหา (แอปโหลดดัชนีที่สร้างไว้เท่านั้น ไม่สร้างเอง)
+build_search_indexes() {
+    print_step "🔨 กำลังสร้างดัชนีการค้นหา..."
+    
+    if [[ ! -f "thai_food_processed_cleaned.csv" && ! -f "thai_food_processed.csv" ]]; then
+        print_warning "ไม่พบไฟล์ข้อมูลหลัก ข้ามการสร้างดัชนี"
+        print_info "เตรียมไฟล์ข้อมูลแล้วรัน: python build_index.py"
+        return 0
+    fi
+    
+    if python build_index.py; then
+        print_success "สร้างดัชนีการค้นหาสำเร็จ"
+    else
+        print_warning "การสร้างดัชนีล้มเหลว กรุณารัน python build_index.py ก่อนเปิดแอป"
+    fi
+}
+
 # ฟังก์ชันสร้างไฟล์การตั้งค่า
 create_config_files() {
     print_step "🔧 กำลังสร้างไฟล์การตั้งค่า..."
@@ -424,6 +456,9 @@ echo
 # เปิดใช้งาน virtual environment
 source venv/bin/activate
 
+# สร้างดัชนีการค้นหาถ้ายังไม่มีหรือไม่ตรงกับข้อมูล
+python build_index.py --check > /dev/null || python build_index.py || exit 1
+
 # รันแอปพลิเคชัน
 streamlit run app.py
 EOF
@@ -471,8 +506,8 @@ if [[ -f "thai_food_raw.csv" ]]; then
     python preprocess.py --input thai_food_raw.csv --output thai_food_processed_cleaned.csv --enhanced
 fi
 
-# ลบ embeddings เก่าเพื่อให้สร้างใหม่
-rm -f embeddings.pkl
+# สร้างดัชนีการค้นหาใหม่ (encode เฉพาะสูตรที่เปลี่ยน); แอปไม่สร้างดัชนีเอง
+python build_index.py || exit 1
 
 echo "✅ อัปเดตเสร็จสิ้น!"
 EOF
@@ -625,6 +660,7 @@ main() {
     setup_virtual_environment
     install_python_packages
     setup_data_files
+    build_search_indexes
     create_config_files
     create_utility_scripts
     test_installation
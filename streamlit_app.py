@@ -6,10 +6,14 @@ import re
 from typing import Dict
 from datetime import datetime
 
+from functions.artifacts import ArtifactError
 from functions.data import load_food_data
 from functions.search import (
-    load_model, get_embeddings, get_ingredient_embeddings, search_recipes, SENTENCE_TRANSFORMERS_AVAILABLE, SKLEARN_AVAILABLE
+    facet_index, get_embeddings, get_ingredient_embeddings, get_semantic_loader, require_artifacts, result_page,
+    search_recipe_hits, suggest, SENTENCE_TRANSFORMERS_AVAILABLE, SKLEARN_AVAILABLE
 )
+from functions.cache import cache_stats
+from functions.loader import mark_startup, startup_timings
 from functions.nutrition import SimpleNutritionCalculator
 from functions.ui import display_ingredients, display_nutrition_card
 
@@ -18,6 +22,17 @@ Streamlit Thai Food Nutrition Analyzer
 Refactored to organize related functions under `functions/` and templates under `templates/`.
 """
 
+# โหมดใน sidebar ที่มี search_mode ของตัวเอง
+SEARCH_MODE_KEYS = {
+    "BM25 (คำค้น)": 'bm25',
+    "Hybrid (AI + BM25)": 'hybrid',
+}
+
+# จำนวนผลลัพธ์ต่อหน้า: ดึงข้อมูลสูตรจาก DataFrame เฉพาะหน้าที่แสดง
+RESULTS_PAGE_SIZE = 20
+# จำนวนคำแนะนำ (ชื่อเมนู/วัตถุดิบ) ใต้ช่องค้นหา
+SUGGESTION_COUNT = 8
+
 # ตั้งค่าหน้าเว็บ
 st.set_page_config(
     page_title="Thai Food Nutrition Analyzer",
@@ -45,6 +60,10 @@ except Exception:
 NUTRITION_PATH = "thai_ingredients_nutrition_data.csv"
 
 
+def use_suggestion(text: str):
+    # callback รันก่อนวาดหน้าใหม่ จึงตั้งค่าช่องค้นหาได้
+    st.session_state['search_query'] = text
+
 def create_sample_data():
     sample = {
         'name': ['ต้มยำกุ้ง', 'ผัดไทย', 'แกงเผ็ดไก่', 'ส้มตำ', 'ข้าวผัด'],
@@ -68,18 +87,39 @@ def create_sample_data():
 
 # ฟังก์ชันหลัก
 def main():
-    # โหลดข้อมูลและโมเดลก่อน
+    # โหลดข้อมูลก่อน ส่วนโมเดล AI โหลดเบื้องหลัง ระหว่างนั้นใช้การค้นหาแบบคำ (TF-IDF/BM25/fuzzy)
     with st.spinner("กำลังโหลดระบบ..."):
-        model = load_model()
         data = load_food_data()
         
         if data.empty:
             st.error("ไม่สามารถโหลดข้อมูลอาหารได้")
             return
         
-        embeddings = get_embeddings(model, data)
-        ingredient_embeddings = get_ingredient_embeddings(model, data)
+        # แอปโหลดดัชนีที่ build_index.py สร้างไว้เท่านั้น ไม่สร้างเองระหว่างใช้งาน
+        try:
+            require_artifacts(data)
+        except ArtifactError as e:
+            st.error(f"ดัชนีการค้นหายังไม่พร้อม: {e}")
+            return
+        
+        semantic_loader = get_semantic_loader(data)
+        if semantic_loader is not None and semantic_loader.ready:
+            semantic = semantic_loader.result
+            model = semantic['model']
+            embeddings = semantic['embeddings']
+            ingredient_embeddings = semantic['ingredient_embeddings']
+            vector_index = semantic['vector_index']
+            ingredient_vector_index = semantic['ingredient_vector_index']
+        else:
+            model = None
+            embeddings = get_embeddings(None, data)
+            ingredient_embeddings = get_ingredient_embeddings(None, data)
+            vector_index = None
+            ingredient_vector_index = None
         nutrition_calculator = SimpleNutritionCalculator()
+        mark_startup('search_ready')
+    
+    model_loading = semantic_loader is not None and semantic_loader.status == 'loading'
     
     # ส่วนหัว (หลังจากโหลดโมเดลแล้ว)
     mode_indicator = "🤖 AI Enhanced" if SENTENCE_TRANSFORMERS_AVAILABLE and model else "🔍 Basic Mode"
@@ -99,8 +139,15 @@ def main():
         st.markdown("### 🖥️ สถานะระบบ")
         if SENTENCE_TRANSFORMERS_AVAILABLE and model:
             st.success("🤖 AI Search: พร้อมใช้งาน")
+        elif model_loading:
+            st.info("⏳ AI Search: กำลังโหลดโมเดลเบื้องหลัง (ระหว่างนี้ใช้การค้นหาแบบคำ)")
+            st.button("🔄 ตรวจสอบอีกครั้ง")
         else:
             st.warning("🔍 Basic Search: โหมดพื้นฐาน")
+            if semantic_loader is not None and isinstance(semantic_loader.error, ArtifactError):
+                st.error(f"ดัชนี AI ยังไม่พร้อม: {semantic_loader.error}")
+            elif semantic_loader is not None and semantic_loader.error is not None:
+                st.caption(f"โหลดโมเดล AI ไม่สำเร็จ: {semantic_loader.error}")
         
         if SKLEARN_AVAILABLE:
             st.success("📊 ML Tools: พร้อมใช้งาน")
@@ -111,9 +158,10 @@ def main():
         st.markdown("### 🔍 การค้นหา")
         search_mode = st.selectbox(
             "โหมดการค้นหา",
-            ["อัตโนมัติ", "Fuzzy Search เท่านั้น"] if not SENTENCE_TRANSFORMERS_AVAILABLE 
-            else ["อัตโนมัติ", "AI Search เท่านั้น", "Fuzzy Search เท่านั้น"],
-            help="อัตโนมัติ = ใช้วิธีการที่ดีที่สุดที่มี"
+            ["อัตโนมัติ", "Fuzzy Search เท่านั้น", "BM25 (คำค้น)"] if not SENTENCE_TRANSFORMERS_AVAILABLE 
+            else ["อัตโนมัติ", "AI Search เท่านั้น", "Fuzzy Search เท่านั้น", "BM25 (คำค้น)", "Hybrid (AI + BM25)"],
+            help="อัตโนมัติ = ใช้วิธีการที่ดีที่สุดที่มี, BM25 = ค้นหาตามคำ ไม่ต้องใช้โมเดล AI, "
+                 "Hybrid = รวมผล AI กับ BM25"
         )
         
         max_results = st.slider(
@@ -123,6 +171,19 @@ def main():
             int(max(1, len(data)))
         )
         
+        # ตัวกรองหมวดหมู่/ความยาก/จำนวนวัตถุดิบ ใช้ก่อนเลือก top-k จึงยังได้ผลครบจำนวน
+        facets = facet_index(data)
+        categories = st.multiselect("หมวดหมู่อาหาร", list(facets.values('category')))
+        complexities = st.multiselect("ความยาก", list(facets.values('complexity')))
+        low, high = facets.value_range('ingredient_count')
+        high = max(high, low + 1)
+        ingredient_range = st.slider("จำนวนวัตถุดิบ", low, high, (low, high))
+        search_filters = {
+            'category': categories or None,
+            'complexity': complexities or None,
+            'ingredient_count': ingredient_range if ingredient_range != (low, high) else None,
+        }
+        
         # ข้อมูลสถิติ
         st.markdown("### 📊 สถิติข้อมูล")
         st.metric("จำนวนสูตรอาหาร", len(data))
@@ -144,6 +205,24 @@ def main():
             st.write(f"**Scikit-learn:** {'✅' if SKLEARN_AVAILABLE else '❌'}")
             st.write(f"**โหมดการทำงาน:** {'AI + Fuzzy' if model else 'Fuzzy Only'}")
             st.write(f"**ขนาด Embeddings:** {len(embeddings) if len(embeddings) > 0 else 'N/A'}")
+            timings = startup_timings()
+            st.write(f"**เวลาเริ่มระบบ (ค้นหาได้):** {timings.get('search_ready', 0):.2f} วินาที")
+            if 'semantic_ready' in timings:
+                st.write(
+                    f"**เวลาเริ่มระบบ (AI พร้อม):** {timings['semantic_ready']:.2f} วินาที "
+                    f"(โหลดโมเดล {timings.get('model_loaded', 0):.2f} วินาที)"
+                )
+            elif model_loading:
+                st.write("**เวลาเริ่มระบบ (AI พร้อม):** กำลังโหลด...")
+            stats = cache_stats()
+            st.write(
+                f"**แคชผลการค้นหา:** {stats['search_results']['hits']} hit / "
+                f"{stats['search_results']['misses']} miss ({stats['search_results']['size']} รายการ)"
+            )
+            st.write(
+                f"**แคช Query Embedding:** {stats['query_embeddings']['hits']} hit / "
+                f"{stats['query_embeddings']['misses']} miss"
+            )
     
     # แท็บหลัก
     tab1, tab2, tab3 = st.tabs(["🔍 ค้นหาอาหาร", "📋 ข้อมูลทั้งหมด", "ℹ️ เกี่ยวกับระบบ"])
@@ -173,18 +252,43 @@ def main():
         query = st.text_input(
             "🔍 ค้นหาอาหารที่ต้องการ:",
             placeholder="เช่น ต้มยำกุ้ง, ผัดไทย, อาหารที่มีโปรตีนสูง...",
-            help="พิมพ์ชื่ออาหาร วัตถุดิบ หรือคำอธิบายที่เกี่ยวข้อง"
+            help="พิมพ์ชื่ออาหาร วัตถุดิบ หรือคำอธิบายที่เกี่ยวข้อง",
+            key='search_query'
         )
         
+        # ชื่อเมนู/วัตถุดิบที่ขึ้นต้นด้วยคำที่พิมพ์ เรียงตามความนิยม (กดเพื่อค้นหาชื่อนั้นตรง ๆ)
+        suggestions = [s for s in suggest(data, query, SUGGESTION_COUNT) if s['text'] != query.strip()] if query else []
+        if suggestions:
+            st.caption("💡 คำแนะนำ:")
+            columns = st.columns(min(len(suggestions), 4))
+            for i, suggestion in enumerate(suggestions):
+                icon = "🍲" if suggestion['kind'] == 'recipe' else "🥬"
+                columns[i % len(columns)].button(
+                    f"{icon} {suggestion['text']}", key=f"suggest_{i}",
+                    on_click=use_suggestion, args=(suggestion['text'],)
+                )
+        
         if query:
             with st.spinner(f"กำลังค้นหา '{query}'..."):
-                results = search_recipes(query, model, data, embeddings, ingredient_embeddings, max_results)
+                hits = search_recipe_hits(
+                    query, model, data, embeddings, ingredient_embeddings, max_results,
+                    search_mode=SEARCH_MODE_KEYS.get(search_mode, 'combined'),
+                    vector_index=vector_index, ingredient_vector_index=ingredient_vector_index,
+                    filters=search_filters
+                )
             
-            if results:
-                filtered_results = [r for r in results if r.get('similarity', 0) >= 0.5]
-                st.markdown(f"### 🍽️ พบ {len(filtered_results)} รายการที่เกี่ยวข้อง (ความคล้ายคลึงมากกว่า 50%)")
+            if len(hits) > 0:
+                filtered_hits = hits.above(0.5)
+                st.markdown(f"### 🍽️ พบ {len(filtered_hits)} รายการที่เกี่ยวข้อง (ความคล้ายคลึงมากกว่า 50%)")
+                
+                page_count = max(1, -(-len(filtered_hits) // RESULTS_PAGE_SIZE))
+                page = 1
+                if page_count > 1:
+                    page = st.number_input(f"หน้า (จากทั้งหมด {page_count} หน้า)", 1, page_count, 1)
+                page_start = (page - 1) * RESULTS_PAGE_SIZE
+                page_results = result_page(filtered_hits, data, page_start, page_start + RESULTS_PAGE_SIZE)
                 
-                for i, result in enumerate(filtered_results, 1):
+                for i, result in enumerate(page_results, page_start + 1):
                     label = f"{i}. {result['name']} (ความเกี่ยวข้อง: {result['similarity']:.1%})"
                     similarity_class = "low-similarity" if result['similarity'] < 0.5 else ""
                     with st.expander(label, icon="▪️"):